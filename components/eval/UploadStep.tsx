@@ -20,8 +20,8 @@ export function UploadStep({ onUpload }: { onUpload: (result: UploadResult) => v
       setError("File must be a .csv");
       return;
     }
-    if (file.size > 10 * 1024 * 1024) {
-      setError("File exceeds 10MB limit");
+    if (file.size > 500 * 1024 * 1024) {
+      setError("File exceeds 500MB limit");
       return;
     }
 
@@ -87,7 +87,7 @@ export function UploadStep({ onUpload }: { onUpload: (result: UploadResult) => v
             <div className="font-mono text-[10px] text-gray-400">
               Required columns: {REQUIRED.join(", ")}
             </div>
-            <div className="font-mono text-[10px] text-gray-400">Max 10MB</div>
+            <div className="font-mono text-[10px] text-gray-400">Max 500MB</div>
           </div>
         )}
       </div>
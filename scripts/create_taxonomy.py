@@ -24,6 +24,10 @@ from typing import Dict, Any, Optional, Tuple
 import copy
 from tqdm import tqdm
 
+# Shared token-aware batch planner from the taxonomy pipeline
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "taxonomy_pipeline"))
+from batch_planner import assign_batch_ids, get_model_budget
+
 # ---------------------------------------------------------------------------
 # Load .env.local / .env
 # ---------------------------------------------------------------------------
@@ -52,6 +56,7 @@ GEMINI_AVAILABLE = False
 
 OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3.1")
+OLLAMA_NUM_CTX = int(os.environ.get("OLLAMA_NUM_CTX", "8192"))
 
 try:
     r = requests.get(f"{OLLAMA_URL}/api/tags", timeout=3)
@@ -98,6 +103,10 @@ GEMINI_MODEL = "gemini-2.0-flash"
 MAX_RETRIES = 3
 RETRY_DELAY = 2  # seconds
 
+# Token-packed batches: prompt room kept for instructions + the growing taxonomy
+PROMPT_TOKEN_RESERVE = 400
+TAXONOMY_TOKEN_RESERVE = 2500
+
 
 # ---------------------------------------------------------------------------
 # Unified LLM call with fallback
@@ -118,6 +127,7 @@ def get_llm_response(text: str, temperature: float = 0.7, max_tokens: int = 4096
                         "options": {
                             "temperature": temperature,
                             "num_predict": max_tokens,
+                            "num_ctx": OLLAMA_NUM_CTX,
                         },
                     },
                     timeout=600,
@@ -461,7 +471,8 @@ def main():
     input_file = get_input("Path to awards CSV", "mockup_awards.csv",
                            lambda x: os.path.exists(x))
     sample_size = int(get_input("Sample size", "1000", lambda x: x.isdigit() and int(x) > 0))
-    batch_size = int(get_input("Rows per batch", "20", lambda x: x.isdigit() and int(x) > 0))
+    batch_size = get_input("Rows per batch ('auto' = token-packed)", "auto",
+                           lambda x: x == "auto" or (x.isdigit() and int(x) > 0))
     compress_every = int(get_input("Compress every N batches", "10", lambda x: x.isdigit() and int(x) > 0))
     output_dir = get_input("Output directory", "taxonomy_results")
     responses_dir = get_input("Responses directory", "llm_responses")
@@ -475,8 +486,19 @@ def main():
     print(f"  {len(df_sample)} unique messages after dedup.")
 
     df_sample["formatted_info"] = df_sample.apply(format_recognition_info, axis=1)
-    df_sample["batch_id"] = np.ceil((np.arange(len(df_sample)) + 1) / batch_size).astype(int)
-    df_sample["row_in_batch"] = "row" + ((np.arange(len(df_sample)) % batch_size) + 1).astype(str)
+    if batch_size == "auto":
+        budget = get_model_budget("ollama", OLLAMA_MODEL, max_output_tokens=4096)
+        df_sample["batch_id"] = assign_batch_ids(
+            df_sample["formatted_info"].tolist(),
+            # Output is the taxonomy delta, not per row — reserve it up front
+            overhead_tokens=PROMPT_TOKEN_RESERVE + TAXONOMY_TOKEN_RESERVE + budget["max_output_tokens"],
+            output_tokens_per_item=0,
+            context_tokens=min(budget["context_tokens"], OLLAMA_NUM_CTX),
+            max_output_tokens=budget["max_output_tokens"],
+        )
+    else:
+        df_sample["batch_id"] = np.ceil((np.arange(len(df_sample)) + 1) / int(batch_size)).astype(int)
+    df_sample["row_in_batch"] = "row" + (df_sample.groupby("batch_id").cumcount() + 1).astype(str)
     df_sample["summary_dict_batch"] = df_sample["row_in_batch"] + ": " + df_sample["formatted_info"]
 
     total_batches = df_sample["batch_id"].max()
@@ -20,6 +20,10 @@ from typing import Dict, Any, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 
+# Shared token-aware batch planner from the taxonomy pipeline
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "taxonomy_pipeline"))
+from batch_planner import assign_batch_ids, estimate_tokens, get_model_budget
+
 # ---------------------------------------------------------------------------
 # Load .env.local / .env
 # ---------------------------------------------------------------------------
@@ -48,6 +52,7 @@ GEMINI_AVAILABLE = False
 
 OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3.1")
+OLLAMA_NUM_CTX = int(os.environ.get("OLLAMA_NUM_CTX", "8192"))
 
 try:
     r = requests.get(f"{OLLAMA_URL}/api/tags", timeout=3)
@@ -105,7 +110,11 @@ def get_llm_response(text: str, temperature: float = 0.1, max_tokens: int = 4096
                     "model": OLLAMA_MODEL,
                     "prompt": text,
                     "stream": False,
-                    "options": {"temperature": temperature, "num_predict": max_tokens},
+                    "options": {
+                        "temperature": temperature,
+                        "num_predict": max_tokens,
+                        "num_ctx": OLLAMA_NUM_CTX,
+                    },
                 },
                 timeout=300,
             )
@@ -266,8 +275,8 @@ def main():
                                   lambda x: x.replace(".", "").isdigit() and 0 <= float(x) <= 1))
     workers = int(get_input("Concurrent workers (keep low for Ollama)", "2",
                             lambda x: x.isdigit() and 1 <= int(x) <= 10))
-    batch_size = int(get_input("Rows per batch", "20",
-                               lambda x: x.isdigit() and int(x) > 0))
+    batch_size = get_input("Rows per batch ('auto' = token-packed)", "auto",
+                           lambda x: x == "auto" or (x.isdigit() and int(x) > 0))
     output_file = get_input("Output CSV path", "output/annotated_results.csv")
 
     print(f"\n  Input:     {input_file}")
@@ -292,8 +301,20 @@ def main():
     print(f"  {len(df)} unique messages.")
 
     df["formatted_info"] = df.apply(format_award_info, axis=1)
-    df["batch_id"] = np.ceil((np.arange(len(df)) + 1) / batch_size).astype(int)
-    df["row_in_batch"] = "row" + ((np.arange(len(df)) % batch_size) + 1).astype(str)
+    if batch_size == "auto":
+        budget = get_model_budget("ollama", OLLAMA_MODEL, max_output_tokens=4096)
+        # Prompt carries the instructions, template and full taxonomy every call
+        overhead = estimate_tokens(ANNOTATION_TEMPLATE + json.dumps(taxonomy, indent=2)) + 150
+        df["batch_id"] = assign_batch_ids(
+            df["formatted_info"].tolist(),
+            overhead_tokens=overhead,
+            output_tokens_per_item=60,  # one {"reason", ...} object per row
+            context_tokens=min(budget["context_tokens"], OLLAMA_NUM_CTX),
+            max_output_tokens=budget["max_output_tokens"],
+        )
+    else:
+        df["batch_id"] = np.ceil((np.arange(len(df)) + 1) / int(batch_size)).astype(int)
+    df["row_in_batch"] = "row" + (df.groupby("batch_id").cumcount() + 1).astype(str)
     df["summary_dict_batch"] = df["row_in_batch"] + ": " + df["formatted_info"]
 
     unique_batches = sorted(df["batch_id"].unique())
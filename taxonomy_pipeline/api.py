@@ -1,4 +1,4 @@
-import json, uuid, os, csv, time, io, threading
+import json, uuid, os, shutil, time
 from pathlib import Path
 from datetime import datetime, timezone
 from typing import Optional
@@ -12,7 +12,12 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+import config as cfg
+from csv_profile import CsvProfileError, CsvProfiler, profile_csv
+from job_queue import JobPool, RetryJob, open_store
 from prompt_composer import load_presets, get_preset_by_id, build_prompt_metadata
+import provider_health
+from storage_upload import CHUNK_SIZE as UPLOAD_CHUNK_SIZE, ResumableUpload
 
 
 UPLOAD_DIR = Path("data/uploads")
@@ -21,7 +26,7 @@ UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 STORAGE_BUCKET = "pipeline-uploads"
 
 REQUIRED_COLUMNS = {"message", "award_title", "recipient_title", "nominator_title"}
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+MAX_FILE_SIZE = 500 * 1024 * 1024  # 500MB
 
 REGISTRY_PATH = Path(__file__).parent / "model_registry.json"
 
@@ -71,6 +76,7 @@ class RunRequest(BaseModel):
     file_id: str
     config_ids: list[str]
     prompt_config: Optional[PromptConfig] = None
+    use_cache: bool = True       # False forces fresh LLM output for every phase
 
 class ApplyTaxonomyRequest(BaseModel):
     job_id: str
@@ -94,55 +100,80 @@ def get_configs():
 
 
 @app.post("/api/upload")
-async def upload_csv(file: UploadFile = File(...)):
+def upload_csv(file: UploadFile = File(...)):
+    """
+    Validate, profile and store an uploaded CSV in one streaming pass.
+
+    FastAPI has already spooled the body to a temp file; it is read back
+    in UPLOAD_CHUNK_SIZE chunks. The header is checked on the first chunk,
+    before anything goes to Storage. Each later chunk is profiled while
+    the previous one uploads, and is written to the local copy the
+    pipeline job reads, so memory stays flat whatever the file size.
+    """
     # Validate file type
     if not file.filename or not file.filename.endswith(".csv"):
         raise HTTPException(400, "File must be a .csv")
 
-    # Read contents
-    contents = await file.read()
-    if len(contents) > MAX_FILE_SIZE:
+    src = file.file
+    src.seek(0, os.SEEK_END)
+    size = src.tell()
+    src.seek(0)
+    if size > MAX_FILE_SIZE:
         raise HTTPException(400, f"File exceeds {MAX_FILE_SIZE // 1024 // 1024}MB limit")
 
-    # Parse CSV
-    try:
-        text = contents.decode("utf-8")
-        reader = csv.DictReader(io.StringIO(text))
-        rows = list(reader)
-    except Exception as e:
-        raise HTTPException(400, f"CSV parse error: {e}")
-
-    if not rows:
-        raise HTTPException(400, "CSV is empty")
-
-    # Validate columns
-    columns = list(rows[0].keys())
-    col_set = {c.strip().lower() for c in columns}
-    missing = REQUIRED_COLUMNS - col_set
-    if missing:
-        raise HTTPException(400, f"Missing required columns: {', '.join(missing)}")
-
-    if len(rows) < 10:
-        raise HTTPException(400, "CSV must have at least 10 rows")
-
-    # Store file in Supabase Storage
     file_id = str(uuid.uuid4())[:12]
     storage_path = f"{file_id}/{file.filename}"
+    local_path = _local_upload_path(storage_path)
+    spool = local_path.with_name(local_path.name + ".part")
 
-    db.storage.from_(STORAGE_BUCKET).upload(
-        path=storage_path,
-        file=contents,
-        file_options={"content-type": "text/csv"},
-    )
+    profiler = CsvProfiler(required=REQUIRED_COLUMNS)
+    upload = None
+    try:
+        with open(spool, "wb") as out:
+            for chunk in iter(lambda: src.read(UPLOAD_CHUNK_SIZE), b""):
+                profiler.feed(chunk)
+                if upload is None:
+                    if profiler.columns is None:
+                        raise CsvProfileError(
+                            "CSV is empty" if len(chunk) < UPLOAD_CHUNK_SIZE
+                            else f"No CSV header in the first {UPLOAD_CHUNK_SIZE // 1024 // 1024}MB"
+                        )
+                    # Header is valid: start streaming to Supabase Storage
+                    upload = ResumableUpload(
+                        os.environ["SUPABASE_URL"],
+                        os.environ["SUPABASE_SERVICE_ROLE_KEY"],
+                        STORAGE_BUCKET,
+                        storage_path,
+                        length=size,
+                    ).start()
+                upload.write(chunk)
+                out.write(chunk)
+        if upload is None:
+            raise CsvProfileError("CSV is empty")
+
+        profile = profiler.close()
+        if not profiler.rows:
+            raise CsvProfileError("CSV is empty")
+        if profiler.rows < 10:
+            raise CsvProfileError("CSV must have at least 10 rows")
+        upload.finish()
+    except Exception as e:
+        if upload is not None:
+            upload.abort()
+        spool.unlink(missing_ok=True)
+        if isinstance(e, CsvProfileError):
+            raise HTTPException(400, str(e))
+        raise
+    os.replace(spool, local_path)
 
-    # Sample rows for preview
-    sample = rows[:5]
+    columns = profiler.columns
+    sample = profiler.sample_rows
 
     # Insert metadata into Supabase
     db.table("pipeline_uploads").insert({
         "file_id": file_id,
         "filename": file.filename,
-        "row_count": len(rows),
+        "row_count": profiler.rows,
         "columns": columns,
         "sample_rows": sample,
         "file_path": storage_path,
@@ -151,9 +182,10 @@ async def upload_csv(file: UploadFile = File(...)):
     return {
         "file_id": file_id,
         "filename": file.filename,
-        "row_count": len(rows),
+        "row_count": profiler.rows,
         "columns": columns,
         "sample_rows": sample,
+        "profile": profile,
     }
 
 
@@ -194,11 +226,15 @@ def start_runs(req: RunRequest):
         if pc.mode == "raw" and pc.raw_prompt:
             prompt_dict["raw_prompt"] = pc.raw_prompt
 
+    configs = {}
     for config_id in req.config_ids:
         config = get_config(config_id)
         if not config:
             raise HTTPException(400, f"Unknown or disabled config: {config_id}")
+        configs[config_id] = config
 
+    queued = []
+    for config_id, config in configs.items():
         job_id = str(uuid.uuid4())[:12]
 
         db.table("pipeline_jobs").insert({
@@ -212,19 +248,38 @@ def start_runs(req: RunRequest):
             "prompt_config": prompt_dict,
         }).execute()
 
-        # Spawn background thread — passes prompt_config and config
-        t = threading.Thread(
-            target=_run_pipeline_job,
-            args=(job_id, upload["file_path"], config, prompt_dict),
-            daemon=True,
-        )
-        t.start()
-
+        queued.append((
+            job_id,
+            {
+                "file_path": upload["file_path"],
+                "config": config,
+                "prompt_config": prompt_dict,
+                "use_cache": req.use_cache,
+            },
+            [phase["provider"] for phase in config.get("phases", {}).values()],
+        ))
         jobs.append({"job_id": job_id, "config_id": config_id, "status": "queued"})
 
+    # Durable queue — the job pool runs each job when a worker and its
+    # providers are free. Backpressure: refuse rather than queue work we
+    # can't start soon (checked atomically with the insert).
+    if not job_pool.submit(queued):
+        db.table("pipeline_jobs").delete().in_("job_id", [job["job_id"] for job in jobs]).execute()
+        raise HTTPException(
+            429,
+            f"Pipeline queue is full ({cfg.API_QUEUE_MAX_PENDING} jobs queued or running) — try again shortly",
+            headers={"Retry-After": str(cfg.API_RETRY_AFTER_SECONDS)},
+        )
+
     return {"jobs": jobs}
 
 
+@app.get("/api/queue")
+def queue_status():
+    """Jobs queued / running and per-provider slots in use."""
+    return job_pool.status()
+
+
 @app.get("/api/status/{job_id}")
 def get_status(job_id: str):
     res = db.table("pipeline_jobs").select(
@@ -339,9 +394,24 @@ def get_curations(file_id: str):
 def _update_job(job_id: str, **fields):
     db.table("pipeline_jobs").update(fields).eq("job_id", job_id).execute()
 
+def _mark_queued(job_id: str):
+    """Job is back in the queue: clear what a failed attempt may have left."""
+    _update_job(job_id, status="queued", error_message=None, completed_at=None)
+
+def _local_upload_path(storage_path: str) -> Path:
+    return UPLOAD_DIR / storage_path.replace("/", "_")
+
+def _job_dir(job_id: str) -> Path:
+    """Per-job outputs and Phase 2 checkpoint on this host."""
+    return cfg.OUTPUT_DIR / "jobs" / job_id
+
+def _remove_job_dir(job_id: str):
+    """Drop a finished job's local files (its results are in Supabase)."""
+    shutil.rmtree(_job_dir(job_id), ignore_errors=True)
+
 def _download_from_storage(storage_path: str) -> str:
     """Download a file from Supabase Storage to a local temp path for pipeline processing."""
-    local_path = UPLOAD_DIR / storage_path.replace("/", "_")
+    local_path = _local_upload_path(storage_path)
     if not local_path.exists():
         res = db.storage.from_(STORAGE_BUCKET).download(storage_path)
         local_path.write_bytes(res)
@@ -374,9 +444,18 @@ def _calculate_costs(token_usage: dict, registry: dict) -> dict:
     }
 
 
-def _run_pipeline_job(job_id: str, file_path: str, config: dict, prompt_config: dict | None = None):
+def _run_pipeline_job(
+    job_id: str,
+    file_path: str,
+    config: dict,
+    prompt_config: dict | None = None,
+    use_cache: bool = True,
+    state: dict | None = None,
+    save_state=None,
+    attempt: int = 1,
+) -> bool:
     """
-    Runs the 3-phase taxonomy pipeline in a background thread.
+    Runs the 3-phase taxonomy pipeline on a job pool worker.
     Updates Supabase job record with progress at each phase.
 
     Args:
@@ -384,6 +463,19 @@ def _run_pipeline_job(job_id: str, file_path: str, config: dict, prompt_config:
         file_path:     Path to CSV in Supabase Storage
         config:        Model config snapshot from registry
         prompt_config:  Custom prompt config from dashboard (or None for defaults)
+        use_cache:     If False, bypass the LLM response cache
+        state:         Progress saved by an interrupted attempt of this job;
+                       phases it finished are not run again
+        save_state:    Called with the progress after each phase
+        attempt:       Which attempt at the job this is (1-based)
+
+    A phase that falls back or stops early (ctx.degraded) isn't saved to
+    state. Before the last attempt the job raises RetryJob, so the pool
+    queues it again and the per-job directory (Phase 2 journal) is kept;
+    on the last attempt it completes with the reasons in its summary.
+
+    Returns:
+        True if the job completed, False if it failed
     """
     import sys
     pipeline_dir = str(Path(__file__).parent)
@@ -391,7 +483,8 @@ def _run_pipeline_job(job_id: str, file_path: str, config: dict, prompt_config:
         sys.path.insert(0, pipeline_dir)
 
     try:
-        import config as cfg
+        state = dict(state or {})
+        save_state = save_state or (lambda _: None)
 
         now = datetime.now(timezone.utc).isoformat()
         _update_job(job_id, status="running", started_at=now, current_phase=1, progress_pct=5)
@@ -401,19 +494,40 @@ def _run_pipeline_job(job_id: str, file_path: str, config: dict, prompt_config:
 
         start = time.time()
 
-        # Import token tracker
-        from utils import token_tracker
+        # Per-job input, outputs, checkpoint and token counts, so concurrent
+        # workers don't write over each other's files or usage
+        from context import PipelineContext
+        ctx = PipelineContext(
+            data_path=local_csv,
+            output_dir=_job_dir(job_id),
+            checkpoint_id=job_id,
+        )
 
-        token_usage = {}
+        token_usage = dict(state.get("token_usage", {}))
+
+        def settled() -> bool:
+            """True if the phase just run may be saved as finished."""
+            if not ctx.degraded:
+                return True
+            if attempt < cfg.API_JOB_MAX_ATTEMPTS:
+                raise RetryJob("; ".join(ctx.degraded))
+            return False
 
         # ── Phase 1: Taxonomy Discovery (with custom prompt) ──────────
         _update_job(job_id, current_phase=1, progress_pct=10)
 
-        token_tracker.reset()
-        from phase_1_seed import run as run_phase_1
+        if "taxonomy" in state:
+            # Resumed job: keep the taxonomy Phase 2 was checkpointed against
+            taxonomy, composed_prompt = state["taxonomy"], state["composed_prompt"]
+        else:
+            ctx.tracker.reset()
+            from phase_1_seed import run as run_phase_1
 
-        taxonomy, composed_prompt = run_phase_1(prompt_config=prompt_config)
-        token_usage["phase_1"] = token_tracker.get()
+            taxonomy, composed_prompt = run_phase_1(prompt_config=prompt_config, use_cache=use_cache, ctx=ctx)
+            token_usage["phase_1"] = ctx.tracker.get()
+            if settled():
+                state.update(taxonomy=taxonomy, composed_prompt=composed_prompt, token_usage=token_usage)
+                save_state(state)
 
         # Save the full composed prompt in metadata for reproducibility
         prompt_metadata = build_prompt_metadata(prompt_config, composed_prompt)
@@ -422,30 +536,41 @@ def _run_pipeline_job(job_id: str, file_path: str, config: dict, prompt_config:
         # ── Phase 2: Bulk Classification ──────────────────────────────
         _update_job(job_id, current_phase=2, progress_pct=40)
 
-        token_tracker.reset()
-        from phase_2_bulk import run as run_phase_2
-
-        # Extract Phase 2 provider/model from config
-        p2_config = config.get("phases", {}).get("phase_2", {})
-        p2_provider = p2_config.get("provider", "ollama")
-        p2_model = p2_config.get("model", cfg.P2_MODEL if p2_provider == "ollama" else None)
-
-        classifications, candidates = run_phase_2(
-            taxonomy=taxonomy,
-            provider=p2_provider,
-            model=p2_model,
-        )
-        token_usage["phase_2"] = token_tracker.get()
+        if "candidates" in state:
+            candidates = state["candidates"]
+        else:
+            ctx.tracker.reset()
+            from phase_2_bulk import run as run_phase_2
+
+            # Extract Phase 2 provider/model from config
+            p2_config = config.get("phases", {}).get("phase_2", {})
+            p2_provider = p2_config.get("provider", "ollama")
+            p2_model = p2_config.get("model", cfg.P2_MODEL if p2_provider == "ollama" else None)
+
+            # Per-job checkpoint: an interrupted job resumes at the next batch
+            _, candidates = run_phase_2(
+                taxonomy=taxonomy,
+                provider=p2_provider,
+                model=p2_model,
+                use_cache=use_cache,
+                discovery=p2_config.get("discovery"),
+                ctx=ctx,
+            )
+            token_usage["phase_2"] = ctx.tracker.get()
+            if settled():
+                state.update(candidates=candidates, token_usage=token_usage)
+                save_state(state)
 
         _update_job(job_id, progress_pct=75)
 
         # ── Phase 3: Taxonomy Finalization ────────────────────────────
         _update_job(job_id, current_phase=3, progress_pct=80)
 
-        token_tracker.reset()
+        ctx.tracker.reset()
         from phase_3_finalize import run as run_phase_3
-        phase_3_result = run_phase_3(taxonomy=taxonomy, candidates=candidates)
-        token_usage["phase_3"] = token_tracker.get()
+        phase_3_result = run_phase_3(taxonomy=taxonomy, candidates=candidates, use_cache=use_cache, ctx=ctx)
+        token_usage["phase_3"] = ctx.tracker.get()
+        settled()                      # retries a Phase 3 fallback, too
 
         _update_job(job_id, progress_pct=95)
 
@@ -488,13 +613,17 @@ def _run_pipeline_job(job_id: str, file_path: str, config: dict, prompt_config:
             },
             "token_usage": token_usage,
         }
+        if ctx.degraded:
+            # Last attempt: partial results beat none, but say so
+            summary["pipeline"]["degraded"] = ctx.degraded
 
-        eda = _build_eda_report(local_csv)
+        eda = profile_csv(local_csv)
 
         done = datetime.now(timezone.utc).isoformat()
         _update_job(
             job_id,
             status="completed",
+            error_message=None,
             current_phase=3,
             progress_pct=100,
             completed_at=done,
@@ -504,72 +633,73 @@ def _run_pipeline_job(job_id: str, file_path: str, config: dict, prompt_config:
             eda_report=eda,
             token_usage=token_usage,
         )
+        _remove_job_dir(job_id)
+        return True
+
+    except RetryJob as e:
+        _update_job(
+            job_id,
+            status="queued",
+            error_message=f"Attempt {attempt} incomplete, retrying: {e}",
+        )
+        raise
 
     except Exception as e:
+        if job_pool.stopping:
+            # Cut off by shutdown: the pool puts it back in the queue, and
+            # its checkpoint stays for the next attempt
+            _mark_queued(job_id)
+            return False
         _update_job(
             job_id,
             status="failed",
             error_message=str(e),
             completed_at=datetime.now(timezone.utc).isoformat(),
         )
+        _remove_job_dir(job_id)
+        return False
+
+
+def _run_queued_job(job: dict, save_state) -> bool:
+    """JobPool entry point: unpack the queued payload."""
+    payload = job["payload"]
+    return _run_pipeline_job(
+        job["job_id"],
+        payload["file_path"],
+        payload["config"],
+        payload.get("prompt_config"),
+        payload.get("use_cache", True),
+        state=job["state"],
+        save_state=save_state,
+        attempt=job["attempts"] + 1,
+    )
+
+
+def _on_requeue(job_id: str, failed: bool):
+    if failed:
+        _update_job(
+            job_id,
+            status="failed",
+            error_message=f"Interrupted {cfg.API_JOB_MAX_ATTEMPTS} times (server restarts)",
+            completed_at=datetime.now(timezone.utc).isoformat(),
+        )
+        _remove_job_dir(job_id)
+    else:
+        _mark_queued(job_id)
 
-def _build_eda_report(csv_path: str) -> dict:
-    """Compute basic EDA stats from the raw CSV."""
-    import csv as csv_mod
 
-    with open(csv_path, "r", encoding="utf-8") as f:
-        reader = csv_mod.DictReader(f)
-        rows = list(reader)
+job_pool = JobPool(open_store(db), _run_queued_job, on_requeue=_on_requeue)
 
-    if not rows:
-        return {"basic": {"total_rows": 0}}
 
-    columns = list(rows[0].keys())
-    messages = [r.get("message", "") for r in rows]
-    char_lens = [len(m) for m in messages]
-    word_counts = [len(m.split()) for m in messages]
+@app.on_event("startup")
+def _start_job_pool():
+    job_pool.start()
 
-    def pctl(arr, p):
-        s = sorted(arr)
-        i = int(len(s) * p / 100)
-        return s[min(i, len(s) - 1)]
 
-    # Interaction stats
-    pairs = [(r.get("nominator_title", ""), r.get("recipient_title", "")) for r in rows]
-    unique_pairs = len(set(pairs))
-    recips = set(r.get("recipient_title", "") for r in rows)
-    noms = set(r.get("nominator_title", "") for r in rows)
+@app.on_event("shutdown")
+def _stop_job_pool():
+    job_pool.stop()
 
-    return {
-        "basic": {
-            "total_rows": len(rows),
-            "total_columns": len(columns),
-            "columns": columns,
-            "null_counts": {c: sum(1 for r in rows if not r.get(c)) for c in columns},
-        },
-        "message": {
-            "char_length": {
-                "min": min(char_lens),
-                "max": max(char_lens),
-                "mean": round(sum(char_lens) / len(char_lens), 1),
-                "median": pctl(char_lens, 50),
-                "std": round((sum((x - sum(char_lens)/len(char_lens))**2 for x in char_lens) / len(char_lens)) ** 0.5, 1),
-                "p5": pctl(char_lens, 5),
-                "p95": pctl(char_lens, 95),
-            },
-            "word_count": {
-                "min": min(word_counts),
-                "max": max(word_counts),
-                "mean": round(sum(word_counts) / len(word_counts), 1),
-            },
-        },
-        "interactions": {
-            "total_interactions": len(rows),
-            "unique_pairs": unique_pairs,
-            "unique_recipients": len(recips),
-            "unique_nominators": len(noms),
-        },
-    }
 
 @app.get("/api/health")
 def health():
@@ -577,4 +707,10 @@ def health():
         res = db.table("pipeline_jobs").select("job_id", count="exact").limit(1).execute()
         return {"status": "healthy", "jobs_count": res.count or 0}
     except Exception as e:
-        return {"status": "error", "detail": str(e)}
\ No newline at end of file
+        return {"status": "error", "detail": str(e)}
+
+
+@app.get("/api/providers/health")
+def providers_health():
+    """Circuit-breaker state, error rate and latency per LLM provider."""
+    return {"providers": provider_health.snapshot()}
\ No newline at end of file
@@ -0,0 +1,137 @@
+"""
+batch_planner.py — Token-aware batching for classification prompts.
+
+Instead of a fixed number of rows per call, messages are packed into
+batches that fill the model's context/output budget from the
+"context_limits" section of model_registry.json:
+
+    "context_limits": {
+      "ollama": {"llama3:8b": {"context_tokens": 8192, "max_output_tokens": 2048}}
+    }
+
+Short messages share a call, long ones get fewer neighbours, and no batch
+overflows the window. Batches keep the input order (greedy next-fit), so
+a plan is deterministic for a given input and batch N always means the
+same rows — which checkpoint resume relies on.
+
+Deliberately free of config/pandas imports so the standalone scripts in
+scripts/ can use it too:
+
+    sys.path.insert(0, "../taxonomy_pipeline")
+    from batch_planner import plan_batches, get_model_budget
+"""
+
+import json
+import math
+import re
+from pathlib import Path
+
+REGISTRY_PATH = Path(__file__).resolve().parent / "model_registry.json"
+
+# Leave room for tokenizer disagreement between this estimate and the model
+SAFETY_MARGIN = 0.9
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate BPE token count without a model tokenizer.
+
+    Counts words and punctuation, then charges long words extra since
+    Llama/GPT-style vocabularies split them into ~4-char pieces.
+    """
+    if not text:
+        return 0
+    total = 0
+    for piece in _TOKEN_RE.findall(text):
+        total += 1 if len(piece) <= 6 else math.ceil(len(piece) / 4)
+    return total
+
+
+_registry_cache: dict | None = None
+
+
+def _load_registry() -> dict:
+    global _registry_cache
+    if _registry_cache is None:
+        with open(REGISTRY_PATH) as f:
+            _registry_cache = json.load(f)
+    return _registry_cache
+
+
+def get_model_budget(provider: str, model: str, max_output_tokens: int = None) -> dict:
+    """
+    Context and output budget for a registry provider/model.
+
+    The context is also capped at the model's TPM limit (if any), since a
+    single request larger than a minute's token budget can never be sent.
+    max_output_tokens further caps the output budget, e.g. to the
+    max_tokens the caller will actually request.
+    """
+    reg = _load_registry()
+    by_model = reg.get("context_limits", {}).get(provider, {})
+    limits = by_model.get(model) or by_model.get("default") or {}
+    context = limits.get("context_tokens", 8192)
+    output = limits.get("max_output_tokens", 2048)
+
+    rate = reg.get("rate_limits", {}).get(provider, {})
+    tpm = (rate.get(model) or rate.get("default") or {}).get("tpm")
+    if tpm:
+        context = min(context, tpm)
+    if max_output_tokens:
+        output = min(output, max_output_tokens)
+
+    return {"context_tokens": context, "max_output_tokens": min(output, context)}
+
+
+def plan_batches(
+    texts: list[str],
+    overhead_tokens: int,
+    output_tokens_per_item: int,
+    context_tokens: int,
+    max_output_tokens: int,
+    max_items: int = None,
+) -> list[list[int]]:
+    """
+    Pack texts (already truncated/formatted as they will appear in the
+    prompt) into batches of positions.
+
+    A batch is closed when adding the next item would exceed either
+        overhead + Σ input + Σ output  >  context_tokens × SAFETY_MARGIN
+        Σ output                        >  max_output_tokens
+    or when it reaches max_items. An item too large to fit on its own
+    still gets a batch by itself rather than being dropped.
+    """
+    context_budget = int(context_tokens * SAFETY_MARGIN) - overhead_tokens
+    batches: list[list[int]] = []
+    current: list[int] = []
+    used_ctx = 0
+    used_out = 0
+
+    for pos, text in enumerate(texts):
+        cost = estimate_tokens(text) + output_tokens_per_item
+        full = (
+            used_ctx + cost > context_budget
+            or used_out + output_tokens_per_item > max_output_tokens
+            or (max_items and len(current) >= max_items)
+        )
+        if current and full:
+            batches.append(current)
+            current, used_ctx, used_out = [], 0, 0
+        current.append(pos)
+        used_ctx += cost
+        used_out += output_tokens_per_item
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def assign_batch_ids(texts: list[str], **plan_kwargs) -> list[int]:
+    """1-based batch id per text — drop-in for the scripts' batch_id column."""
+    ids = [0] * len(texts)
+    for batch_id, positions in enumerate(plan_batches(texts, **plan_kwargs), start=1):
+        for pos in positions:
+            ids[pos] = batch_id
+    return ids
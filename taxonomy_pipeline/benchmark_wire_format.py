@@ -0,0 +1,153 @@
+"""
+benchmark_wire_format.py — Phase 2 JSON vs compact response format.
+
+Sends the same batches of messages in both formats (cache bypassed) and
+reports per format: latency and output tokens per batch, output tokens
+per item, and how many items came back parsed and valid. Formats
+alternate which goes first per batch so model warm-up doesn't favour one.
+
+    python benchmark_wire_format.py --provider ollama --batches 10 --batch-size 8
+    python benchmark_wire_format.py --provider groq --model llama-3.3-70b-versatile
+
+Results are also saved to outputs/benchmarks/wire_format.json.
+"""
+
+import argparse
+import statistics
+import time
+
+import config as cfg
+from phase_2_bulk import (
+    _call_provider, build_batch_prompt, build_response_schema, build_taxonomy_schema,
+    parse_batch_response, parse_compact_response, taxonomy_ids,
+)
+from utils import ensure_dir, get_logger, load_json, load_messages, save_json, token_tracker
+
+logger = get_logger("benchmark")
+
+FORMATS = ("json", "compact")
+
+
+def run_batch(
+    texts: list[str],
+    fmt: str,
+    schema: str,
+    ids: dict[str, set[str]],
+    provider: str,
+    model: str,
+) -> dict:
+    compact = fmt == "compact"
+    items = [{"idx": j + 1, "text": t} for j, t in enumerate(texts)]
+
+    token_tracker.reset()
+    start = time.perf_counter()
+    response = _call_provider(
+        build_batch_prompt(schema, items, compact=compact), provider, model,
+        use_cache=False,
+        expected_idx={item["idx"] for item in items},
+        compact=compact,
+        response_schema=None if compact or not cfg.P2_STRUCTURED_OUTPUT else build_response_schema(ids),
+    )
+    latency = time.perf_counter() - start
+    usage = token_tracker.get()
+
+    if compact:
+        parsed = parse_compact_response(response, len(texts), ids)
+    else:
+        parsed = parse_batch_response(response, len(texts))
+    valid = {
+        item.get("idx") for item in parsed
+        if item.get("category") in ids
+        and (not item.get("subcategory") or item["subcategory"] in ids[item["category"]])
+    }
+
+    return {
+        "latency_s": latency,
+        "output_tokens": usage["output_tokens"],
+        "input_tokens": usage["input_tokens"],
+        "items": len(texts),
+        "parsed": len(parsed),
+        "valid": len(valid),
+        "failed": response is None,
+    }
+
+
+def summarize(rows: list[dict]) -> dict:
+    ok = [r for r in rows if not r["failed"]]
+    items = sum(r["items"] for r in ok) or 1
+    return {
+        "batches": len(rows),
+        "failed_batches": len(rows) - len(ok),
+        "latency_mean_s": round(statistics.mean(r["latency_s"] for r in ok), 2) if ok else None,
+        "latency_median_s": round(statistics.median(r["latency_s"] for r in ok), 2) if ok else None,
+        "output_tokens_per_batch": round(statistics.mean(r["output_tokens"] for r in ok), 1) if ok else None,
+        "output_tokens_per_item": round(sum(r["output_tokens"] for r in ok) / items, 1),
+        "input_tokens_per_batch": round(statistics.mean(r["input_tokens"] for r in ok), 1) if ok else None,
+        "parsed_rate": round(sum(r["parsed"] for r in ok) / items, 3),
+        "valid_rate": round(sum(r["valid"] for r in ok) / items, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Phase 2 JSON vs compact responses")
+    parser.add_argument("--provider", default="ollama", choices=["ollama", "groq", "google", "anthropic"])
+    parser.add_argument("--model", default=None, help="Model name (defaults per provider)")
+    parser.add_argument("--batches", type=int, default=10, help="Batches per format")
+    parser.add_argument("--batch-size", type=int, default=8, help="Messages per batch")
+    args = parser.parse_args()
+
+    model = args.model or {
+        "ollama": cfg.P2_MODEL,
+        "groq": cfg.GROQ_DEFAULT_MODEL,
+        "google": cfg.GEMINI_DEFAULT_MODEL,
+        "anthropic": "claude-sonnet-4-5-20250929",
+    }[args.provider]
+
+    taxonomy = load_json(cfg.OUTPUT_DIR / "phase_1_taxonomy.json")["taxonomy"]
+    schema = build_taxonomy_schema(taxonomy)
+    ids = taxonomy_ids(taxonomy)
+
+    messages = load_messages()
+    batches = [
+        messages[i:i + args.batch_size]
+        for i in range(0, min(len(messages), args.batches * args.batch_size), args.batch_size)
+    ]
+
+    rows = {fmt: [] for fmt in FORMATS}
+    for n, texts in enumerate(batches, 1):
+        order = FORMATS if n % 2 else FORMATS[::-1]
+        for fmt in order:
+            row = run_batch(texts, fmt, schema, ids, args.provider, model)
+            rows[fmt].append(row)
+            logger.info(
+                f"Batch {n}/{len(batches)} {fmt:7s} {row['latency_s']:6.2f}s "
+                f"{row['output_tokens']:5d} out tokens, {row['valid']}/{row['items']} valid"
+            )
+
+    summary = {fmt: summarize(rows[fmt]) for fmt in FORMATS}
+
+    print("\n" + "=" * 70)
+    print(f"WIRE FORMAT BENCHMARK — {args.provider}/{model}, "
+          f"{len(batches)} batches × {args.batch_size} messages")
+    print("=" * 70)
+    print(f"  {'':26s}{'json':>14s}{'compact':>14s}")
+    for key in summary["json"]:
+        print(f"  {key:26s}{str(summary['json'][key]):>14s}{str(summary['compact'][key]):>14s}")
+    print("=" * 70)
+
+    out_dir = ensure_dir(cfg.OUTPUT_DIR / "benchmarks")
+    save_json(
+        {
+            "provider": args.provider,
+            "model": model,
+            "batch_size": args.batch_size,
+            "summary": summary,
+            "batches": rows,
+        },
+        out_dir / "wire_format.json",
+        "Wire format benchmark",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+checkpoint.py — Append-only batch journal for Phase 2 crash recovery.
+
+Each committed batch is appended to phase_2_journal.jsonl as one line
+and fsync'd, so checkpoint cost per batch is constant no matter how many
+messages have been processed, and a crash loses at most the batch being
+written. Lines are never rewritten, and no compaction is needed: a run
+skips the batches its journal already holds, so each batch is journalled
+once and the file only ever holds one line per completed batch. (If a
+batch did appear twice, load() keeps its latest record.)
+
+Line types:
+    {"type": "plan", "plan": ...}                                (first line)
+    {"type": "batch", "batch": N, "results": [...], "candidates": {...}}
+
+Only successful batches are journalled, so a resumed run retries the
+batches that failed and skips every one that completed. A journal
+written for a different batch plan (other data, batch size or cascade
+split) is discarded on load rather than resumed.
+"""
+
+import json
+import os
+from collections import defaultdict
+from pathlib import Path
+
+from utils import get_logger
+
+logger = get_logger("checkpoint")
+
+
+def _fsync_dir(path: Path) -> None:
+    """Persist a rename (no-op where directories can't be opened, e.g. Windows)."""
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class BatchJournal:
+    """
+    Usage:
+        journal = BatchJournal(cfg.P2_CHECKPOINT_DIR / "phase_2_journal.jsonl", plan_id)
+        results, candidates, done = journal.load()
+        ...
+        journal.append(batch_num, batch_results, batch_candidates)
+        ...
+        journal.remove()
+    """
+
+    def __init__(self, path: Path, plan_id: str = None):
+        self.path = Path(path)
+        self.plan_id = plan_id
+        self._file = None
+
+    def load(self) -> tuple[list[dict], dict[str, int], set[int]]:
+        """
+        Replay the journal. Returns (results, candidates, completed batch
+        numbers); a batch journalled twice counts once, with its latest
+        record. A torn last line from a crash mid-append is dropped.
+        """
+        if not self.path.exists():
+            return [], defaultdict(int), set()
+
+        batches: dict[int, dict] = {}
+        good_bytes = lines = 0
+        with open(self.path, "rb") as f:
+            for raw in f:
+                try:
+                    entry = json.loads(raw)
+                except ValueError:
+                    logger.warning("Ignoring torn last line in checkpoint journal")
+                    break
+                if lines == 0:
+                    if entry.get("type") != "plan" or entry.get("plan") != self.plan_id:
+                        logger.warning("Checkpoint is for a different batch plan — starting fresh")
+                        self.remove()
+                        return [], defaultdict(int), set()
+                else:
+                    batches[entry["batch"]] = entry
+                good_bytes += len(raw)
+                lines += 1
+
+        if good_bytes < self.path.stat().st_size:
+            with open(self.path, "r+b") as f:
+                f.truncate(good_bytes)
+
+        results: list[dict] = []
+        candidates: dict[str, int] = defaultdict(int)
+        for entry in batches.values():
+            results.extend(entry["results"])
+            for name, n in entry["candidates"].items():
+                candidates[name] += n
+
+        if batches:
+            logger.info(
+                f"Resuming from checkpoint: {len(batches)} batches done "
+                f"({len(results)} classifications recovered)"
+            )
+        return results, candidates, set(batches)
+
+    def append(
+        self,
+        batch_num: int,
+        results: list[dict],
+        candidates: dict[str, int],
+    ) -> None:
+        """Durably record one completed batch (its own results/candidates only)."""
+        if self._file is None:
+            if not self.path.exists() or self.path.stat().st_size == 0:
+                self._write_header()
+            self._file = open(self.path, "a", encoding="utf-8")
+
+        line = json.dumps(
+            {
+                "type": "batch",
+                "batch": batch_num,
+                "results": results,
+                "candidates": candidates,
+            },
+            ensure_ascii=False,
+        )
+        self._file.write(line + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _write_header(self) -> None:
+        """Start the journal with its plan id (temp file + rename, never torn)."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"type": "plan", "plan": self.plan_id}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        _fsync_dir(self.path.parent)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self) -> None:
+        """Delete the journal once the phase has finished."""
+        self.close()
+        if self.path.exists():
+            self.path.unlink()
+            logger.info("Checkpoint cleaned up")
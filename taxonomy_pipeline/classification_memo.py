@@ -0,0 +1,180 @@
+"""
+classification_memo.py — Persistent per-message Phase 2 classifications.
+
+Every message the LLM classifies is recorded in SQLite under
+(message hash, taxonomy hash, model), where the message hash is taken
+over the dedup-normalized text. Phase 2 looks messages up here before
+batching, so re-uploading a CSV with a few new rows only pays for the
+new rows — regardless of row order or batch size.
+
+Unlike the LLM response cache (llm_cache.py), which only helps when the
+exact same prompt is rebuilt, the memo works per message.
+
+CLI:
+    python classification_memo.py --stats
+    python classification_memo.py --clear
+"""
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import config as cfg
+from dedup import normalize_message
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS classification_memo (
+    message_hash   TEXT NOT NULL,
+    taxonomy_hash  TEXT NOT NULL,
+    model          TEXT NOT NULL,
+    provider       TEXT NOT NULL,
+    category       TEXT NOT NULL,
+    subcategory    TEXT NOT NULL,
+    themes         TEXT NOT NULL,
+    new_category   TEXT,
+    created_at     REAL NOT NULL,
+    PRIMARY KEY (message_hash, taxonomy_hash, model)
+);
+"""
+
+# SQLite's default limit on bound parameters is 999
+_LOOKUP_CHUNK = 500
+
+
+def message_hash(text: str) -> str:
+    return hashlib.sha256(normalize_message(text).encode("utf-8")).hexdigest()
+
+
+def taxonomy_hash(taxonomy: dict) -> str:
+    """Stable short hash of a taxonomy's structure."""
+    blob = json.dumps(taxonomy, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+class ClassificationMemo:
+    """
+    Thread-safe SQLite store of message classifications.
+
+    Usage:
+        memo = get_memo()
+        hits = memo.get_many(hashes, tax_hash, model)   # {message_hash: label}
+        memo.put_many([(message_hash, label), ...], tax_hash, provider, model)
+
+    A label is {"category", "subcategory", "themes", "new_category"}.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def get_many(self, hashes: list[str], tax_hash: str, model: str) -> dict[str, dict]:
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            for i in range(0, len(unique), _LOOKUP_CHUNK):
+                chunk = unique[i:i + _LOOKUP_CHUNK]
+                rows = self._conn.execute(
+                    "SELECT message_hash, category, subcategory, themes, new_category "
+                    "FROM classification_memo "
+                    "WHERE taxonomy_hash = ? AND model = ? "
+                    f"AND message_hash IN ({','.join('?' * len(chunk))})",
+                    (tax_hash, model, *chunk),
+                ).fetchall()
+                for h, category, subcategory, themes, new_category in rows:
+                    found[h] = {
+                        "category": category,
+                        "subcategory": subcategory,
+                        "themes": json.loads(themes),
+                        "new_category": new_category,
+                    }
+        return found
+
+    def put_many(
+        self,
+        entries: list[tuple[str, dict]],
+        tax_hash: str,
+        provider: str,
+        model: str,
+    ) -> None:
+        now = time.time()
+        rows = [
+            (
+                h, tax_hash, model, provider,
+                str(label.get("category") or ""),
+                str(label.get("subcategory") or ""),
+                json.dumps(label.get("themes") or [], ensure_ascii=False),
+                label.get("new_category") if isinstance(label.get("new_category"), str) else None,
+                now,
+            )
+            for h, label in entries
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO classification_memo "
+                "(message_hash, taxonomy_hash, model, provider, category, "
+                " subcategory, themes, new_category, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def clear(self) -> int:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM classification_memo")
+            self._conn.commit()
+            return cur.rowcount
+
+    def stats(self) -> list[tuple[str, str, int]]:
+        """(taxonomy hash, model, entries) per group."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT taxonomy_hash, model, COUNT(*) FROM classification_memo "
+                "GROUP BY taxonomy_hash, model ORDER BY 3 DESC"
+            ).fetchall()
+
+
+_memo: ClassificationMemo | None = None
+_memo_lock = threading.Lock()
+
+
+def get_memo() -> ClassificationMemo | None:
+    """Process-wide memo instance, or None when P2_MEMO_ENABLED is off."""
+    global _memo
+    if not cfg.P2_MEMO_ENABLED:
+        return None
+    with _memo_lock:
+        if _memo is None:
+            _memo = ClassificationMemo(cfg.P2_MEMO_PATH)
+    return _memo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the Phase 2 classification memo")
+    parser.add_argument("--stats", action="store_true", help="Show entries per taxonomy/model")
+    parser.add_argument("--clear", action="store_true", help="Delete every memoized classification")
+    args = parser.parse_args()
+
+    memo = ClassificationMemo(cfg.P2_MEMO_PATH)
+
+    if args.clear:
+        print(f"Removed {memo.clear()} entries")
+
+    if args.stats or not args.clear:
+        stats = memo.stats()
+        if not stats:
+            print(f"Memo is empty ({memo.path})")
+        for tax, model, n in stats:
+            print(f"  {tax}  {model:32s} {n:7d} messages")
+
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,7 @@ if not ANTHROPIC_API_KEY and not GOOGLE_API_KEY and not GROQ_API_KEY:
     )
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
+MODEL_REGISTRY_PATH = Path(__file__).resolve().parent / "model_registry.json"
 DATA_DIR = PROJECT_ROOT / "data"
 OUTPUT_DIR = PROJECT_ROOT / "outputs"
 
@@ -36,9 +37,22 @@ COL_AWARD_TITLE = "award_title"
 COL_RECIPIENT_TITLE = "recipient_title"
 COL_NOMINATOR_TITLE = "nominator_title"
 
+# Awards CSV is streamed in chunks of this many rows (bounds peak memory)
+AWARDS_CHUNK_ROWS = 50_000
+
 # PHASE 1 — Claude/Gemini Seeds Taxonomy
 P1_SAMPLE_SIZE = 100          # messages to sample for taxonomy discovery
 P1_RANDOM_STATE = 42          # reproducibility seed (set None for true random)
+# "random" (uniform) or "cluster": k-means over hashed TF-IDF, one message per
+# cluster plus outliers — covers small themes with a smaller P1_SAMPLE_SIZE
+P1_SAMPLING = "random"
+P1_CLUSTER_POOL = 20_000      # rows clustered, drawn uniformly (bounds cost on large uploads)
+P1_CLUSTER_OUTLIER_FRAC = 0.1 # share of the sample taken from messages far from any centroid
+# Exploration — P1_EXPLORE_RUNS > 1 runs that many Phase 1 calls concurrently on
+# disjoint samples and merges them into a consensus taxonomy + stability score
+P1_EXPLORE_RUNS = 1
+P1_MERGE_THRESHOLD = 0.35     # min similarity to align categories across runs
+P1_CONSENSUS_MIN_SUPPORT = 0.5  # share of runs a category must appear in to be kept
 P1_MSG_TRUNCATE = 500         # max chars per message sent to LLM
 P1_MAX_TOKENS = 3000          # headroom for 6-8 categories with descriptions + reasoning
 
@@ -55,19 +69,80 @@ P1_MODELS = {
 
 # PHASE 2 — Local SLM Bulk Processing
 P2_BATCH_SIZE = 5             # messages per Ollama call (keep ≤8 for 8K context)
+P2_BATCH_PLANNER = True       # token-pack batches to the model's budget instead
+P2_OUTPUT_TOKENS_PER_ITEM = 45  # reserved output per message (one JSON object)
+P2_COMPACT_OUTPUT_TOKENS_PER_ITEM = 15  # same, for P2_RESPONSE_FORMAT = "compact"
+P2_MAX_BATCH_ITEMS = 40       # cap so one bad response can't lose too much
+P2_OLLAMA_NUM_CTX = 8192      # context window requested from Ollama (its default is 2048)
+P2_WORKERS = {                # batches in flight per provider
+    "ollama": 1,              # raise to match OLLAMA_NUM_PARALLEL on the server
+    "groq": 4,
+    "google": 4,
+    "anthropic": 4,
+}
 P2_MSG_TRUNCATE = 400         # max chars per message (smaller window than Claude)
 P2_MODEL = "llama3:8b"           # actual model tag in Ollama — NOT "llama2"
 P2_TEMPERATURE = 0.15         # low temp for classification consistency
 P2_TIMEOUT = 120              # seconds per Ollama request
 P2_OLLAMA_URL = "http://localhost:11434/api/generate"
 
+# Response format — "json" (array of objects) or "compact" (one
+# "idx;category;subcategory;theme|theme;new" line per message, far fewer
+# output tokens). Compare with: python benchmark_wire_format.py
+P2_RESPONSE_FORMAT = "json"
+# Constrain "json" responses natively (Ollama format, Gemini responseSchema,
+# Groq JSON mode, Claude tool use) with a schema whose category/subcategory
+# IDs are enums from the taxonomy. Ollama needs v0.5+ for schema formats.
+P2_STRUCTURED_OUTPUT = True
+
+# Streaming — parse Ollama's token stream and stop once the batch is answered
+P2_OLLAMA_STREAM = True
+P2_STREAM_MAX_JUNK_CHARS = 300   # non-JSON chars outside objects before aborting
+P2_STREAM_MAX_BAD_OBJECTS = 2    # undecodable objects before aborting
+
+# Recovery — re-ask for items missing from an answer, bisect batches that fail
+P2_REASK_ATTEMPTS = 1        # follow-up calls for the still-missing items
+P2_BISECT = True             # split failing batches to isolate the message that breaks the model
+
+# Dedup — classify one representative per cluster of (near-)identical messages
+P2_DEDUP = "normalized"      # "normalized", "minhash", or None to classify every row
+P2_DEDUP_THRESHOLD = 0.8     # min estimated Jaccard similarity for "minhash" merges
+
+# Memo — per-message classifications reused across runs (same taxonomy + model)
+P2_MEMO_ENABLED = True       # False (or --no-cache) classifies every message afresh
+P2_MEMO_PATH = OUTPUT_DIR / "cache" / "classification_memo.sqlite"
+
+# Cascade — a local TF-IDF classifier labels messages first; only those it is
+# unsure about go to the LLM (requires scikit-learn)
+P2_CASCADE = False
+P2_CASCADE_THRESHOLD = 0.75  # min class probability to accept the local label
+P2_CASCADE_WARMUP = 300      # messages labelled by the LLM to train on when no model exists
+P2_CASCADE_MIN_TRAIN = 50    # fewer labelled examples than this → no local model
+P2_CASCADE_AUDIT_FRAC = 0.05 # share of confident messages also sent to the LLM to measure agreement
+P2_CASCADE_DIR = OUTPUT_DIR / "cache" / "cascade"  # per-taxonomy models, shared across runs
+
+# Discovery — classify a random sample, stopping once category and candidate
+# shares are known to ±P2_DISCOVERY_MARGIN; Phase 3 gets scaled-up counts
+P2_DISCOVERY = False
+P2_DISCOVERY_MARGIN = 0.02       # max CI half-width on any share (0.02 = ±2 points)
+P2_DISCOVERY_CONFIDENCE = 0.95
+P2_DISCOVERY_MIN_SAMPLE = 400    # never stop before this many labelled messages
+P2_DISCOVERY_ROUND = 200         # messages sampled between convergence checks
+P2_DISCOVERY_SEED = 42
+
 # Candidate filtering
 P2_MIN_CANDIDATE_FREQ = 3    # minimum occurrences to surface a new category
 
 # Checkpointing — crash recovery for long-running Phase 2
-P2_CHECKPOINT_EVERY = 20     # save intermediate results every N batches
 P2_CHECKPOINT_DIR = OUTPUT_DIR / "checkpoints"
 
+# Distributed — with a queue file on shared disk, Phase 2 enqueues its batches
+# and phase_2_worker.py processes (one per machine/Ollama) lease them
+P2_QUEUE_PATH = None             # e.g. "/mnt/shared/phase_2_queue.sqlite"
+P2_QUEUE_LEASE_SECONDS = 300     # a batch held longer without renewal goes back to the queue
+P2_QUEUE_MAX_ATTEMPTS = 3        # leases per batch before it is reported as failed
+P2_QUEUE_POLL_SECONDS = 2.0
+
 # If True, simulate Phase 2 without Ollama (for testing Phase 1 + 3 flow)
 P2_ALLOW_SIMULATION = False
 
@@ -84,9 +159,63 @@ P3_MODELS = {
 }
 
 # Retry settings for rate-limited APIs
+# (RPM/TPM/daily caps per model live in model_registry.json "rate_limits")
 LLM_MAX_RETRIES = 3
-LLM_RETRY_DELAY = 5  # seconds between retries
+LLM_RETRY_DELAY = 5  # base seconds for jittered exponential backoff
+LLM_BACKOFF_MAX = 60 # cap on a single backoff sleep
+
+# Circuit breaker — skip a failing provider for a cooldown, then probe it
+LLM_BREAKER_WINDOW = 20         # recent calls used for error rate / latency
+LLM_BREAKER_MIN_CALLS = 5       # calls in window before error rate can trip
+LLM_BREAKER_ERROR_RATE = 0.5    # open when this fraction of the window failed
+LLM_BREAKER_COOLDOWN = 60       # seconds open before a half-open probe
+LLM_BREAKER_MAX_COOLDOWN = 900  # cooldown doubles per failed probe, up to this
+
+# Hedged requests — race the next provider if the primary is slow
+LLM_HEDGE_ENABLED = False
+LLM_HEDGE_DEFAULT_DELAY = 20.0  # seconds before hedging, until p95 is known
+LLM_HEDGE_MIN_SAMPLES = 10      # latencies needed before trusting p95
+
+# HTTP transport — pooled keep-alive clients shared by all LLM calls
+HTTP_MAX_CONNECTIONS = {     # per-host connection cap
+    "ollama": 4,             # match OLLAMA_NUM_PARALLEL on the server
+    "gemini": 16,
+    "groq": 16,
+}
+HTTP_MAX_CONNECTIONS_DEFAULT = 8
+HTTP_KEEPALIVE_EXPIRY = 60   # seconds an idle connection stays open
+HTTP_TIMEOUT = 120           # seconds per request (read/write)
+HTTP_CONNECT_TIMEOUT = 10    # seconds to establish a connection
+
+# LLM response cache — disk-backed, keyed on a hash of the full request
+LLM_CACHE_ENABLED = True      # False (or --no-cache) bypasses reads and writes
+LLM_CACHE_PATH = OUTPUT_DIR / "cache" / "llm_cache.sqlite"
+LLM_CACHE_MAX_MB = 512        # LRU-evict beyond this size
+LLM_CACHE_MAX_AGE_DAYS = 30   # entries older than this are dropped
+
+# API job queue — /api/run enqueues jobs; a fixed worker pool runs them
+API_QUEUE_BACKEND = os.environ.get("PIPELINE_QUEUE_BACKEND", "sqlite")  # "sqlite" | "supabase"
+API_QUEUE_PATH = OUTPUT_DIR / "cache" / "api_jobs.sqlite"
+API_QUEUE_TABLE = "pipeline_queue"     # Supabase table for the "supabase" backend
+API_WORKERS = 2                        # pipelines running at once per API process
+API_PROVIDER_CONCURRENCY = {           # running jobs that may use each provider
+    "ollama": 1,
+    "groq": 2,
+    "google": 2,
+    "anthropic": 2,
+}
+API_QUEUE_MAX_PENDING = 20             # queued + running jobs; beyond this /api/run returns 429
+API_RETRY_AFTER_SECONDS = 60           # Retry-After sent with the 429
+API_QUEUE_POLL_SECONDS = 2.0           # idle workers re-check the queue this often
+API_JOB_HEARTBEAT_SECONDS = 15
+API_JOB_STALE_SECONDS = 90             # no heartbeat this long → job re-queued (e.g. after a restart)
+API_JOB_MAX_ATTEMPTS = 3               # interrupted this many times → failed
 
 # PIPELINE-LEVEL
 SAVE_INTERMEDIATE = True      # write phase outputs to disk between phases
+# Phase artifacts keyed by a fingerprint of their inputs (data, upstream
+# artifacts, config, prompts) — unchanged phases are skipped. Shared by
+# every --run-name.
+ARTIFACT_DIR = OUTPUT_DIR / "artifacts"
+DAG_WORKERS = 4               # independent pipeline nodes run concurrently
 LOG_LEVEL = "INFO"            # DEBUG | INFO | WARNING
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""
+context.py — Per-run pipeline state.
+
+The phases used to take their input file, output directory and token
+counts from module globals (config.py and utils.token_tracker). Two
+pipelines in one process, e.g. concurrent API jobs, then overwrote each
+other's outputs, Phase 2 checkpoints and token counts. A
+PipelineContext carries that state for one run instead:
+
+    ctx = PipelineContext(data_path=local_csv, output_dir=job_dir, checkpoint_id=job_id)
+    taxonomy, prompt = phase_1_seed.run(ctx=ctx)
+    ...
+    ctx.tracker.get()
+
+Settings (models, thresholds, batch sizes) are still read from config.py.
+A phase called without a context uses PipelineContext.default(), built
+from the current cfg.AWARDS_CSV / cfg.OUTPUT_DIR / cfg.P2_CHECKPOINT_DIR
+and the shared token_tracker. That is what the CLI (and --run-name)
+sets up.
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import config as cfg
+from utils import TokenTracker, token_tracker
+
+
+@dataclass
+class PipelineContext:
+    """
+    data_path:      awards CSV this run reads
+    output_dir:     where the phases write their JSON outputs
+    checkpoint_dir: Phase 2 journal directory (default output_dir/checkpoints)
+    checkpoint_id:  namespaces the Phase 2 journal file, so runs sharing a
+                    checkpoint_dir don't resume each other's batches
+    tracker:        token usage of this run's LLM calls
+    degraded:       set by the phases when their output is a fallback or
+                    partial (default taxonomy, aborted Phase 2, ...), so
+                    callers don't store it as a finished result
+    """
+    data_path: Path
+    output_dir: Path
+    checkpoint_dir: Path = None
+    checkpoint_id: str | None = None
+    tracker: TokenTracker = field(default_factory=TokenTracker)
+    degraded: list[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        self.data_path = Path(self.data_path)
+        self.output_dir = Path(self.output_dir)
+        self.checkpoint_dir = Path(self.checkpoint_dir or self.output_dir / "checkpoints")
+
+    @classmethod
+    def default(cls) -> "PipelineContext":
+        """The process-wide settings from config.py (CLI runs)."""
+        return cls(
+            data_path=cfg.AWARDS_CSV,
+            output_dir=cfg.OUTPUT_DIR,
+            checkpoint_dir=cfg.P2_CHECKPOINT_DIR,
+            tracker=token_tracker,
+        )
+
+    @property
+    def journal_path(self) -> Path:
+        name = f"phase_2_journal_{self.checkpoint_id}.jsonl" if self.checkpoint_id else "phase_2_journal.jsonl"
+        return self.checkpoint_dir / name
@@ -0,0 +1,246 @@
+"""
+csv_profile.py — Incremental validation and profile of an uploaded CSV.
+
+The upload API used to read the whole body, decode it and build a list
+of row dicts before checking anything, so a large export sat in memory
+several times over. CsvProfiler is fed raw byte chunks instead:
+
+    profiler = CsvProfiler(required={"message", "award_title", ...})
+    for chunk in chunks:
+        profiler.feed(chunk)       # header checked as soon as it arrives
+    report = profiler.close()      # row count, null counts, message lengths
+
+Only statistics are kept: per-column null counts, histograms of message
+character and word lengths (exact percentiles, memory bounded by the
+longest message), distinct-value sketches and the first few rows as a
+preview. The report has the same shape as the EDA report the API used to
+build from a full list of rows, plus unique_messages and duplicate_rate
+(after dedup.normalize_message) in its message section.
+
+Distinct counts (title pairs, recipients, nominators, messages) use a
+k-minimum-values sketch: the k smallest 64-bit hashes seen. Below k
+distinct values it holds all of them and the count is exact; above, the
+count is estimated from the k-th smallest hash, within about
+1/sqrt(k) (≈1.6% at the default k = 4096). Memory is O(k) per sketch no
+matter how many rows stream through.
+"""
+
+import codecs
+import csv
+import hashlib
+import heapq
+import io
+from collections import Counter
+from pathlib import Path
+
+from dedup import normalize_message
+
+
+class CsvProfileError(ValueError):
+    """The data is not a usable CSV (the message says why)."""
+
+
+def _complete_prefix(text: str) -> int:
+    """
+    Length of the longest prefix of text made of whole records: it ends
+    at a newline with an even number of quotes before it, i.e. outside
+    any quoted field. Escaped quotes ("") don't change the parity.
+    """
+    end = pos = quotes = 0
+    for line in text.split("\n")[:-1]:
+        pos += len(line) + 1
+        quotes += line.count('"')
+        if quotes % 2 == 0:
+            end = pos
+    return end
+
+
+def _pctl(hist: Counter, n: int, p: float) -> int:
+    """Value at index int(n * p / 100) of the sorted values hist counts."""
+    index = min(int(n * p / 100), n - 1)
+    seen = 0
+    for value in sorted(hist):
+        seen += hist[value]
+        if seen > index:
+            return value
+    return 0
+
+
+def _hist_stats(hist: Counter) -> dict:
+    n = sum(hist.values())
+    mean = sum(v * c for v, c in hist.items()) / n
+    var = sum(c * (v - mean) ** 2 for v, c in hist.items()) / n
+    return {
+        "min": min(hist),
+        "max": max(hist),
+        "mean": round(mean, 1),
+        "median": _pctl(hist, n, 50),
+        "std": round(var ** 0.5, 1),
+        "p5": _pctl(hist, n, 5),
+        "p95": _pctl(hist, n, 95),
+    }
+
+
+class _DistinctSketch:
+    """k-minimum-values distinct counter (exact below k values)."""
+
+    def __init__(self, k: int):
+        self.k = k
+        self._heap: list[int] = []        # negated, so the largest kept hash is on top
+        self._kept: set[int] = set()
+
+    def add(self, value: str) -> None:
+        h = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+        if h in self._kept:
+            return
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, -h)
+        elif h < -self._heap[0]:
+            self._kept.discard(-heapq.heapreplace(self._heap, -h))
+        else:
+            return
+        self._kept.add(h)
+
+    def count(self) -> int:
+        if len(self._heap) < self.k:
+            return len(self._heap)
+        return round((self.k - 1) * 2 ** 64 / -self._heap[0])
+
+
+class CsvProfiler:
+    """
+    required:     column names (compared stripped and lower-cased) the
+                  header must contain; feed() raises CsvProfileError as
+                  soon as the header shows one is missing
+    sample_size:  rows kept as sample_rows
+    sketch_size:  k of the distinct-count sketches (counts are exact up
+                  to k distinct values)
+    """
+
+    def __init__(self, required: set[str] = frozenset(), sample_size: int = 5, sketch_size: int = 4096):
+        self.required = set(required)
+        self.sample_size = sample_size
+        self.columns: list[str] | None = None
+        self.rows = 0
+        self.bytes = 0
+        self.sample_rows: list[dict] = []
+
+        # utf-8-sig: Excel exports start with a BOM that would hide "message"
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._pending = ""
+        self._nulls: list[int] = []
+        self._message = self._recipient = self._nominator = None
+        self._chars: Counter = Counter()
+        self._words: Counter = Counter()
+        self._messages = 0                 # rows with a non-empty message
+        self._distinct = {
+            name: _DistinctSketch(sketch_size)
+            for name in ("pairs", "recipients", "nominators", "messages")
+        }
+
+    def feed(self, chunk: bytes) -> None:
+        self.bytes += len(chunk)
+        try:
+            text = self._pending + self._decoder.decode(chunk)
+        except UnicodeDecodeError as e:
+            raise CsvProfileError(f"CSV is not UTF-8 near byte {self.bytes - len(chunk) + e.start}")
+        cut = _complete_prefix(text)
+        self._pending = text[cut:]
+        if cut:
+            self._parse(text[:cut])
+
+    def close(self) -> dict:
+        """Parse what is left (a last line without newline) and return the report."""
+        try:
+            tail = self._pending + self._decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            raise CsvProfileError("CSV is not UTF-8 (truncated character at the end)")
+        self._pending = ""
+        if tail.strip():
+            self._parse(tail)
+        return self.report()
+
+    def _parse(self, block: str) -> None:
+        try:
+            for record in csv.reader(io.StringIO(block)):
+                if not record:
+                    continue
+                if self.columns is None:
+                    self._header(record)
+                else:
+                    self._row(record)
+        except csv.Error as e:
+            raise CsvProfileError(f"CSV parse error: {e}")
+
+    def _header(self, record: list[str]) -> None:
+        names = [c.strip().lower() for c in record]
+        missing = self.required - set(names)
+        if missing:
+            raise CsvProfileError(f"Missing required columns: {', '.join(sorted(missing))}")
+        self.columns = record
+        self._nulls = [0] * len(record)
+        index = {name: i for i, name in enumerate(names)}
+        self._message = index.get("message")
+        self._recipient = index.get("recipient_title")
+        self._nominator = index.get("nominator_title")
+
+    def _row(self, record: list[str]) -> None:
+        self.rows += 1
+        n = len(record)
+        for i, value in enumerate(record[:len(self._nulls)]):
+            if not value:
+                self._nulls[i] += 1
+        for i in range(n, len(self._nulls)):       # short row: missing = null
+            self._nulls[i] += 1
+
+        def field(i):
+            return record[i] if i is not None and i < n else ""
+
+        message = field(self._message)
+        self._chars[len(message)] += 1
+        self._words[len(message.split())] += 1
+        nominator, recipient = field(self._nominator), field(self._recipient)
+        self._distinct["pairs"].add(f"{nominator}\x1f{recipient}")
+        self._distinct["recipients"].add(recipient)
+        self._distinct["nominators"].add(nominator)
+        if message:
+            self._messages += 1
+            self._distinct["messages"].add(normalize_message(message))
+        if len(self.sample_rows) < self.sample_size:
+            self.sample_rows.append(dict(zip(self.columns, record)))
+
+    def report(self) -> dict:
+        if not self.rows:
+            return {"basic": {"total_rows": 0}}
+        words = _hist_stats(self._words)
+        # An estimate above k can overshoot the true count slightly
+        unique = min(self._distinct["messages"].count(), self._messages)
+        return {
+            "basic": {
+                "total_rows": self.rows,
+                "total_columns": len(self.columns),
+                "columns": self.columns,
+                "null_counts": dict(zip(self.columns, self._nulls)),
+            },
+            "message": {
+                "char_length": _hist_stats(self._chars),
+                "word_count": {k: words[k] for k in ("min", "max", "mean")},
+                "unique_messages": unique,
+                "duplicate_rate": round(1 - unique / self._messages, 4) if self._messages else 0,
+            },
+            "interactions": {
+                "total_interactions": self.rows,
+                "unique_pairs": min(self._distinct["pairs"].count(), self.rows),
+                "unique_recipients": min(self._distinct["recipients"].count(), self.rows),
+                "unique_nominators": min(self._distinct["nominators"].count(), self.rows),
+            },
+        }
+
+
+def profile_csv(path: str | Path, chunk_size: int = 1 << 20) -> dict:
+    """Profile a CSV on disk without loading it (same report as CsvProfiler)."""
+    profiler = CsvProfiler()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            profiler.feed(chunk)
+    return profiler.close()
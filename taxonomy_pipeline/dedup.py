@@ -0,0 +1,133 @@
+"""
+dedup.py — Collapse duplicate and near-duplicate messages before Phase 2.
+
+Team-wide awards send the same (or nearly the same) message to many
+recipients. Phase 2 classifies one representative per cluster and fans
+the label back out to every member.
+
+Methods (P2_DEDUP):
+    "normalized"  exact match after lowercasing, stripping punctuation and
+                  collapsing whitespace — cheap, catches copy-paste awards
+    "minhash"     normalized match, then MinHash/LSH over word 3-gram
+                  shingles to merge messages whose estimated Jaccard
+                  similarity is at least P2_DEDUP_THRESHOLD
+    None          no collapsing
+"""
+
+import hashlib
+import re
+from collections import defaultdict
+
+import numpy as np
+
+import config as cfg
+
+_NUM_PERM = 64
+_BANDS = 16                    # 16 bands × 4 rows → candidate at Jaccard ≈ 0.5
+_PRIME = 4294967291            # largest prime below 2^32
+_SHINGLE = 3
+_SEED = 1                      # fixed so clusters are stable across resumes
+
+
+def normalize_message(text: str) -> str:
+    """Lowercase, drop punctuation, collapse whitespace."""
+    text = re.sub(r"[^\w\s]", " ", str(text).lower())
+    return " ".join(text.split())
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, x: int) -> int:
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # Lower position wins so the representative is the first occurrence
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    tokens = text.split()
+    if len(tokens) <= _SHINGLE:
+        shingles = {text}
+    else:
+        shingles = {" ".join(tokens[i:i + _SHINGLE]) for i in range(len(tokens) - _SHINGLE + 1)}
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), "little")
+         for s in shingles],
+        dtype=np.uint64,
+    )
+
+
+def _signatures(texts: list[str]) -> np.ndarray:
+    rng = np.random.default_rng(_SEED)
+    # a < 2^31 keeps hash * a inside uint64
+    a = rng.integers(1, 1 << 31, size=_NUM_PERM, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, size=_NUM_PERM, dtype=np.uint64)
+    sigs = np.empty((len(texts), _NUM_PERM), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        h = _shingle_hashes(text)
+        sigs[i] = ((np.outer(h, a) + b) % _PRIME).min(axis=0)
+    return sigs
+
+
+def cluster_messages(messages: list[str], method: str | None = None) -> list[int]:
+    """
+    Cluster id per message. A cluster's id is the position of its first
+    member, so cluster_of[i] == i marks a representative.
+    """
+    method = method if method is not None else cfg.P2_DEDUP
+    n = len(messages)
+    if not method:
+        return list(range(n))
+
+    uf = _UnionFind(n)
+    normalized = [normalize_message(m) for m in messages]
+
+    first_seen: dict[str, int] = {}
+    for i, norm in enumerate(normalized):
+        if norm in first_seen:
+            uf.union(first_seen[norm], i)
+        else:
+            first_seen[norm] = i
+
+    if method == "minhash":
+        # Only distinct normalized texts need signatures
+        uniques = sorted(first_seen.values())
+        sigs = _signatures([normalized[i] for i in uniques])
+        rows = _NUM_PERM // _BANDS
+        for band in range(_BANDS):
+            buckets = defaultdict(list)
+            chunk = sigs[:, band * rows:(band + 1) * rows]
+            for k, row in enumerate(chunk):
+                buckets[row.tobytes()].append(k)
+            for members in buckets.values():
+                head = members[0]
+                for k in members[1:]:
+                    similarity = float(np.mean(sigs[head] == sigs[k]))
+                    if similarity >= cfg.P2_DEDUP_THRESHOLD:
+                        uf.union(uniques[head], uniques[k])
+    elif method != "normalized":
+        raise ValueError(f"Unknown dedup method: {method!r} (use 'normalized' or 'minhash')")
+
+    return [uf.find(i) for i in range(n)]
+
+
+def collapse(messages: list[str], method: str | None = None) -> tuple[list[int], list[list[int]]]:
+    """
+    Returns (representatives, members):
+        representatives  positions of the messages to actually classify
+        members          members[k] = every position represented by representatives[k]
+    """
+    cluster_of = cluster_messages(messages, method)
+    groups: dict[int, list[int]] = defaultdict(list)
+    for pos, cid in enumerate(cluster_of):
+        groups[cid].append(pos)
+    representatives = sorted(groups)
+    return representatives, [groups[r] for r in representatives]
@@ -0,0 +1,114 @@
+"""
+discovery.py — Sequential-sampling estimates for Phase 2 discovery mode.
+
+Phase 3 only needs how often each candidate category is proposed. In
+discovery mode Phase 2 classifies messages in a random order and stops
+once every share it tracks (category shares and candidate shares) is
+pinned down to within P2_DISCOVERY_MARGIN at P2_DISCOVERY_CONFIDENCE.
+Population counts are the shares scaled up to the whole upload.
+
+Intervals are Wilson score intervals with a finite population
+correction: sampling without replacement from N rows, n rows of which
+are observed, carries the information of n·(N−1)/(N−n) independent
+draws, and the interval collapses to a point once every row is seen.
+"""
+
+import math
+from collections import defaultdict
+from statistics import NormalDist
+
+
+def wilson_interval(
+    hits: int,
+    n: int,
+    population: int,
+    confidence: float,
+) -> tuple[float, float]:
+    """(low, high) bounds on a share from hits out of n sampled rows."""
+    if n <= 0:
+        return 0.0, 1.0
+    p = hits / n
+    if n >= population:
+        return p, p
+    n_eff = n * (population - 1) / (population - n)
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    z2 = z * z
+    centre = (p + z2 / (2 * n_eff)) / (1 + z2 / n_eff)
+    half = z * math.sqrt(p * (1 - p) / n_eff + z2 / (4 * n_eff * n_eff)) / (1 + z2 / n_eff)
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+class ShareEstimator:
+    """
+    Running share estimates over a random sample of rows.
+
+    Usage:
+        est = ShareEstimator(population=len(messages), confidence=0.95)
+        est.add(category, candidate)          # once per sampled, labelled row
+        if est.converged(margin=0.02, min_sample=400):
+            ...
+        est.report()
+    """
+
+    def __init__(self, population: int, confidence: float):
+        self.population = population
+        self.confidence = confidence
+        self.n = 0
+        self.categories: dict[str, int] = defaultdict(int)
+        self.candidates: dict[str, int] = defaultdict(int)
+
+    def add(self, category: str, candidate: str | None) -> None:
+        self.n += 1
+        self.categories[category or ""] += 1
+        if candidate:
+            self.candidates[candidate] += 1
+
+    def half_width(self) -> float:
+        """Widest half-interval across every tracked share."""
+        widest = 0.0
+        for counts in (self.categories, self.candidates):
+            for hits in counts.values():
+                low, high = wilson_interval(hits, self.n, self.population, self.confidence)
+                widest = max(widest, (high - low) / 2)
+        return widest
+
+    def converged(self, margin: float, min_sample: int) -> bool:
+        if self.n >= self.population:
+            return True
+        return self.n >= min_sample and self.half_width() <= margin
+
+    def _estimates(self, counts: dict[str, int]) -> dict[str, dict]:
+        out = {}
+        for name, hits in sorted(counts.items(), key=lambda x: x[1], reverse=True):
+            low, high = wilson_interval(hits, self.n, self.population, self.confidence)
+            out[name] = {
+                "sampled": hits,
+                "share": round(hits / self.n, 4),
+                "share_ci": [round(low, 4), round(high, 4)],
+                "count": round(hits / self.n * self.population),
+                "count_ci": [
+                    math.floor(low * self.population),
+                    math.ceil(high * self.population),
+                ],
+            }
+        return out
+
+    def candidate_counts(self) -> dict[str, int]:
+        """Estimated population count per candidate (Phase 3's input)."""
+        if not self.n:
+            return {}
+        return {
+            name: max(1, round(hits / self.n * self.population))
+            for name, hits in self.candidates.items()
+        }
+
+    def report(self) -> dict:
+        return {
+            "population": self.population,
+            "sampled": self.n,
+            "sampled_fraction": round(self.n / self.population, 4) if self.population else 0,
+            "confidence": self.confidence,
+            "max_half_width": round(self.half_width(), 4),
+            "categories": self._estimates(self.categories),
+            "candidates": self._estimates(self.candidates),
+        }
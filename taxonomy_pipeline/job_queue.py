@@ -0,0 +1,551 @@
+"""
+job_queue.py — Durable job queue and bounded worker pool for the API.
+
+POST /api/run enqueues one job per config instead of starting a thread
+per job. A fixed pool of API_WORKERS threads takes jobs oldest first,
+but only a job whose providers (Phase 1, 2 and 3) all have a free slot
+under API_PROVIDER_CONCURRENCY. Ten users asking for local-Llama
+configs therefore queue behind one Ollama instead of all hitting it at
+once. When queued + running jobs reach API_QUEUE_MAX_PENDING, the API
+answers 429 instead of accepting more. The bound is checked inside the
+store's insert transaction, so concurrent requests can't both squeeze
+past it.
+
+Jobs survive restarts. Each running job's heartbeat is refreshed every
+API_JOB_HEARTBEAT_SECONDS. A job whose heartbeat is older than
+API_JOB_STALE_SECONDS (process killed, e.g. a redeploy) goes back to
+the queue and is picked up again. It fails for good after
+API_JOB_MAX_ATTEMPTS. A job can also put itself back by raising
+RetryJob (e.g. Phase 2 stopped early); that counts as an attempt. A job also stores its progress (`state`) after
+each phase, so a resumed job skips finished phases. Phase 2 itself
+resumes from its per-job checkpoint journal, which lives on the API
+host's local disk (OUTPUT_DIR/jobs/<job_id>). On hosts whose disk is
+wiped on restart (e.g. Render), or when another instance picks the job
+up, Phase 2 starts that job over; the phase-level state above still
+holds.
+
+Backends (API_QUEUE_BACKEND):
+    "sqlite"    local file at API_QUEUE_PATH
+    "supabase"  table API_QUEUE_TABLE, for deployments where local disk
+                doesn't survive a restart:
+
+    create table pipeline_queue (
+        job_id       text primary key,
+        payload      jsonb not null,
+        providers    jsonb not null,
+        status       text not null,           -- queued | running | completed | failed
+        worker_id    text,
+        heartbeat_at double precision,
+        attempts     integer not null default 0,
+        state        jsonb,
+        created_at   double precision not null,
+        updated_at   double precision not null
+    );
+
+    -- Enqueue all jobs, or none if they'd exceed max_pending. Enqueuers
+    -- are serialized by the lock; other writers only lower the count.
+    create or replace function enqueue_pipeline_jobs(jobs jsonb, max_pending integer)
+    returns boolean language plpgsql as $$
+    begin
+        perform pg_advisory_xact_lock(hashtext('enqueue_pipeline_jobs'));
+        if (select count(*) from pipeline_queue where status in ('queued', 'running'))
+           + jsonb_array_length(jobs) > max_pending then
+            return false;
+        end if;
+        insert into pipeline_queue
+            (job_id, payload, providers, status, attempts, created_at, updated_at)
+        select j->>'job_id', j->'payload', j->'providers', 'queued', 0,
+               (j->>'created_at')::double precision, (j->>'created_at')::double precision
+        from jsonb_array_elements(jobs) j;
+        return true;
+    end $$;
+
+Provider caps are enforced per API process.
+"""
+
+import json
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Callable
+
+import config as cfg
+from utils import get_logger
+
+logger = get_logger("job_queue")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS api_jobs (
+    job_id        TEXT PRIMARY KEY,
+    payload       TEXT NOT NULL,
+    providers     TEXT NOT NULL,
+    status        TEXT NOT NULL,      -- queued | running | completed | failed
+    worker_id     TEXT,
+    heartbeat_at  REAL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    state         TEXT,
+    created_at    REAL NOT NULL,
+    updated_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_api_jobs_status ON api_jobs (status, created_at);
+"""
+
+_ACTIVE = ("queued", "running")
+_ENQUEUE_FN = "enqueue_pipeline_jobs"     # Supabase RPC (see module docstring)
+
+
+class RetryJob(Exception):
+    """Raised by run_job: requeue the job (keeping its state) instead of finishing it."""
+
+
+class SqliteJobStore:
+    """
+    Usage:
+        store = SqliteJobStore(cfg.API_QUEUE_PATH)
+        if not store.enqueue([(job_id, payload, ["google", "ollama"])], max_pending=20):
+            ...                                   # queue full, nothing inserted
+        for job in store.queued():
+            if store.claim(job, worker_id): ...
+        store.save_state(job_id, {...})
+        store.finish(job_id, worker_id, "completed")
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            str(self.path), check_same_thread=False, timeout=60, isolation_level=None,
+        )
+        self._conn.executescript(_SCHEMA)
+
+    def _write(self, fn):
+        """Run fn(conn) in one IMMEDIATE transaction (write lock taken up front)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return out
+
+    def enqueue(self, jobs: list[tuple[str, dict, list[str]]], max_pending: int = None) -> bool:
+        """
+        Insert (job_id, payload, providers) jobs in one transaction. If
+        that would leave more than max_pending jobs queued or running,
+        insert none and return False.
+        """
+        now = time.time()
+
+        def fn(conn):
+            if max_pending is not None:
+                (active,) = conn.execute(
+                    f"SELECT COUNT(*) FROM api_jobs WHERE status IN {_ACTIVE}"
+                ).fetchone()
+                if active + len(jobs) > max_pending:
+                    return False
+            conn.executemany(
+                "INSERT INTO api_jobs (job_id, payload, providers, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?)",
+                [
+                    (job_id, json.dumps(payload), json.dumps(sorted(set(providers))), now, now)
+                    for job_id, payload, providers in jobs
+                ],
+            )
+            return True
+
+        return self._write(fn)
+
+    def queued(self, limit: int = 50) -> list[dict]:
+        """Queued jobs, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, payload, providers, attempts, state FROM api_jobs "
+                "WHERE status = 'queued' ORDER BY created_at LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [
+            {
+                "job_id": job_id,
+                "payload": json.loads(payload),
+                "providers": json.loads(providers),
+                "attempts": attempts,
+                "state": json.loads(state) if state else {},
+            }
+            for job_id, payload, providers, attempts, state in rows
+        ]
+
+    def claim(self, job: dict, worker_id: str) -> bool:
+        """Take a queued job. False if another worker got it first."""
+        now = time.time()
+        return self._write(lambda conn: conn.execute(
+            "UPDATE api_jobs SET status = 'running', worker_id = ?, heartbeat_at = ?, "
+            "attempts = attempts + 1, updated_at = ? WHERE job_id = ? AND status = 'queued'",
+            (worker_id, now, now, job["job_id"]),
+        ).rowcount == 1)
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """False if the job is no longer ours (it was declared stale and re-queued)."""
+        now = time.time()
+        return self._write(lambda conn: conn.execute(
+            "UPDATE api_jobs SET heartbeat_at = ?, updated_at = ? "
+            "WHERE job_id = ? AND status = 'running' AND worker_id = ?",
+            (now, now, job_id, worker_id),
+        ).rowcount == 1)
+
+    def save_state(self, job_id: str, state: dict) -> None:
+        now = time.time()
+        self._write(lambda conn: conn.execute(
+            "UPDATE api_jobs SET state = ?, updated_at = ? WHERE job_id = ?",
+            (json.dumps(state, ensure_ascii=False, default=str), now, job_id),
+        ))
+
+    def finish(self, job_id: str, worker_id: str, status: str) -> None:
+        now = time.time()
+        self._write(lambda conn: conn.execute(
+            "UPDATE api_jobs SET status = ?, worker_id = NULL, state = NULL, updated_at = ? "
+            "WHERE job_id = ? AND worker_id = ?",
+            (status, now, job_id, worker_id),
+        ))
+
+    def retry(self, job_id: str, worker_id: str) -> None:
+        """Put a running job back, counting the attempt (see RetryJob)."""
+        now = time.time()
+        self._write(lambda conn: conn.execute(
+            "UPDATE api_jobs SET status = 'queued', worker_id = NULL, updated_at = ? "
+            "WHERE job_id = ? AND status = 'running' AND worker_id = ?",
+            (now, job_id, worker_id),
+        ))
+
+    def release(self, job_id: str, worker_id: str) -> None:
+        """Put a running job back without counting the attempt (shutdown)."""
+        now = time.time()
+        self._write(lambda conn: conn.execute(
+            "UPDATE api_jobs SET status = 'queued', worker_id = NULL, attempts = attempts - 1, "
+            "updated_at = ? WHERE job_id = ? AND status = 'running' AND worker_id = ?",
+            (now, job_id, worker_id),
+        ))
+
+    def requeue_stale(self, stale_seconds: float, max_attempts: int) -> tuple[list[str], list[str]]:
+        """Running jobs with an old heartbeat → queued, or failed once out of attempts."""
+        now = time.time()
+
+        def fn(conn):
+            rows = conn.execute(
+                "SELECT job_id, attempts FROM api_jobs WHERE status = 'running' AND heartbeat_at < ?",
+                (now - stale_seconds,),
+            ).fetchall()
+            requeued = [job_id for job_id, attempts in rows if attempts < max_attempts]
+            failed = [job_id for job_id, attempts in rows if attempts >= max_attempts]
+            conn.executemany(
+                "UPDATE api_jobs SET status = ?, worker_id = NULL, updated_at = ? WHERE job_id = ?",
+                [("queued", now, j) for j in requeued] + [("failed", now, j) for j in failed],
+            )
+            return requeued, failed
+
+        return self._write(fn)
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM api_jobs GROUP BY status"
+            ).fetchall())
+
+
+class SupabaseJobStore:
+    """Same interface as SqliteJobStore over a Supabase table (see module docstring)."""
+
+    def __init__(self, db, table: str = None):
+        self.db = db
+        self.table = table or cfg.API_QUEUE_TABLE
+
+    def _t(self):
+        return self.db.table(self.table)
+
+    def enqueue(self, jobs: list[tuple[str, dict, list[str]]], max_pending: int = None) -> bool:
+        now = time.time()
+        rows = [
+            {
+                "job_id": job_id,
+                "payload": payload,
+                "providers": sorted(set(providers)),
+                "created_at": now,
+            }
+            for job_id, payload, providers in jobs
+        ]
+        if max_pending is None:
+            self._t().insert([
+                {**row, "status": "queued", "attempts": 0, "updated_at": now} for row in rows
+            ]).execute()
+            return True
+        # PostgREST has no multi-statement transactions: count + insert run in SQL
+        res = self.db.rpc(_ENQUEUE_FN, {"jobs": rows, "max_pending": max_pending}).execute()
+        return bool(res.data)
+
+    def queued(self, limit: int = 50) -> list[dict]:
+        res = (
+            self._t().select("job_id, payload, providers, attempts, state")
+            .eq("status", "queued").order("created_at").limit(limit).execute()
+        )
+        return [{**row, "state": row.get("state") or {}} for row in res.data or []]
+
+    def claim(self, job: dict, worker_id: str) -> bool:
+        # Conditional update: only one worker sees its row come back
+        now = time.time()
+        res = (
+            self._t().update({
+                "status": "running", "worker_id": worker_id, "heartbeat_at": now,
+                "attempts": job["attempts"] + 1, "updated_at": now,
+            })
+            .eq("job_id", job["job_id"]).eq("status", "queued").eq("attempts", job["attempts"])
+            .execute()
+        )
+        return bool(res.data)
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        now = time.time()
+        res = (
+            self._t().update({"heartbeat_at": now, "updated_at": now})
+            .eq("job_id", job_id).eq("status", "running").eq("worker_id", worker_id)
+            .execute()
+        )
+        return bool(res.data)
+
+    def save_state(self, job_id: str, state: dict) -> None:
+        state = json.loads(json.dumps(state, ensure_ascii=False, default=str))
+        self._t().update({"state": state, "updated_at": time.time()}).eq("job_id", job_id).execute()
+
+    def finish(self, job_id: str, worker_id: str, status: str) -> None:
+        (
+            self._t().update({
+                "status": status, "worker_id": None, "state": None, "updated_at": time.time(),
+            })
+            .eq("job_id", job_id).eq("worker_id", worker_id).execute()
+        )
+
+    def retry(self, job_id: str, worker_id: str) -> None:
+        (
+            self._t().update({"status": "queued", "worker_id": None, "updated_at": time.time()})
+            .eq("job_id", job_id).eq("status", "running").eq("worker_id", worker_id).execute()
+        )
+
+    def release(self, job_id: str, worker_id: str) -> None:
+        res = self._t().select("attempts").eq("job_id", job_id).execute()
+        if not res.data:
+            return
+        (
+            self._t().update({
+                "status": "queued", "worker_id": None,
+                "attempts": max(0, res.data[0]["attempts"] - 1), "updated_at": time.time(),
+            })
+            .eq("job_id", job_id).eq("status", "running").eq("worker_id", worker_id).execute()
+        )
+
+    def requeue_stale(self, stale_seconds: float, max_attempts: int) -> tuple[list[str], list[str]]:
+        now = time.time()
+        res = (
+            self._t().select("job_id, attempts, heartbeat_at")
+            .eq("status", "running").lt("heartbeat_at", now - stale_seconds).execute()
+        )
+        requeued, failed = [], []
+        for row in res.data or []:
+            status = "queued" if row["attempts"] < max_attempts else "failed"
+            # Only if nobody heartbeated it in the meantime
+            done = (
+                self._t().update({"status": status, "worker_id": None, "updated_at": now})
+                .eq("job_id", row["job_id"]).eq("status", "running")
+                .eq("heartbeat_at", row["heartbeat_at"]).execute()
+            )
+            if done.data:
+                (requeued if status == "queued" else failed).append(row["job_id"])
+        return requeued, failed
+
+    def counts(self) -> dict[str, int]:
+        counts = {}
+        for status in _ACTIVE:
+            res = self._t().select("job_id", count="exact").eq("status", status).limit(1).execute()
+            counts[status] = res.count or 0
+        return counts
+
+
+def open_store(db=None):
+    """Job store for API_QUEUE_BACKEND ("supabase" needs the API's client)."""
+    if cfg.API_QUEUE_BACKEND == "supabase":
+        if db is None:
+            raise ValueError("API_QUEUE_BACKEND='supabase' needs a Supabase client")
+        return SupabaseJobStore(db)
+    if cfg.API_QUEUE_BACKEND != "sqlite":
+        raise ValueError(f"Unknown API_QUEUE_BACKEND: {cfg.API_QUEUE_BACKEND!r} (use 'sqlite' or 'supabase')")
+    return SqliteJobStore(cfg.API_QUEUE_PATH)
+
+
+class JobPool:
+    """
+    Fixed-size worker pool over a job store.
+
+    run_job(job, save_state) runs one job and returns True on success, or
+    raises RetryJob to have it queued again (job["attempts"] counts the
+    attempts before this one).
+    job is {"job_id", "payload", "providers", "attempts", "state"}, where
+    state is whatever the job saved before it was interrupted.
+    on_requeue(job_id, failed) is told about stale jobs the pool put back
+    in the queue (failed=False) or gave up on (failed=True).
+    """
+
+    def __init__(
+        self,
+        store,
+        run_job: Callable[[dict, Callable[[dict], None]], bool],
+        workers: int = None,
+        provider_caps: dict[str, int] = None,
+        on_requeue: Callable[[str, bool], None] = None,
+    ):
+        self.store = store
+        self.run_job = run_job
+        self.workers = workers or cfg.API_WORKERS
+        self.caps = provider_caps or cfg.API_PROVIDER_CONCURRENCY
+        self.on_requeue = on_requeue
+        self.worker_prefix = f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}"
+        self._lock = threading.Lock()
+        self._in_use: Counter = Counter()
+        self._running: dict[str, str] = {}          # job_id → worker_id
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self) -> None:
+        self._stop.clear()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, args=(f"{self.worker_prefix}-{i}",), daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._maintain, daemon=True)
+        t.start()
+        self._threads.append(t)
+        logger.info(f"Job pool started: {self.workers} workers, provider caps {self.caps}")
+
+    def stop(self) -> None:
+        """Stop taking jobs and put this process's running jobs back in the queue."""
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            running = list(self._running.items())
+        for job_id, worker_id in running:
+            self.store.release(job_id, worker_id)
+        if running:
+            logger.info(f"Released {len(running)} running jobs back to the queue")
+
+    @property
+    def stopping(self) -> bool:
+        """True once stop() was called (running jobs will be released, not finished)."""
+        return self._stop.is_set()
+
+    def notify(self) -> None:
+        """Wake idle workers (a job was just enqueued)."""
+        self._wake.set()
+
+    def submit(self, jobs: list[tuple[str, dict, list[str]]]) -> bool:
+        """
+        Enqueue (job_id, payload, providers) jobs, all or none: False if
+        they would exceed API_QUEUE_MAX_PENDING queued + running jobs.
+        """
+        if not self.store.enqueue(jobs, max_pending=cfg.API_QUEUE_MAX_PENDING):
+            return False
+        self.notify()
+        return True
+
+    def status(self) -> dict:
+        counts = self.store.counts()
+        with self._lock:
+            in_use = dict(self._in_use)
+        return {
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "max_pending": cfg.API_QUEUE_MAX_PENDING,
+            "workers": self.workers,
+            "provider_caps": self.caps,
+            "provider_in_use": in_use,
+        }
+
+    def _fits(self, providers: list[str]) -> bool:
+        return all(self._in_use[p] < self.caps.get(p, 1) for p in providers)
+
+    def _take(self, worker_id: str) -> dict | None:
+        """Claim the oldest queued job that fits under the provider caps."""
+        with self._lock:
+            for job in self.store.queued():
+                if not self._fits(job["providers"]):
+                    continue
+                if self.store.claim(job, worker_id):
+                    self._in_use.update(job["providers"])
+                    self._running[job["job_id"]] = worker_id
+                    return job
+        return None
+
+    def _work(self, worker_id: str) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self._take(worker_id)
+            except Exception as e:
+                logger.error(f"[{worker_id}] could not read the queue: {e}")
+                job = None
+            if job is None:
+                self._wake.wait(cfg.API_QUEUE_POLL_SECONDS)
+                self._wake.clear()
+                continue
+
+            job_id = job["job_id"]
+            resumed = " (resumed)" if job["state"] else ""
+            logger.info(f"[{worker_id}] job {job_id}{resumed} — providers {job['providers']}")
+            ok = retry = False
+            try:
+                ok = bool(self.run_job(job, lambda state: self.store.save_state(job_id, state)))
+            except RetryJob as e:
+                retry = True
+                logger.warning(f"[{worker_id}] job {job_id} back in the queue: {e}")
+            except Exception as e:
+                logger.error(f"[{worker_id}] job {job_id} raised: {e}")
+            finally:
+                with self._lock:
+                    self._in_use.subtract(job["providers"])
+                    self._running.pop(job_id, None)
+                if not self._stop.is_set():
+                    if retry:
+                        self.store.retry(job_id, worker_id)
+                    else:
+                        self.store.finish(job_id, worker_id, "completed" if ok else "failed")
+                # A slot just freed up — let the others look again
+                self._wake.set()
+
+    def _maintain(self) -> None:
+        """Heartbeat this process's jobs and re-queue everyone's stale ones."""
+        while not self._stop.wait(cfg.API_JOB_HEARTBEAT_SECONDS):
+            try:
+                with self._lock:
+                    running = list(self._running.items())
+                for job_id, worker_id in running:
+                    if not self.store.heartbeat(job_id, worker_id):
+                        logger.warning(f"Job {job_id} is no longer held by {worker_id}")
+                requeued, failed = self.store.requeue_stale(
+                    cfg.API_JOB_STALE_SECONDS, cfg.API_JOB_MAX_ATTEMPTS,
+                )
+            except Exception as e:
+                logger.error(f"Queue maintenance failed: {e}")
+                continue
+            for job_id in requeued:
+                logger.warning(f"Job {job_id} was interrupted — back in the queue")
+            for job_id in failed:
+                logger.error(f"Job {job_id} was interrupted {cfg.API_JOB_MAX_ATTEMPTS}× — giving up")
+            if self.on_requeue:
+                for job_id in requeued:
+                    self.on_requeue(job_id, False)
+                for job_id in failed:
+                    self.on_requeue(job_id, True)
+            if requeued:
+                self._wake.set()
@@ -0,0 +1,237 @@
+"""
+llm_cache.py — Persistent, content-addressed cache for LLM responses.
+
+Responses are stored in SQLite keyed by a SHA-256 of
+(provider, model, system, prompt, temperature, max_tokens), so re-running
+the pipeline on the same upload (or resuming after a crash) replays
+answers from disk instead of paying for them again.
+
+Entries are grouped into namespaces ("phase_1", "phase_2", ...) that can
+be invalidated independently. Eviction is LRU on last access, bounded by
+LLM_CACHE_MAX_MB, plus a hard age cut-off of LLM_CACHE_MAX_AGE_DAYS.
+
+CLI:
+    python llm_cache.py --stats
+    python llm_cache.py --clear phase_2
+    python llm_cache.py --clear          # everything
+"""
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import config as cfg
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key           TEXT PRIMARY KEY,
+    namespace     TEXT NOT NULL,
+    provider      TEXT NOT NULL,
+    model         TEXT NOT NULL,
+    response      TEXT NOT NULL,
+    size_bytes    INTEGER NOT NULL,
+    created_at    REAL NOT NULL,
+    last_access   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_ns ON llm_cache(namespace);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache(last_access);
+"""
+
+# Run eviction every N writes rather than on every put
+_EVICT_EVERY = 50
+
+
+def make_key(
+    provider: str,
+    model: str,
+    system: str | None,
+    prompt: str,
+    temperature: float | None,
+    max_tokens: int | None,
+    schema: dict | None = None,
+) -> str:
+    """
+    Content hash identifying one LLM request. A response schema changes
+    the answer, so it is part of the key when given.
+    """
+    parts = [provider, model, system or "", prompt, temperature, max_tokens]
+    if schema is not None:
+        parts.append(schema)
+    blob = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Thread-safe SQLite response store with LRU + age eviction.
+
+    Usage:
+        cache = get_cache()
+        key = make_key("groq", model, system, prompt, 0.3, 3000)
+        text = cache.get(key)
+        if text is None:
+            text = ...  # call the provider
+            cache.put(key, text, namespace="phase_2", provider="groq", model=model)
+    """
+
+    def __init__(self, path: Path, max_mb: float = None, max_age_days: float = None):
+        self.path = Path(path)
+        self.max_bytes = int((max_mb or cfg.LLM_CACHE_MAX_MB) * 1024 * 1024)
+        self.max_age = (max_age_days or cfg.LLM_CACHE_MAX_AGE_DAYS) * 86400
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # WAL lets run_comparison's subprocesses share the file safely
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self.evict()
+
+    def get(self, key: str) -> str | None:
+        """Return the cached response (and bump its LRU timestamp), or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[1] > self.max_age:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def put(
+        self,
+        key: str,
+        response: str,
+        namespace: str,
+        provider: str,
+        model: str,
+    ) -> None:
+        """Store a response. Existing entries under the same key are replaced."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache "
+                "(key, namespace, provider, model, response, "
+                " size_bytes, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key, namespace, provider, model, response,
+                    len(response.encode("utf-8")), now, now,
+                ),
+            )
+            self._conn.commit()
+            self._writes += 1
+            due = self._writes % _EVICT_EVERY == 0
+        if due:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries, then least-recently-used ones over the size cap."""
+        removed = 0
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?",
+                (time.time() - self.max_age,),
+            )
+            removed += cur.rowcount
+
+            total = self._conn.execute(
+                "SELECT COALESCE(SUM(size_bytes), 0) FROM llm_cache"
+            ).fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                freed = 0
+                victims = []
+                for key, size in self._conn.execute(
+                    "SELECT key, size_bytes FROM llm_cache ORDER BY last_access ASC"
+                ):
+                    victims.append((key,))
+                    freed += size
+                    if freed >= excess:
+                        break
+                self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+                removed += len(victims)
+            self._conn.commit()
+        return removed
+
+    def invalidate(self, namespace: str = None) -> int:
+        """Delete every entry in a namespace (or the whole cache if None)."""
+        with self._lock:
+            if namespace is None:
+                cur = self._conn.execute("DELETE FROM llm_cache")
+            else:
+                cur = self._conn.execute(
+                    "DELETE FROM llm_cache WHERE namespace = ?", (namespace,)
+                )
+            self._conn.commit()
+            return cur.rowcount
+
+    def stats(self) -> dict:
+        """Entry counts and bytes per namespace."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT namespace, COUNT(*), COALESCE(SUM(size_bytes), 0) "
+                "FROM llm_cache GROUP BY namespace"
+            ).fetchall()
+        return {ns: {"entries": n, "bytes": size} for ns, n, size in rows}
+
+
+_cache: LLMCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> LLMCache | None:
+    """Process-wide cache instance, or None when LLM_CACHE_ENABLED is off."""
+    global _cache
+    if not cfg.LLM_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(cfg.LLM_CACHE_PATH)
+    return _cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the LLM response cache")
+    parser.add_argument("--stats", action="store_true", help="Show entries per namespace")
+    parser.add_argument(
+        "--clear",
+        nargs="?",
+        const="__all__",
+        default=None,
+        metavar="NAMESPACE",
+        help="Invalidate one namespace (e.g. phase_2), or everything if omitted",
+    )
+    args = parser.parse_args()
+
+    cache = LLMCache(cfg.LLM_CACHE_PATH)
+
+    if args.clear is not None:
+        ns = None if args.clear == "__all__" else args.clear
+        n = cache.invalidate(ns)
+        print(f"Removed {n} entries from {ns or 'all namespaces'}")
+
+    if args.stats or args.clear is None:
+        stats = cache.stats()
+        if not stats:
+            print(f"Cache is empty ({cache.path})")
+        for ns, s in sorted(stats.items()):
+            print(f"  {ns:12s} {s['entries']:6d} entries  {s['bytes'] / 1024:8.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
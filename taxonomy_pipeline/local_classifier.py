@@ -0,0 +1,123 @@
+"""
+local_classifier.py — Cheap CPU classifier for the Phase 2 cascade.
+
+A TF-IDF + logistic regression model trained on the LLM's own Phase 2
+labels. In cascade mode (P2_CASCADE) it labels every message first and
+only messages it is unsure about (max class probability below
+P2_CASCADE_THRESHOLD) are sent to the LLM.
+
+Models are stored per taxonomy under P2_CASCADE_DIR/<taxonomy_hash>.pkl
+together with the labelled examples they were trained on, so a later run
+against the same taxonomy starts from the previous run's labels instead
+of a fresh warm-up.
+
+Requires scikit-learn (pip install scikit-learn).
+"""
+
+import pickle
+from pathlib import Path
+
+import config as cfg
+from classification_memo import taxonomy_hash
+
+
+def label_key(item: dict) -> str | None:
+    """Class label for a classification dict, or None if it has no category."""
+    category = str(item.get("category") or "").strip()
+    if not category:
+        return None
+    return f"{category}/{str(item.get('subcategory') or '').strip()}"
+
+
+def split_label(key: str) -> tuple[str, str]:
+    category, _, subcategory = key.partition("/")
+    return category, subcategory
+
+
+class LocalClassifier:
+    """
+    TF-IDF (word 1-2 grams) + multinomial logistic regression.
+
+    Usage:
+        clf = LocalClassifier.load(path) or LocalClassifier()
+        clf.add_examples(texts, labels)
+        clf.fit()
+        labels, confidences = clf.predict(texts)
+        clf.save(path)
+    """
+
+    def __init__(self):
+        self.examples: dict[str, str] = {}  # message text → label key
+        self.pipeline = None
+
+    @property
+    def trained(self) -> bool:
+        return self.pipeline is not None
+
+    def add_examples(self, texts: list[str], labels: list[str]) -> None:
+        for text, label in zip(texts, labels):
+            if label:
+                self.examples[text] = label
+
+    def fit(self) -> bool:
+        """
+        (Re)train on every stored example. Returns False (and leaves the
+        model untrained) if there is too little data to learn from.
+        """
+        texts = list(self.examples)
+        labels = [self.examples[t] for t in texts]
+        if len(texts) < cfg.P2_CASCADE_MIN_TRAIN or len(set(labels)) < 2:
+            self.pipeline = None
+            return False
+
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+
+        self.pipeline = make_pipeline(
+            TfidfVectorizer(
+                ngram_range=(1, 2),
+                min_df=1,
+                sublinear_tf=True,
+                max_features=50000,
+            ),
+            LogisticRegression(max_iter=1000, C=4.0),
+        )
+        self.pipeline.fit([t[:cfg.P2_MSG_TRUNCATE] for t in texts], labels)
+        return True
+
+    def predict(self, texts: list[str]) -> tuple[list[str], list[float]]:
+        """Most likely label and its probability for each text."""
+        if not texts:
+            return [], []
+        probs = self.pipeline.predict_proba([t[:cfg.P2_MSG_TRUNCATE] for t in texts])
+        classes = self.pipeline.classes_
+        best = probs.argmax(axis=1)
+        return (
+            [str(classes[i]) for i in best],
+            [float(probs[row, i]) for row, i in enumerate(best)],
+        )
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump({"examples": self.examples, "pipeline": self.pipeline}, f)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "LocalClassifier | None":
+        path = Path(path)
+        if not path.exists():
+            return None
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        clf = cls()
+        clf.examples = data.get("examples", {})
+        clf.pipeline = data.get("pipeline")
+        return clf
+
+
+def model_path(taxonomy: dict) -> Path:
+    return cfg.P2_CASCADE_DIR / f"{taxonomy_hash(taxonomy)}.pkl"
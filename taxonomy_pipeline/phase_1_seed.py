@@ -1,9 +1,25 @@
+import asyncio
+
 import config as cfg
-from utils import load_awards, call_llm, extract_json, save_json, get_logger
+from context import PipelineContext
+from utils import load_awards, acall_llm, call_llm, extract_json, save_json, get_logger
 from prompt_composer import compose_phase1_prompt, build_prompt_metadata
+from sampling import sample_messages
+from taxonomy_merge import merge_taxonomies
+from transport import run_sync
 
 logger = get_logger("phase_1")
 
+# Every config.py setting that changes Phase 1's taxonomy, including those
+# read by sampling, prompt_composer and taxonomy_merge (the DAG fingerprint)
+OUTPUT_CONFIG = [
+    "LLM_PROVIDER_PRIORITY", "P1_MODELS", "P1_SAMPLE_SIZE", "P1_RANDOM_STATE",
+    "P1_MSG_TRUNCATE", "P1_MAX_TOKENS", "P1_SAMPLING", "P1_CLUSTER_POOL",
+    "P1_CLUSTER_OUTLIER_FRAC", "P1_EXPLORE_RUNS", "P1_MERGE_THRESHOLD",
+    "P1_CONSENSUS_MIN_SUPPORT", "COL_MESSAGE", "COL_AWARD_TITLE",
+    "COL_RECIPIENT_TITLE", "COL_NOMINATOR_TITLE",
+]
+
 
 def build_prompt(messages: list[str]) -> str:
     """
@@ -53,10 +69,131 @@ Output ONLY valid JSON with this structure:
 }}"""
 
 
+def build_sample_prompt(sample, prompt_config: dict | None = None) -> str:
+    """Phase 1 prompt for a sample of rows (custom dashboard prompt or legacy)."""
+    if prompt_config is not None:
+        # Dashboard-driven: use prompt_composer with all 4 columns
+        if prompt_config.get("mode") == "raw" and prompt_config.get("raw_prompt"):
+            # Raw mode: user wrote the full editable section
+            # We still inject messages at the end (locked section)
+            raw = prompt_config["raw_prompt"]
+            msg_lines = []
+            for i, row in sample.iterrows():
+                msg_text = str(row[cfg.COL_MESSAGE])[:cfg.P1_MSG_TRUNCATE]
+                award = row.get(cfg.COL_AWARD_TITLE, "N/A")
+                recipient = row.get(cfg.COL_RECIPIENT_TITLE, "N/A")
+                nominator = row.get(cfg.COL_NOMINATOR_TITLE, "N/A")
+                msg_lines.append(
+                    f"Message:\n  Award: {award}\n"
+                    f"  From: {nominator} → To: {recipient}\n  {msg_text}"
+                )
+            prompt = raw + f"\n\nHere are {len(sample)} messages:\n\n" + "\n\n---\n\n".join(msg_lines)
+        else:
+            # Structured mode: compose from fields
+            prompt = compose_phase1_prompt(sample, prompt_config)
+
+        logger.info(f"Custom prompt composed ({len(prompt)} chars)")
+    else:
+        # Legacy: CLI / backward compat — uses only message column
+        messages = sample[cfg.COL_MESSAGE].tolist()
+        prompt = build_prompt(messages)
+        logger.info(f"Default prompt built ({len(prompt)} chars)")
+    return prompt
+
+
+def parse_taxonomy(response: str | None) -> dict | None:
+    """Taxonomy from an LLM response, or None if it has no categories."""
+    try:
+        taxonomy = extract_json(response or "")
+    except ValueError as e:
+        logger.error(f"Failed to parse LLM response: {e}")
+        return None
+    if not isinstance(taxonomy, dict) or not taxonomy.get("categories"):
+        logger.warning("Empty categories returned")
+        return None
+    return taxonomy
+
+
+def _explore(
+    df,
+    sample_size: int,
+    random_state: int | None,
+    prompt_config: dict | None,
+    use_cache: bool,
+    runs: int,
+    ctx: PipelineContext,
+) -> tuple[dict | None, str, dict]:
+    """
+    Run Phase 1 `runs` times concurrently on disjoint samples (seeds
+    random_state, random_state + 1, ...) and merge the results.
+    Returns (consensus taxonomy or None, first prompt, report).
+    """
+    samples, taken = [], set()
+    for i in range(runs):
+        seed = None if random_state is None else random_state + i
+        # Disjoint while the data allows it, overlapping after that
+        pool = df.drop(index=list(taken)) if len(df) - len(taken) >= sample_size else df
+        sample = sample_messages(pool, sample_size, seed)
+        taken.update(sample.index)
+        samples.append(sample)
+    prompts = [build_sample_prompt(sample, prompt_config) for sample in samples]
+
+    logger.info(f"Calling LLM {runs}× concurrently...")
+
+    async def call_all():
+        return await asyncio.gather(
+            *(
+                acall_llm(
+                    prompt=prompt,
+                    models=cfg.P1_MODELS,
+                    max_tokens=cfg.P1_MAX_TOKENS,
+                    namespace="phase_1",
+                    use_cache=use_cache,
+                    tracker=ctx.tracker,
+                )
+                for prompt in prompts
+            ),
+            return_exceptions=True,
+        )
+
+    taxonomies = []
+    for i, response in enumerate(run_sync(call_all())):
+        if isinstance(response, Exception):
+            logger.error(f"Exploration run {i + 1} failed: {response}")
+            continue
+        taxonomy = parse_taxonomy(response)
+        if taxonomy is not None:
+            taxonomies.append(taxonomy)
+
+    report = {"runs": runs, "valid_runs": len(taxonomies)}
+    if 0 < len(taxonomies) < runs:
+        ctx.degraded.append(f"Phase 1: only {len(taxonomies)} of {runs} exploration runs usable")
+    if not taxonomies:
+        return None, prompts[0], report
+
+    consensus, merge_report = merge_taxonomies(taxonomies)
+    report.update(merge_report, runs=runs)
+    logger.info(
+        f"Exploration: {len(taxonomies)}/{runs} runs merged, "
+        f"stability {merge_report['stability']:.2f}"
+    )
+    for group in merge_report["groups"]:
+        mark = "✓" if group["kept"] else "✗"
+        logger.info(f"  {mark} {group['support']:.0%}  {group['name']}")
+
+    if not consensus["categories"]:
+        logger.warning("No category reached consensus — using the first run's taxonomy")
+        return taxonomies[0], prompts[0], report
+    return consensus, prompts[0], report
+
+
 def run(
     sample_size: int = None,
     random_state: int = None,
     prompt_config: dict | None = None,
+    use_cache: bool = True,
+    explore_runs: int = None,
+    ctx: PipelineContext = None,
 ) -> dict:
     """
     Execute Phase 1: sample messages → LLM → initial taxonomy.
@@ -71,77 +208,63 @@ def run(
                         - mode ("structured" | "raw")
                         - raw_prompt (str, only when mode == "raw")
                         If None, uses legacy build_prompt().
+        use_cache:      If False, bypass the LLM response cache
+        explore_runs:   Override config P1_EXPLORE_RUNS. Above 1, that many
+                        calls run concurrently on disjoint samples and are
+                        merged into a consensus taxonomy.
+        ctx:            Data path, output dir and token tracker for this run
+                        (default: PipelineContext.default())
 
     Returns:
         Tuple of (taxonomy_dict, composed_prompt_string).
         taxonomy has categories, subcategories, and reasoning.
-        composed_prompt is the exact string sent to the LLM (for metadata).
+        composed_prompt is the exact string sent to the LLM (for metadata;
+        the first run's prompt when exploring).
     """
+    ctx = ctx or PipelineContext.default()
     sample_size = sample_size or cfg.P1_SAMPLE_SIZE
     random_state = random_state if random_state is not None else cfg.P1_RANDOM_STATE
+    explore_runs = explore_runs or cfg.P1_EXPLORE_RUNS
 
-    logger.info(f"Phase 1: Sampling {sample_size} messages (seed={random_state})")
-
-    # Load and sample
-    df = load_awards()
-    sample = df.sample(
-        n=min(sample_size, len(df)),
-        random_state=random_state,
+    logger.info(
+        f"Phase 1: Sampling {sample_size} messages "
+        f"({cfg.P1_SAMPLING}, seed={random_state}"
+        + (f", {explore_runs} runs)" if explore_runs > 1 else ")")
     )
 
-    if prompt_config is not None:
-        # Dashboard-driven: use prompt_composer with all 4 columns
-        if prompt_config.get("mode") == "raw" and prompt_config.get("raw_prompt"):
-            # Raw mode: user wrote the full editable section
-            # We still inject messages at the end (locked section)
-            raw = prompt_config["raw_prompt"]
-            msg_lines = []
-            for i, row in sample.iterrows():
-                msg_text = str(row[cfg.COL_MESSAGE])[:cfg.P1_MSG_TRUNCATE]
-                award = row.get(cfg.COL_AWARD_TITLE, "N/A")
-                recipient = row.get(cfg.COL_RECIPIENT_TITLE, "N/A")
-                nominator = row.get(cfg.COL_NOMINATOR_TITLE, "N/A")
-                msg_lines.append(
-                    f"Message:\n  Award: {award}\n"
-                    f"  From: {nominator} → To: {recipient}\n  {msg_text}"
-                )
-            prompt = raw + f"\n\nHere are {len(sample)} messages:\n\n" + "\n\n---\n\n".join(msg_lines)
-        else:
-            # Structured mode: compose from fields
-            prompt = compose_phase1_prompt(sample, prompt_config)
+    # Load and sample
+    df = load_awards(ctx.data_path)
+    exploration = None
 
-        logger.info(f"Custom prompt composed ({len(prompt)} chars)")
+    if explore_runs > 1:
+        taxonomy, prompt, exploration = _explore(
+            df, sample_size, random_state, prompt_config, use_cache, explore_runs, ctx,
+        )
+        sample_len = min(sample_size, len(df))
     else:
-        # Legacy: CLI / backward compat — uses only message column
-        messages = sample[cfg.COL_MESSAGE].tolist()
-        prompt = build_prompt(messages)
-        logger.info(f"Default prompt built ({len(prompt)} chars)")
+        sample = sample_messages(df, sample_size, random_state)
+        sample_len = len(sample)
+        prompt = build_sample_prompt(sample, prompt_config)
 
-    logger.info("Calling LLM...")
+        logger.info("Calling LLM...")
 
-    # Call LLM (Claude or Gemini, with automatic fallback)
-    response = call_llm(
-        prompt=prompt,
-        models=cfg.P1_MODELS,
-        max_tokens=cfg.P1_MAX_TOKENS,
-    )
+        # Call LLM (Claude or Gemini, with automatic fallback)
+        response = call_llm(
+            prompt=prompt,
+            models=cfg.P1_MODELS,
+            max_tokens=cfg.P1_MAX_TOKENS,
+            namespace="phase_1",
+            use_cache=use_cache,
+            tracker=ctx.tracker,
+        )
+        taxonomy = parse_taxonomy(response)
 
-    # Parse response
-    try:
-        taxonomy = extract_json(response)
-    except ValueError as e:
-        logger.error(f"Failed to parse LLM response: {e}")
+    if taxonomy is None:
         logger.warning("Falling back to default taxonomy")
+        ctx.degraded.append("Phase 1: no usable LLM taxonomy, fell back to the default")
         from defaults import DEFAULT_TAXONOMY
         taxonomy = DEFAULT_TAXONOMY
-
-    # Validate structure
-    categories = taxonomy.get("categories", [])
-    if not categories:
-        logger.warning("Empty categories returned, using defaults")
-        from defaults import DEFAULT_TAXONOMY
-        taxonomy = DEFAULT_TAXONOMY
-        categories = taxonomy["categories"]
+    categories = taxonomy["categories"]
 
     # Log summary
     logger.info(f"Taxonomy created: {len(categories)} categories")
@@ -154,20 +277,23 @@ def run(
         output = {
             "metadata": {
                 "phase": 1,
-                "sample_size": len(sample),
+                "sample_size": sample_len,
                 "random_state": random_state,
+                "sampling": cfg.P1_SAMPLING,
                 "models": cfg.P1_MODELS,
                 "custom_prompt": prompt_config is not None,
             },
             "taxonomy": taxonomy,
         }
+        if exploration is not None:
+            output["metadata"]["exploration"] = exploration
 
         if prompt_config is not None:
             output["metadata"]["prompt_config"] = build_prompt_metadata(
                 prompt_config, prompt
             )
 
-        save_json(output, cfg.OUTPUT_DIR / "phase_1_taxonomy.json", "Phase 1 taxonomy")
+        save_json(output, ctx.output_dir / "phase_1_taxonomy.json", "Phase 1 taxonomy")
 
     return taxonomy, prompt
 
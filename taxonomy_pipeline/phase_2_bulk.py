@@ -1,15 +1,44 @@
+import hashlib
 import json
+import random
+import re
+import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable, Iterator
 
 import config as cfg
+from checkpoint import BatchJournal
+from classification_memo import get_memo, message_hash, taxonomy_hash
+from context import PipelineContext
+from dedup import collapse
+from discovery import ShareEstimator
+from local_classifier import LocalClassifier, label_key, model_path, split_label
+from batch_planner import get_model_budget, plan_batches, estimate_tokens
+from work_queue import WorkQueue
 from utils import (
-    load_awards, call_ollama, call_llm, check_ollama, extract_json,
-    save_json, load_json, ensure_dir, get_logger,
+    load_messages, call_ollama, call_ollama_stream, call_llm, check_ollama,
+    extract_json, save_json, load_json, get_logger, TokenTracker,
 )
 
 logger = get_logger("phase_2")
 
+# Every config.py setting that changes Phase 2's classifications, including
+# those read by dedup and local_classifier (the DAG fingerprint). Workers,
+# queue and memo settings only change how the same answer is reached.
+OUTPUT_CONFIG = [
+    "P2_MODEL", "GEMINI_DEFAULT_MODEL", "GROQ_DEFAULT_MODEL", "P2_TEMPERATURE",
+    "P2_MSG_TRUNCATE", "P2_OLLAMA_NUM_CTX", "P2_OLLAMA_STREAM", "P1_MAX_TOKENS",
+    "P2_BATCH_SIZE", "P2_BATCH_PLANNER", "P2_MAX_BATCH_ITEMS", "P2_OUTPUT_TOKENS_PER_ITEM",
+    "P2_COMPACT_OUTPUT_TOKENS_PER_ITEM", "P2_RESPONSE_FORMAT", "P2_STRUCTURED_OUTPUT",
+    "P2_STREAM_MAX_BAD_OBJECTS", "P2_STREAM_MAX_JUNK_CHARS", "P2_REASK_ATTEMPTS", "P2_BISECT",
+    "P2_DEDUP", "P2_DEDUP_THRESHOLD", "P2_CASCADE", "P2_CASCADE_THRESHOLD",
+    "P2_CASCADE_AUDIT_FRAC", "P2_CASCADE_MIN_TRAIN", "P2_CASCADE_WARMUP", "P2_DISCOVERY",
+    "P2_DISCOVERY_MARGIN", "P2_DISCOVERY_CONFIDENCE", "P2_DISCOVERY_MIN_SAMPLE",
+    "P2_DISCOVERY_ROUND", "P2_DISCOVERY_SEED", "COL_MESSAGE",
+]
+
 
 def build_taxonomy_schema(taxonomy: dict) -> str:
     """Format taxonomy into a compact schema string for the prompt."""
@@ -22,16 +51,85 @@ def build_taxonomy_schema(taxonomy: dict) -> str:
     return "\n".join(lines)
 
 
-def build_batch_prompt(schema: str, batch_messages: list[dict]) -> str:
+def taxonomy_ids(taxonomy: dict) -> dict[str, set[str]]:
+    """Category ID → its subcategory IDs, for validating responses."""
+    return {
+        str(cat["id"]): {str(s["id"]) for s in cat.get("subcategories", [])}
+        for cat in taxonomy.get("categories", [])
+    }
+
+
+def build_response_schema(ids: dict[str, set[str]]) -> dict:
+    """
+    JSON schema for a batch answer, with the taxonomy's category and
+    subcategory IDs as enums, for providers' structured-output modes.
+    """
+    sub_ids = sorted({sub for subs in ids.values() for sub in subs})
+    subcategory = {"type": "string", "enum": sub_ids} if sub_ids else {"type": "string"}
+    return {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {
+                "idx": {"type": "integer"},
+                "category": {"type": "string", "enum": sorted(ids)},
+                "subcategory": subcategory,
+                "themes": {"type": "array", "items": {"type": "string"}, "maxItems": 3},
+                "new_category": {"type": ["string", "null"]},
+            },
+            "required": ["idx", "category", "subcategory", "themes", "new_category"],
+            "additionalProperties": False,
+        },
+    }
+
+
+def build_system_prompt(compact: bool = False) -> str:
+    """System prompt for API providers (must match the prompt's response format)."""
+    return (
+        "You are an HR analytics assistant. Classify recognition messages precisely. "
+        + ("Respond with ONLY the requested lines." if compact else "Respond with ONLY valid JSON.")
+    )
+
+
+def _compact_mode() -> bool:
+    return cfg.P2_RESPONSE_FORMAT == "compact"
+
+
+def build_batch_prompt(schema: str, batch_messages: list[dict], compact: bool = False) -> str:
     """
     Construct prompt for a batch of messages.
     Works for both Ollama and API-based providers.
+
+    compact asks for one "idx;category;subcategory;themes;new" line per
+    message instead of a JSON array (see parse_compact_response).
     """
     msg_block = "\n\n".join(
         f"[{item['idx']}] {item['text'][:cfg.P2_MSG_TRUNCATE]}"
         for item in batch_messages
     )
 
+    if compact:
+        return f"""Categorize each employee recognition message using this taxonomy.
+
+TAXONOMY:
+{schema}
+
+MESSAGES:
+{msg_block}
+
+For each message, respond with ONE line in this format (no other text):
+idx;category;subcategory;theme1|theme2;new_category
+
+Example:
+1;A;A1;teamwork|launch;-
+
+Rules:
+- category and subcategory must use IDs from the taxonomy above.
+- 1-3 short theme keywords, separated by "|".
+- new_category is "-" UNLESS the message clearly does not fit ANY
+  existing category. If so, give a short name for the new category.
+- One line per message, no header, no explanation."""
+
     return f"""Categorize each employee recognition message using this taxonomy.
 
 TAXONOMY:
@@ -59,6 +157,62 @@ Rules:
 - Respond with ONLY the JSON array, no explanation."""
 
 
+def plan_message_batches(
+    messages: list[str],
+    schema: str,
+    provider: str,
+    model: str,
+    batch_size: int | None,
+) -> list[list[int]]:
+    """
+    Split message positions into batches.
+
+    With an explicit batch_size, or P2_BATCH_PLANNER off, this is the
+    fixed-size chunking Phase 2 always used. Otherwise batches are
+    token-packed against the model's budget in model_registry.json.
+    """
+    compact = _compact_mode()
+    if batch_size or not cfg.P2_BATCH_PLANNER:
+        size = batch_size or cfg.P2_BATCH_SIZE
+        if provider == "ollama" and size > 8:
+            # Ollama handles smaller batches due to context window
+            logger.warning(f"Batch size {size} may exceed Ollama context window, capping at 8")
+            size = 8
+        elif provider != "ollama" and size < 10:
+            size = 10  # bump up for faster processing via API
+            logger.info(f"Increased batch size to {size} for API provider")
+        return [
+            list(range(i, min(i + size, len(messages))))
+            for i in range(0, len(messages), size)
+        ]
+
+    # API calls request P1_MAX_TOKENS of output; Ollama is bounded by the model
+    budget = get_model_budget(
+        provider, model,
+        max_output_tokens=None if provider == "ollama" else cfg.P1_MAX_TOKENS,
+    )
+    if provider == "ollama":
+        budget["context_tokens"] = min(budget["context_tokens"], cfg.P2_OLLAMA_NUM_CTX)
+    # Formatted as build_batch_prompt will render each line
+    items = [f"[00] {text[:cfg.P2_MSG_TRUNCATE]}\n\n" for text in messages]
+    overhead = estimate_tokens(build_batch_prompt(schema, [], compact=compact))
+    batches = plan_batches(
+        items,
+        overhead_tokens=overhead,
+        output_tokens_per_item=(
+            cfg.P2_COMPACT_OUTPUT_TOKENS_PER_ITEM if compact else cfg.P2_OUTPUT_TOKENS_PER_ITEM
+        ),
+        context_tokens=budget["context_tokens"],
+        max_output_tokens=budget["max_output_tokens"],
+        max_items=cfg.P2_MAX_BATCH_ITEMS,
+    )
+    logger.info(
+        f"Batch planner: {len(messages)} messages → {len(batches)} batches "
+        f"(budget {budget['context_tokens']} ctx / {budget['max_output_tokens']} out)"
+    )
+    return batches
+
+
 def parse_batch_response(response: str, batch_size: int) -> list[dict]:
     """
     Parse LLM's JSON response. Falls back to empty results on failure.
@@ -69,6 +223,14 @@ def parse_batch_response(response: str, batch_size: int) -> list[dict]:
     if not response:
         return []
 
+    # Structured output arrives as a bare array — no cleanup needed
+    try:
+        parsed = json.loads(response)
+        if isinstance(parsed, list):
+            return parsed
+    except json.JSONDecodeError:
+        pass
+
     # Try parsing as JSON array
     try:
         text = response.strip()
@@ -102,57 +264,247 @@ def parse_batch_response(response: str, batch_size: int) -> list[dict]:
     return results
 
 
-def load_checkpoint() -> tuple[list[dict], dict[str, int], int]:
-    """Load checkpoint if it exists."""
-    checkpoint_path = cfg.P2_CHECKPOINT_DIR / "phase_2_checkpoint.json"
-    if checkpoint_path.exists():
-        data = load_json(checkpoint_path)
-        logger.info(
-            f"Resuming from checkpoint: batch {data['last_batch']} "
-            f"({data['messages_processed']} messages processed)"
-        )
-        return (
-            data["results"],
-            defaultdict(int, data["candidates"]),
-            data["last_batch"],
-        )
-    return [], defaultdict(int), 0
-
-
-def save_checkpoint(
-    results: list[dict],
-    candidates: dict[str, int],
-    batch_num: int,
-    messages_processed: int,
-) -> None:
-    """Save intermediate state for crash recovery."""
-    ensure_dir(cfg.P2_CHECKPOINT_DIR)
-    save_json(
-        {
-            "last_batch": batch_num,
-            "messages_processed": messages_processed,
-            "results": results,
-            "candidates": dict(candidates),
-        },
-        cfg.P2_CHECKPOINT_DIR / "phase_2_checkpoint.json",
-        label=f"checkpoint (batch {batch_num})",
-    )
+_COMPACT_LINE = re.compile(r"^\[?(\d+)\]?\s*;(.*)$")
+_NO_NEW_CATEGORY = {"", "-", "none", "null", "n/a"}
+
 
+def parse_compact_response(
+    response: str,
+    batch_size: int,
+    ids: dict[str, set[str]] | None = None,
+) -> list[dict]:
+    """
+    Parse compact "idx;category;subcategory;t1|t2;new" lines into the same
+    dicts parse_batch_response returns. Lines that don't match are skipped.
 
-def _call_provider(prompt: str, provider: str, model: str) -> str | None:
+    With ids (from taxonomy_ids) every line is validated: a subcategory
+    listed under another category moves the item to that category, an
+    unknown subcategory is blanked, and an unknown category drops the line
+    unless a new_category was proposed.
+    """
+    if not response:
+        return []
+
+    sub_parent = {}
+    if ids is not None:
+        sub_parent = {sub: cat for cat, subs in ids.items() for sub in subs}
+
+    results = []
+    for line in response.splitlines():
+        m = _COMPACT_LINE.match(line.strip().strip("`").strip())
+        if not m:
+            continue
+        fields = [f.strip() for f in m.group(2).split(";")]
+        if len(fields) < 2:
+            continue
+        category, subcategory = fields[0], fields[1]
+        themes = []
+        if len(fields) > 2:
+            themes = [t.strip() for t in fields[2].split("|") if t.strip()][:3]
+        new_category = ";".join(fields[3:]).strip() or None
+        if new_category and new_category.lower() in _NO_NEW_CATEGORY:
+            new_category = None
+
+        if ids is not None:
+            if subcategory in sub_parent:
+                category = sub_parent[subcategory]
+            elif category in ids:
+                subcategory = ""
+            elif new_category:
+                category, subcategory = "", ""
+            else:
+                continue
+
+        results.append({
+            "idx": int(m.group(1)),
+            "category": category,
+            "subcategory": subcategory,
+            "themes": themes,
+            "new_category": new_category,
+        })
+
+    return results
+
+
+def _looks_compact(text: str) -> bool:
+    return any(_COMPACT_LINE.match(line.strip()) for line in text.splitlines())
+
+
+class StreamingCompactParser:
+    """
+    Stop condition for a streamed compact response: feed() returns True
+    once a complete line has arrived for every expected idx, or once
+    more than P2_STREAM_MAX_JUNK_CHARS of non-matching text has streamed.
+    Parsing itself is left to parse_compact_response.
+    """
+
+    def __init__(self, expected_idx: set[int]):
+        self.pending = set(expected_idx)
+        self.malformed = False
+        self._line: list[str] = []
+        self._junk = 0
+
+    def feed(self, chunk: str) -> bool:
+        for ch in chunk:
+            if ch != "\n":
+                self._line.append(ch)
+                continue
+            line = "".join(self._line).strip()
+            self._line = []
+            m = _COMPACT_LINE.match(line.strip("`"))
+            if m:
+                self.pending.discard(int(m.group(1)))
+                if not self.pending:
+                    return True
+            elif line:
+                self._junk += len(line)
+                if self._junk > cfg.P2_STREAM_MAX_JUNK_CHARS:
+                    self.malformed = True
+                    return True
+        return False
+
+
+class StreamingBatchParser:
+    """
+    Incremental parser for a streamed JSON array of classification objects.
+
+    feed() scans each fragment with a small brace/string state machine and
+    json-decodes every top-level object the moment its closing brace
+    arrives. It returns True once generation can stop: every expected idx
+    has been emitted, the array was closed, or the output is clearly
+    malformed (too much non-JSON text or too many undecodable objects).
+    """
+
+    def __init__(self, expected_idx: set[int]):
+        self.pending = set(expected_idx)
+        self.results: list[dict] = []
+        self.malformed = False
+        self._buf: list[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._junk = 0
+        self._bad = 0
+
+    def feed(self, chunk: str) -> bool:
+        for ch in chunk:
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._buf = [ch]
+                elif ch == "]" and self.results:
+                    return True
+                elif not ch.isspace() and ch not in "[,`":
+                    self._junk += 1
+                    if self._junk > cfg.P2_STREAM_MAX_JUNK_CHARS:
+                        self.malformed = True
+                        return True
+                continue
+
+            self._buf.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0 and self._close_object():
+                    return True
+        return False
+
+    def _close_object(self) -> bool:
+        try:
+            obj = json.loads("".join(self._buf))
+        except json.JSONDecodeError:
+            obj = None
+
+        if not isinstance(obj, dict) or "category" not in obj:
+            self._bad += 1
+            if self._bad >= cfg.P2_STREAM_MAX_BAD_OBJECTS:
+                self.malformed = True
+                return True
+            return False
+
+        self.results.append(obj)
+        self.pending.discard(obj.get("idx"))
+        return not self.pending
+
+
+def _call_provider(
+    prompt: str,
+    provider: str,
+    model: str,
+    use_cache: bool = True,
+    expected_idx: set[int] | None = None,
+    compact: bool = False,
+    response_schema: dict | None = None,
+    tracker: TokenTracker = None,
+) -> str | None:
     """
     Route a Phase 2 call to the correct backend.
 
-    - "ollama" → call_ollama() (local, returns None on failure)
-    - "groq", "google", "anthropic" → call_llm() (API, raises on failure)
+    - "ollama" → call_ollama() (local, returns None on failure), or the
+      streaming path when P2_OLLAMA_STREAM is on and expected_idx is given
+    - "groq", "google", "anthropic" → call_llm() pinned to that provider
+      (API, raises on failure; no fallback to another provider)
 
+    compact must match the prompt's response format. response_schema
+    (JSON mode only) constrains the output natively on every backend.
+    Token usage goes to tracker (default: the shared token_tracker).
     Returns response text, or None if Ollama fails.
     """
+    if provider == "ollama" and cfg.P2_OLLAMA_STREAM and expected_idx and compact:
+        line_parser = StreamingCompactParser(expected_idx)
+        text = call_ollama_stream(
+            prompt=prompt,
+            on_chunk=line_parser.feed,
+            model=model,
+            temperature=cfg.P2_TEMPERATURE,
+            namespace="phase_2",
+            use_cache=use_cache,
+            tracker=tracker,
+        )
+        if line_parser.malformed:
+            logger.warning("Compact stream aborted as malformed")
+        return text
+
+    if provider == "ollama" and cfg.P2_OLLAMA_STREAM and expected_idx:
+        parser = StreamingBatchParser(expected_idx)
+        text = call_ollama_stream(
+            prompt=prompt,
+            on_chunk=parser.feed,
+            model=model,
+            temperature=cfg.P2_TEMPERATURE,
+            namespace="phase_2",
+            use_cache=use_cache,
+            response_schema=response_schema,
+            tracker=tracker,
+        )
+        if parser.malformed:
+            logger.warning(
+                f"Stream aborted as malformed after {len(parser.results)} objects"
+            )
+        if parser.results:
+            # Hand parse_batch_response a clean array, not a cut-off stream
+            return json.dumps(parser.results)
+        return text
+
     if provider == "ollama":
         return call_ollama(
             prompt=prompt,
             model=model,
             temperature=cfg.P2_TEMPERATURE,
+            namespace="phase_2",
+            use_cache=use_cache,
+            response_schema=response_schema,
+            tracker=tracker,
         )
     else:
         # Map provider names to call_llm's model dict format
@@ -166,36 +518,546 @@ def _call_provider(prompt: str, provider: str, model: str) -> str | None:
             return call_llm(
                 prompt=prompt,
                 models={provider_key: model},
+                # Pinned: labels are memoised under this model, so an
+                # answer from a fallback provider must not stand in for it
+                providers=[provider_key],
                 max_tokens=cfg.P1_MAX_TOKENS,
-                system="You are an HR analytics assistant. Classify recognition messages precisely. Respond with ONLY valid JSON.",
+                system=build_system_prompt(compact),
+                namespace="phase_2",
+                use_cache=use_cache,
+                validate=_looks_compact if compact else None,
+                response_schema=response_schema,
+                tracker=tracker,
             )
         except Exception as e:
             logger.error(f"API call failed ({provider}/{model}): {e}")
             return None
 
 
+def _make_asker(
+    schema: str,
+    provider: str,
+    model: str,
+    use_cache: bool,
+    ids: dict[str, set[str]] | None = None,
+    tracker: TokenTracker = None,
+) -> Callable[[list[str]], dict[int, dict] | None]:
+    """
+    One LLM call over a list of texts → {position: item}, or None when
+    the call failed or returned nothing usable. Items whose idx is
+    missing, out of range or repeated are dropped. In compact mode,
+    lines are validated against ids (see parse_compact_response); in JSON
+    mode ids become the structured-output schema (P2_STRUCTURED_OUTPUT).
+    """
+    compact = _compact_mode()
+    response_schema = None
+    if not compact and cfg.P2_STRUCTURED_OUTPUT and ids:
+        response_schema = build_response_schema(ids)
+
+    def ask(texts: list[str]) -> dict[int, dict] | None:
+        items = [{"idx": j + 1, "text": text} for j, text in enumerate(texts)]
+        response = _call_provider(
+            build_batch_prompt(schema, items, compact=compact), provider, model,
+            use_cache=use_cache,
+            expected_idx={item["idx"] for item in items},
+            compact=compact,
+            response_schema=response_schema,
+            tracker=tracker,
+        )
+        if compact:
+            parsed = parse_compact_response(response, len(texts), ids)
+        else:
+            parsed = parse_batch_response(response, len(texts))
+        found = {}
+        for item in parsed:
+            try:
+                j = int(item.get("idx")) - 1
+            except (TypeError, ValueError):
+                continue
+            if 0 <= j < len(texts) and j not in found:
+                found[j] = item
+        return found or None
+
+    return ask
+
+
+def classify_with_recovery(
+    texts: list[str],
+    ask: Callable[[list[str]], dict[int, dict] | None],
+    reask: int = None,
+) -> dict[int, dict]:
+    """
+    Classify texts, recovering what a single call loses.
+
+    - Items missing from a partial answer are re-asked on their own (up
+      to P2_REASK_ATTEMPTS times), so answered items are never paid for
+      twice.
+    - A call that fails outright is bisected (P2_BISECT): each half is
+      retried, and a failing half is split again until the single
+      message that breaks the model is isolated and skipped. If both
+      halves fail the provider is the problem, not a message, so
+      bisection stops there.
+
+    Returns {position: item} for every text that could be classified.
+    """
+    reask = cfg.P2_REASK_ATTEMPTS if reask is None else reask
+    found = ask(texts)
+    if found is None:
+        return _bisect(texts, ask, reask) if cfg.P2_BISECT else {}
+    return _fill_missing(texts, found, ask, reask)
+
+
+def _fill_missing(
+    texts: list[str],
+    found: dict[int, dict],
+    ask: Callable[[list[str]], dict[int, dict] | None],
+    reask: int,
+) -> dict[int, dict]:
+    missing = [j for j in range(len(texts)) if j not in found]
+    if missing and reask > 0:
+        logger.info(f"Re-asking for {len(missing)} of {len(texts)} missing items")
+        retry = classify_with_recovery([texts[j] for j in missing], ask, reask - 1)
+        for sub_j, item in retry.items():
+            found[missing[sub_j]] = item
+    return found
+
+
+def _bisect(
+    texts: list[str],
+    ask: Callable[[list[str]], dict[int, dict] | None],
+    reask: int,
+) -> dict[int, dict]:
+    if len(texts) == 1:
+        logger.warning(f"Isolated a message the model cannot classify: {texts[0][:80]!r}")
+        return {}
+
+    mid = len(texts) // 2
+    halves = [(0, texts[:mid]), (mid, texts[mid:])]
+    answers = [ask(half) for _, half in halves]
+    if all(found is None for found in answers):
+        logger.warning(f"Both halves of a {len(texts)}-message batch failed; not bisecting further")
+        return {}
+
+    result = {}
+    for (offset, half), found in zip(halves, answers):
+        if found is None:
+            sub = _bisect(half, ask, reask)
+        else:
+            sub = _fill_missing(half, found, ask, reask)
+        for j, item in sub.items():
+            result[offset + j] = item
+    return result
+
+
+def dispatch_ordered(
+    fn: Callable[[int], object],
+    batch_nums: list[int],
+    workers: int,
+) -> Iterator[tuple[int, object]]:
+    """
+    Run fn(batch_num) on a bounded thread pool, yielding (batch_num, result)
+    strictly in batch order.
+
+    Up to 2×workers batches are in flight so threads stay busy while the
+    head of the queue finishes. Closing the generator cancels batches that
+    have not started yet and waits for the running ones; a caller that
+    breaks out early should close() it right away rather than leave that
+    to garbage collection.
+    """
+    window = max(1, workers) * 2
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="phase_2")
+    pending = {}
+    submitted = 0
+    try:
+        for i, batch_num in enumerate(batch_nums):
+            while submitted < len(batch_nums) and submitted - i < window:
+                nxt = batch_nums[submitted]
+                pending[nxt] = pool.submit(fn, nxt)
+                submitted += 1
+            yield batch_num, pending.pop(batch_num).result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def dispatch_queue(
+    wq: WorkQueue,
+    job_id: str,
+    spec: dict,
+    tasks: dict[int, list[str]],
+) -> Iterator[tuple[int, dict[int, dict]]]:
+    """
+    Enqueue batches for phase_2_worker.py processes and yield
+    (batch_num, {pos: item}) as workers finish them, in completion order.
+    Batches that failed on every attempt come back empty. Each batch
+    is yielded once.
+    """
+    wq.submit(job_id, spec, tasks)
+    remaining = set(tasks)
+    seq = 0
+    last_log = time.monotonic()
+    while remaining:
+        seq, finished = wq.finished(job_id, after=seq)
+        for batch_num, found in finished:
+            if batch_num in remaining:
+                remaining.discard(batch_num)
+                yield batch_num, found
+        if not remaining:
+            break
+        if time.monotonic() - last_log >= 60:
+            counts = wq.counts(job_id)
+            logger.info(
+                f"  Queue {job_id}: {counts.get('pending', 0)} pending, "
+                f"{counts.get('leased', 0)} leased, {len(remaining)} still to merge"
+            )
+            last_log = time.monotonic()
+        time.sleep(cfg.P2_QUEUE_POLL_SECONDS)
+
+
+def _label_with_llm(
+    texts: list[str],
+    schema: str,
+    provider: str,
+    model: str,
+    batch_size: int | None,
+    use_cache: bool,
+    ids: dict[str, set[str]] | None = None,
+    tracker: TokenTracker = None,
+) -> list[dict | None]:
+    """
+    Full LLM label per text (None if unclassified) from a plain
+    (uncheckpointed) LLM pass — used for the cascade warm-up. Reruns are
+    cheap since answers come from the LLM cache.
+    """
+    batches = plan_message_batches(texts, schema, provider, model, batch_size)
+    ask = _make_asker(schema, provider, model, use_cache, ids, tracker)
+
+    def classify(batch_num: int) -> dict[int, dict]:
+        return classify_with_recovery([texts[pos] for pos in batches[batch_num]], ask)
+
+    labels: list[dict | None] = [None] * len(texts)
+    for batch_num, found in dispatch_ordered(
+        classify, list(range(len(batches))), cfg.P2_WORKERS.get(provider, 1),
+    ):
+        for j, item in found.items():
+            labels[batches[batch_num][j]] = {
+                "category": item.get("category", ""),
+                "subcategory": item.get("subcategory", ""),
+                "themes": item.get("themes", []),
+                "new_category": item.get("new_category"),
+            }
+    return labels
+
+
+def _plan_cascade(
+    rep_messages: list[str],
+    pending: list[int],
+    taxonomy: dict,
+    schema: str,
+    provider: str,
+    model: str,
+    batch_size: int | None,
+    use_cache: bool,
+    tracker: TokenTracker = None,
+) -> tuple[list[int], dict[int, tuple[str, str]], dict[int, str], dict[int, dict], LocalClassifier]:
+    """
+    Decide which of the pending messages the LLM still has to see.
+
+    Returns (queue, local, audit, warm, classifier):
+        queue   message positions to send to the LLM, in order
+        local   position → (label key, source) for messages labelled without it
+        audit   position → local label for the held-out slice that is
+                labelled locally *and* sent to the LLM, to measure agreement
+        warm    position → full LLM label for messages the warm-up just
+                sent to the LLM; the caller treats them like LLM results
+                (candidates, memo)
+
+    The split depends only on the stored model and the messages, so a
+    resumed run rebuilds the same queue (and the same batch numbers).
+    """
+    path = model_path(taxonomy)
+    clf = LocalClassifier.load(path) or LocalClassifier()
+
+    warm: dict[int, dict] = {}
+    if not clf.trained:
+        picked = [k for k in pending if rep_messages[k] not in clf.examples]
+        picked = picked[:cfg.P2_CASCADE_WARMUP]
+        logger.info(f"Cascade: no model for this taxonomy yet, warming up on {len(picked)} messages")
+        warm_texts = [rep_messages[k] for k in picked]
+        warm_labels = _label_with_llm(
+            warm_texts, schema, provider, model, batch_size, use_cache,
+            taxonomy_ids(taxonomy), tracker,
+        )
+        warm = {k: label for k, label in zip(picked, warm_labels) if label}
+        clf.add_examples(
+            warm_texts,
+            [label_key(label) if label else None for label in warm_labels],
+        )
+        if not clf.fit():
+            logger.warning(
+                f"Cascade: only {len(clf.examples)} usable labels "
+                f"(need {cfg.P2_CASCADE_MIN_TRAIN}), sending everything to the LLM"
+            )
+        clf.save(path)
+
+    local: dict[int, tuple[str, str]] = {}
+    unknown = []
+    for k in pending:
+        if k in warm:
+            continue
+        if rep_messages[k] in clf.examples:
+            local[k] = (clf.examples[rep_messages[k]], "training")
+        else:
+            unknown.append(k)
+
+    if not clf.trained:
+        return unknown, local, {}, warm, clf
+
+    labels, confidences = clf.predict([rep_messages[k] for k in unknown])
+    confident = []
+    queue = []
+    for k, label, conf in zip(unknown, labels, confidences):
+        if conf >= cfg.P2_CASCADE_THRESHOLD:
+            confident.append((k, label))
+        else:
+            queue.append(k)
+
+    # Every n-th confident message is also checked by the LLM
+    step = round(1 / cfg.P2_CASCADE_AUDIT_FRAC) if cfg.P2_CASCADE_AUDIT_FRAC else 0
+    audit = {}
+    for i, (k, label) in enumerate(confident):
+        if step and i % step == 0:
+            audit[k] = label
+            queue.append(k)
+        else:
+            local[k] = (label, "local")
+
+    return sorted(queue), local, audit, warm, clf
+
+
+def _cascade_agreement(audit: dict[int, str], by_row: dict[int, dict], representatives: list[int]) -> dict:
+    """How often the local label matched the LLM on the audited slice."""
+    same_cat = same_sub = n = 0
+    for k, local_label in audit.items():
+        llm = by_row.get(representatives[k])
+        llm_label = label_key(llm) if llm else None
+        if not llm_label:
+            continue
+        n += 1
+        same_sub += llm_label == local_label
+        same_cat += split_label(llm_label)[0] == split_label(local_label)[0]
+    return {
+        "audited": n,
+        "category_agreement": round(same_cat / n, 3) if n else None,
+        "subcategory_agreement": round(same_sub / n, 3) if n else None,
+    }
+
+
+def _candidate_of(label: dict) -> str | None:
+    new_cat = label.get("new_category")
+    if new_cat and isinstance(new_cat, str) and new_cat.lower() != "null":
+        return new_cat
+    return None
+
+
+def _run_discovery(
+    messages: list[str],
+    rep_messages: list[str],
+    members: list[list[int]],
+    taxonomy: dict,
+    schema: str,
+    provider: str,
+    model: str,
+    batch_size: int | None,
+    use_cache: bool,
+    ctx: PipelineContext,
+) -> tuple[list[dict], dict[str, int]]:
+    """
+    Discovery mode: classify rows in a random order, a round at a time,
+    until the category and candidate shares have converged (discovery.py).
+    Each dedup cluster is classified at most once and memoized labels are
+    free. Candidate counts are scaled to the whole upload, so Phase 3
+    sees the same kind of input as after a full run.
+
+    Discovery runs are short and are not checkpointed.
+    """
+    total = len(messages)
+    cluster_of = [0] * total
+    for k, rows in enumerate(members):
+        for row in rows:
+            cluster_of[row] = k
+    order = list(range(total))
+    random.Random(cfg.P2_DISCOVERY_SEED).shuffle(order)
+
+    memo = get_memo() if use_cache else None
+    tax_hash = taxonomy_hash(taxonomy)
+    ask = _make_asker(schema, provider, model, use_cache, taxonomy_ids(taxonomy), ctx.tracker)
+    workers = cfg.P2_WORKERS.get(provider, 1)
+
+    est = ShareEstimator(total, cfg.P2_DISCOVERY_CONFIDENCE)
+    labels: dict[int, dict] = {}     # cluster → label
+    failed: set[int] = set()
+    results = []
+    sampled = 0
+    llm_messages = 0
+    aborted = False
+
+    logger.info(
+        f"Discovery: sampling {total} messages until every share is within "
+        f"±{cfg.P2_DISCOVERY_MARGIN:.1%} at {cfg.P2_DISCOVERY_CONFIDENCE:.0%} confidence"
+    )
+
+    while not est.converged(cfg.P2_DISCOVERY_MARGIN, cfg.P2_DISCOVERY_MIN_SAMPLE):
+        if sampled >= total:
+            break
+        rows = order[sampled:sampled + cfg.P2_DISCOVERY_ROUND]
+        sampled += len(rows)
+
+        need = list(dict.fromkeys(
+            cluster_of[row] for row in rows
+            if cluster_of[row] not in labels and cluster_of[row] not in failed
+        ))
+        if memo and need:
+            hashes = {k: message_hash(rep_messages[k]) for k in need}
+            found = memo.get_many(list(hashes.values()), tax_hash, model)
+            for k, h in hashes.items():
+                if h in found:
+                    labels[k] = {**found[h], "source": "memo"}
+            need = [k for k in need if k not in labels]
+
+        if need:
+            batches = plan_message_batches(
+                [rep_messages[k] for k in need], schema, provider, model, batch_size,
+            )
+
+            def classify_batch(batch_num: int) -> dict[int, dict]:
+                return classify_with_recovery(
+                    [rep_messages[need[pos]] for pos in batches[batch_num]], ask,
+                )
+
+            fresh = []
+            for batch_num, found in dispatch_ordered(
+                classify_batch, list(range(len(batches))), workers,
+            ):
+                for j, item in found.items():
+                    k = need[batches[batch_num][j]]
+                    labels[k] = {
+                        "category": item.get("category", ""),
+                        "subcategory": item.get("subcategory", ""),
+                        "themes": item.get("themes", []),
+                        "new_category": item.get("new_category"),
+                        "source": "llm",
+                    }
+                    fresh.append(k)
+            failed.update(k for k in need if k not in labels)
+            llm_messages += len(need)
+            if memo and fresh:
+                memo.put_many(
+                    [(message_hash(rep_messages[k]), labels[k]) for k in fresh],
+                    tax_hash, provider, model,
+                )
+            if not fresh:
+                logger.error(
+                    f"Discovery: no message in a round of {len(need)} was classified — "
+                    f"stopping with {est.n} sampled"
+                )
+                aborted = True
+                break
+
+        # Rows whose cluster could not be classified stay out of the sample
+        for row in rows:
+            label = labels.get(cluster_of[row])
+            if label is None:
+                continue
+            results.append({"batch": None, "row": row, **label})
+            est.add(label["category"], _candidate_of(label))
+
+        logger.info(
+            f"  Discovery: {est.n}/{total} sampled, "
+            f"widest interval ±{est.half_width():.2%}"
+        )
+
+    candidates_dict = est.candidate_counts()
+    report = {
+        **est.report(),
+        "margin": cfg.P2_DISCOVERY_MARGIN,
+        "min_sample": cfg.P2_DISCOVERY_MIN_SAMPLE,
+        "converged": not aborted and est.converged(
+            cfg.P2_DISCOVERY_MARGIN, cfg.P2_DISCOVERY_MIN_SAMPLE,
+        ),
+        "unclassified": sampled - est.n,
+        "llm_messages": llm_messages,
+    }
+
+    logger.info(
+        f"Phase 2 discovery complete: {est.n} of {total} messages used "
+        f"({report['sampled_fraction']:.1%}), widest interval "
+        f"±{report['max_half_width']:.2%} at {est.confidence:.0%} confidence"
+    )
+    if aborted:
+        ctx.degraded.append(f"Phase 2: discovery stopped early with {est.n} messages sampled")
+    if not report["converged"]:
+        logger.warning("  Estimates did not converge — intervals are wider than P2_DISCOVERY_MARGIN")
+    logger.info(f"  Provider: {provider} ({model}), {llm_messages} messages sent to the LLM")
+    logger.info(f"  Candidate new categories: {len(candidates_dict)}")
+    for name, ci in list(report["candidates"].items())[:10]:
+        logger.info(f"    ~{ci['count']:5d}x  {name}  ({ci['count_ci'][0]}–{ci['count_ci'][1]})")
+
+    if cfg.SAVE_INTERMEDIATE:
+        output = {
+            "metadata": {
+                "phase": 2,
+                "mode": "discovery",
+                "total_messages": total,
+                "total_classified": len(results),
+                "dedup": cfg.P2_DEDUP,
+                "clusters": len(members),
+                "discovery": report,
+                "provider": provider,
+                "model": model,
+            },
+            "classifications": results,
+            "candidate_categories": candidates_dict,
+        }
+        save_json(output, ctx.output_dir / "phase_2_results.json", "Phase 2 discovery results")
+
+    return results, candidates_dict
+
+
 def run(
     taxonomy: dict = None,
     batch_size: int = None,
     resume: bool = True,
     provider: str = None,
     model: str = None,
+    use_cache: bool = True,
+    cascade: bool = None,
+    discovery: bool = None,
+    ctx: PipelineContext = None,
 ) -> tuple[list[dict], dict[str, int]]:
     """
     Execute Phase 2: classify all messages with local SLM or cloud API.
 
     Args:
         taxonomy:   Phase 1 taxonomy dict (loaded from file if None)
-        batch_size: Override config P2_BATCH_SIZE
+        batch_size: Fixed rows per batch. If None, batches are token-packed
+                    (P2_BATCH_PLANNER) or fall back to P2_BATCH_SIZE.
         resume:     If True, resume from last checkpoint
         provider:   LLM provider for classification ("ollama", "groq", "google", "anthropic")
                     Defaults to "ollama" for backward compatibility.
         model:      Model name override. Defaults per provider.
+        use_cache:  If False, bypass the LLM response cache
+        cascade:    Label with the local classifier first and only send
+                    low-confidence messages to the LLM (default P2_CASCADE)
+        discovery:  Classify a random sample only, until candidate and
+                    category shares converge (default P2_DISCOVERY).
+                    Candidate counts are estimates for the whole upload.
+        ctx:        Data path, output dir, checkpoint journal and token
+                    tracker for this run (default: PipelineContext.default())
 
     Returns:
         (all_classifications, candidate_new_categories)
     """
-    batch_size = batch_size or cfg.P2_BATCH_SIZE
+    ctx = ctx or PipelineContext.default()
     provider = provider or "ollama"
     model = model or {
         "ollama": cfg.P2_MODEL,
@@ -206,7 +1068,7 @@ def run(
 
     # Load taxonomy if not provided
     if taxonomy is None:
-        tax_path = cfg.OUTPUT_DIR / "phase_1_taxonomy.json"
+        tax_path = ctx.output_dir / "phase_1_taxonomy.json"
         if tax_path.exists():
             phase_1 = load_json(tax_path)
             taxonomy = phase_1["taxonomy"]
@@ -226,87 +1088,178 @@ def run(
             )
             raise ConnectionError("Ollama not available")
         logger.info(f"Ollama connected, using model: {model}")
-
-        # Ollama handles smaller batches due to context window
-        if batch_size > 8:
-            logger.warning(f"Batch size {batch_size} may exceed Ollama context window, capping at 8")
-            batch_size = min(batch_size, 8)
     else:
         logger.info(f"Using API provider: {provider} (model={model})")
-        # API providers can handle larger batches
-        if batch_size < 10 and provider != "ollama":
-            batch_size = 10  # bump up for faster processing via API
-            logger.info(f"Increased batch size to {batch_size} for API provider")
 
     # Load data
-    df = load_awards()
     schema = build_taxonomy_schema(taxonomy)
-    total_messages = len(df)
-    total_batches = (total_messages + batch_size - 1) // batch_size
+    messages = load_messages(ctx.data_path)
+    total_messages = len(messages)
+
+    # Classify one representative per duplicate cluster; batch positions
+    # below index into representatives, not rows
+    representatives, members = collapse(messages)
+    if len(representatives) < total_messages:
+        logger.info(
+            f"Dedup ({cfg.P2_DEDUP}): {total_messages} messages → "
+            f"{len(representatives)} clusters "
+            f"({1 - len(representatives) / total_messages:.0%} fewer to classify)"
+        )
+    rep_messages = [messages[pos] for pos in representatives]
+
+    discovery = cfg.P2_DISCOVERY if discovery is None else discovery
+    if discovery:
+        return _run_discovery(
+            messages, rep_messages, members, taxonomy, schema,
+            provider, model, batch_size, use_cache, ctx,
+        )
+
+    # Messages already classified against this taxonomy by this model
+    memo = get_memo() if use_cache else None
+    tax_hash = taxonomy_hash(taxonomy)
+    rep_hashes = [message_hash(text) for text in rep_messages]
+    memo_hits: dict[int, dict] = {}
+    if memo:
+        found = memo.get_many(rep_hashes, tax_hash, model)
+        memo_hits = {k: found[h] for k, h in enumerate(rep_hashes) if h in found}
+        logger.info(
+            f"Memo: {len(memo_hits)} of {len(rep_messages)} messages already classified"
+        )
+    pending = [k for k in range(len(rep_messages)) if k not in memo_hits]
 
-    # Resume from checkpoint?
-    if resume:
-        all_results, candidates, start_batch = load_checkpoint()
+    # queue: representatives the LLM classifies. Batch positions below
+    # index into queue.
+    cascade = cfg.P2_CASCADE if cascade is None else cascade
+    local, audit, warm, clf = {}, {}, {}, None
+    if cascade:
+        queue, local, audit, warm, clf = _plan_cascade(
+            rep_messages, pending, taxonomy, schema, provider, model, batch_size, use_cache,
+            ctx.tracker,
+        )
+        if memo and warm:
+            # Memoized now, so a rerun or resume finds them as memo hits
+            memo.put_many([(rep_hashes[k], label) for k, label in warm.items()], tax_hash, provider, model)
+        logger.info(
+            f"Cascade: {len(local)} of {len(pending)} messages labelled locally, "
+            f"{len(warm)} by the warm-up LLM pass, "
+            f"{len(queue)} routed to the LLM ({len(audit)} of them audit checks)"
+        )
     else:
-        all_results, candidates, start_batch = [], defaultdict(int), 0
+        queue = pending
+
+    batches = plan_message_batches(
+        [rep_messages[k] for k in queue], schema, provider, model, batch_size,
+    )
+    total_batches = len(batches)
+    batch_sizes = [len(b) for b in batches]
+    local_rows = sum(len(members[k]) for k in (*local, *memo_hits, *warm))
+
+    # The journal is only valid for this exact split of messages into batches
+    plan_id = hashlib.sha256(
+        json.dumps([[queue[p] for p in b] for b in batches]).encode()
+    ).hexdigest()[:16]
+    journal = BatchJournal(ctx.journal_path, plan_id)
+    if not resume:
+        journal.remove()
 
-    start_idx = start_batch * batch_size
-    processed = start_idx
+    # Resume from checkpoint? Failed batches are retried.
+    all_results, candidates, done = journal.load()
+    todo = [b for b in range(total_batches) if b not in done]
+
+    # Rows that actually have a label (journalled results are LLM rows)
+    processed = local_rows + len(all_results)
     failures = 0
+    failed_batches = 0
     max_consecutive_failures = 5
+    aborted = False
+    workers = cfg.P2_WORKERS.get(provider, 1)
 
     logger.info(
         f"Processing {total_messages} messages in {total_batches} batches "
-        f"(size={batch_size}, provider={provider}, starting from batch {start_batch})"
+        f"(size={min(batch_sizes, default=0)}-{max(batch_sizes, default=0)}, "
+        f"provider={provider}, workers={workers}, {len(todo)} to go)"
     )
 
-    for batch_num in range(start_batch, total_batches):
-        i = batch_num * batch_size
-        batch_df = df.iloc[i : i + batch_size]
+    ask = _make_asker(schema, provider, model, use_cache, taxonomy_ids(taxonomy), ctx.tracker)
 
-        # Build batch items
-        batch_items = [
-            {"idx": j + 1, "text": row[cfg.COL_MESSAGE]}
-            for j, (_, row) in enumerate(batch_df.iterrows())
-        ]
+    def classify_batch(batch_num: int) -> dict[int, dict]:
+        # Recovery (re-ask / bisection) runs here, on the worker thread
+        return classify_with_recovery(
+            [rep_messages[queue[pos]] for pos in batches[batch_num]], ask,
+        )
+
+    if cfg.P2_QUEUE_PATH:
+        # Workers on other machines classify; results are merged here in
+        # the order they finish, each batch once (the journal skips done ones)
+        job_id = hashlib.sha256(json.dumps(
+            [tax_hash, provider, model, [[rep_messages[queue[p]] for p in b] for b in batches]],
+            ensure_ascii=False,
+        ).encode()).hexdigest()[:16]
+        logger.info(f"Distributed: queued as job {job_id} in {cfg.P2_QUEUE_PATH}")
+        wq = WorkQueue(cfg.P2_QUEUE_PATH)
+        finished = dispatch_queue(
+            wq, job_id,
+            {"taxonomy": taxonomy, "provider": provider, "model": model, "use_cache": use_cache},
+            {b: [rep_messages[queue[pos]] for pos in batches[b]] for b in todo},
+        )
+    else:
+        # Batches run concurrently but are committed in order, so failure
+        # counting and checkpoints behave exactly as in a sequential run
+        finished = dispatch_ordered(classify_batch, todo, workers)
 
-        # Call provider
-        prompt = build_batch_prompt(schema, batch_items)
-        response = _call_provider(prompt, provider, model)
+    for batch_num, found in finished:
+        positions = [queue[p] for p in batches[batch_num]]
 
-        # Handle failure
-        if response is None:
+        # Handle failure — not journalled, so a re-run retries the batch
+        if not found:
             failures += 1
+            failed_batches += 1
             logger.warning(f"Batch {batch_num + 1} failed ({failures} consecutive)")
             if failures >= max_consecutive_failures:
                 logger.error(
                     f"Aborting: {max_consecutive_failures} consecutive failures. "
                     f"Processed {processed}/{total_messages} messages before failure."
                 )
+                aborted = True
+                # Stop queued batches now, not when run() returns
+                finished.close()
                 break
-            processed += len(batch_df)
             continue
 
         failures = 0  # reset on success
+        if len(found) < len(positions):
+            logger.warning(
+                f"Batch {batch_num + 1}: {len(positions) - len(found)} of "
+                f"{len(positions)} messages left unclassified after recovery"
+            )
 
-        # Parse results
-        parsed = parse_batch_response(response, len(batch_items))
+        # Accumulate — fan each label out to its whole cluster so results
+        # and candidate counts reflect every row, not just representatives
+        batch_results = []
+        batch_candidates = defaultdict(int)
+        for j, item in sorted(found.items()):
+            rows = members[positions[j]]
+            for row in rows:
+                batch_results.append({
+                    "batch": batch_num,
+                    "row": row,
+                    "category": item.get("category", ""),
+                    "subcategory": item.get("subcategory", ""),
+                    "themes": item.get("themes", []),
+                    "new_category": item.get("new_category"),
+                    "source": "llm",
+                })
 
-        # Accumulate
-        for item in parsed:
-            all_results.append({
-                "batch": batch_num,
-                "category": item.get("category", ""),
-                "subcategory": item.get("subcategory", ""),
-                "themes": item.get("themes", []),
-                "new_category": item.get("new_category"),
-            })
+            new_cat = _candidate_of(item)
+            if new_cat:
+                batch_candidates[new_cat] += len(rows)
 
-            new_cat = item.get("new_category")
-            if new_cat and isinstance(new_cat, str) and new_cat.lower() != "null":
-                candidates[new_cat] += 1
+        all_results.extend(batch_results)
+        for name, n in batch_candidates.items():
+            candidates[name] += n
+        journal.append(batch_num, batch_results, batch_candidates)
 
-        processed += len(batch_df)
+        processed += len(batch_results)
 
         # Progress logging
         if (batch_num + 1) % 10 == 0 or batch_num == total_batches - 1:
@@ -316,14 +1269,79 @@ def run(
                 f"({processed}/{total_messages} messages, {pct:.0f}%)"
             )
 
-        # Checkpoint
-        if (batch_num + 1) % cfg.P2_CHECKPOINT_EVERY == 0:
-            save_checkpoint(all_results, candidates, batch_num + 1, processed)
+    # Memo hits and warm-up labels fan out like fresh LLM labels,
+    # candidates included
+    reused = [(k, label, "memo") for k, label in memo_hits.items()]
+    reused += [(k, label, "llm") for k, label in warm.items()]
+    for k, label, source in reused:
+        for row in members[k]:
+            all_results.append({
+                "batch": None,
+                "row": row,
+                **label,
+                "source": source,
+            })
+        new_cat = _candidate_of(label)
+        if new_cat:
+            candidates[new_cat] += len(members[k])
+
+    by_row = {r["row"]: r for r in all_results if r.get("source") == "llm"}
+    if memo:
+        memo.put_many(
+            [
+                (rep_hashes[k], by_row[representatives[k]])
+                for k in queue if representatives[k] in by_row
+            ],
+            tax_hash, provider, model,
+        )
+
+    cascade_stats = None
+    if cascade:
+        for k, (label, source) in local.items():
+            category, subcategory = split_label(label)
+            for row in members[k]:
+                all_results.append({
+                    "batch": None,
+                    "row": row,
+                    "category": category,
+                    "subcategory": subcategory,
+                    "themes": [],
+                    "new_category": None,
+                    "source": source,
+                })
+
+        cascade_stats = {
+            "threshold": cfg.P2_CASCADE_THRESHOLD,
+            "messages": len(pending),
+            "labelled_locally": len(local),
+            "warmup": len(warm),
+            "routed_to_llm": len(queue) + len(warm),
+            "routed_fraction": round((len(queue) + len(warm)) / len(pending), 3) if pending else 0,
+            **_cascade_agreement(audit, by_row, representatives),
+        }
+        logger.info(
+            f"Cascade: {cascade_stats['routed_fraction']:.0%} of messages routed to the LLM; "
+            f"agreement on {cascade_stats['audited']} audited: "
+            f"category={cascade_stats['category_agreement']}, "
+            f"subcategory={cascade_stats['subcategory_agreement']}"
+        )
+
+        # Learn from this run's LLM labels so the next run routes less
+        clf.add_examples(
+            [rep_messages[k] for k in queue],
+            [label_key(by_row[representatives[k]]) if representatives[k] in by_row else None
+             for k in queue],
+        )
+        clf.fit()
+        clf.save(model_path(taxonomy))
 
     # Final save
     candidates_dict = dict(candidates)
 
+    unclassified = total_messages - len({r["row"] for r in all_results})
     logger.info(f"Phase 2 complete: {processed} messages processed")
+    if unclassified:
+        logger.warning(f"  Unclassified: {unclassified} messages")
     logger.info(f"  Provider: {provider} ({model})")
     logger.info(f"  Classifications: {len(all_results)}")
     logger.info(f"  Candidate new categories: {len(candidates_dict)}")
@@ -339,20 +1357,51 @@ def run(
                 "phase": 2,
                 "total_messages": total_messages,
                 "total_classified": len(all_results),
-                "batch_size": batch_size,
+                "unclassified": unclassified,
+                "batch_size": batch_size or (
+                    round(len(queue) / total_batches, 1) if total_batches else 0
+                ),
+                "batch_planner": batch_size is None and cfg.P2_BATCH_PLANNER,
+                "total_batches": total_batches,
+                "dedup": cfg.P2_DEDUP,
+                "clusters": len(representatives),
+                "memo_hits": len(memo_hits),
+                "cascade": cascade_stats,
                 "provider": provider,
                 "model": model,
             },
             "classifications": all_results,
             "candidate_categories": candidates_dict,
         }
-        save_json(output, cfg.OUTPUT_DIR / "phase_2_results.json", "Phase 2 results")
+        save_json(output, ctx.output_dir / "phase_2_results.json", "Phase 2 results")
+        # Cluster map: members[k] are the row positions labelled from
+        # the message at representatives[k]
+        save_json(
+            {
+                "method": cfg.P2_DEDUP,
+                "threshold": cfg.P2_DEDUP_THRESHOLD if cfg.P2_DEDUP == "minhash" else None,
+                "total_messages": total_messages,
+                "clusters": [
+                    {"representative": rep, "members": rows}
+                    for rep, rows in zip(representatives, members)
+                    if len(rows) > 1
+                ],
+            },
+            ctx.output_dir / "phase_2_clusters.json",
+            "Phase 2 dedup clusters",
+        )
 
-    # Clean up checkpoint
-    checkpoint_path = cfg.P2_CHECKPOINT_DIR / "phase_2_checkpoint.json"
-    if checkpoint_path.exists():
-        checkpoint_path.unlink()
-        logger.info("Checkpoint cleaned up")
+    # Clean up checkpoint — kept after an abort or failed batches so a
+    # re-run retries the rest
+    if aborted or failed_batches:
+        ctx.degraded.append(
+            f"Phase 2: {'aborted after ' if aborted else ''}{failed_batches} failed batches"
+        )
+        journal.close()
+    else:
+        journal.remove()
+        if cfg.P2_QUEUE_PATH:
+            wq.delete_job(job_id)
 
     return all_results, candidates_dict
 
@@ -0,0 +1,149 @@
+"""
+phase_2_worker.py — Worker process for distributed Phase 2.
+
+Leases batches from the shared queue (work_queue.py), classifies them
+with this machine's Ollama (or API keys) and reports the results back.
+The lease is renewed in the background while a batch is being
+classified, so only a worker that has died or hung loses its batch.
+
+    python phase_2_worker.py --queue /mnt/shared/phase_2_queue.sqlite
+    python phase_2_worker.py --queue ... --ollama-url http://localhost:11434/api/generate --exit-when-idle
+
+Start Phase 2 itself with the same P2_QUEUE_PATH (run_pipeline.py --queue).
+It enqueues the batches and merges results as workers finish them.
+"""
+
+import argparse
+import os
+import socket
+import threading
+import time
+
+import config as cfg
+from phase_2_bulk import _make_asker, build_taxonomy_schema, classify_with_recovery, taxonomy_ids
+from utils import check_ollama, get_logger
+from work_queue import WorkQueue
+
+logger = get_logger("phase_2_worker")
+
+
+class _LeaseKeeper:
+    """Renews a lease every third of its length until stopped."""
+
+    def __init__(self, wq: WorkQueue, task: dict, worker_id: str, lease_seconds: float):
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(wq, task, worker_id, lease_seconds), daemon=True,
+        )
+        self._thread.start()
+
+    def _run(self, wq, task, worker_id, lease_seconds):
+        while not self._stop.wait(lease_seconds / 3):
+            if not wq.renew(task["job_id"], task["batch_num"], worker_id, lease_seconds):
+                logger.warning(f"Lost the lease on batch {task['batch_num'] + 1}")
+                return
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def _asker_for(spec: dict):
+    taxonomy = spec["taxonomy"]
+    return _make_asker(
+        build_taxonomy_schema(taxonomy), spec["provider"], spec["model"],
+        spec.get("use_cache", True), taxonomy_ids(taxonomy),
+    )
+
+
+def work(
+    wq: WorkQueue,
+    worker_id: str,
+    lease_seconds: float,
+    exit_when_idle: bool = False,
+) -> int:
+    """Process batches until interrupted (or the queue is empty). Returns batches completed."""
+    askers = {}
+    ollama_ok = set()
+    completed = 0
+
+    while True:
+        task = wq.lease(worker_id, lease_seconds)
+        if task is None:
+            if exit_when_idle:
+                break
+            time.sleep(cfg.P2_QUEUE_POLL_SECONDS)
+            continue
+
+        job_id, batch_num, spec = task["job_id"], task["batch_num"], task["spec"]
+
+        if spec["provider"] == "ollama" and spec["model"] not in ollama_ok:
+            status = check_ollama(spec["model"])
+            if not status.get("running") or not status.get("model_available"):
+                wq.release(job_id, batch_num, worker_id)
+                logger.error(
+                    f"Ollama not available at {cfg.P2_OLLAMA_URL} "
+                    f"(model {spec['model']}) — stopping this worker"
+                )
+                break
+            ollama_ok.add(spec["model"])
+
+        if job_id not in askers:
+            askers[job_id] = _asker_for(spec)
+
+        keeper = _LeaseKeeper(wq, task, worker_id, lease_seconds)
+        try:
+            found = classify_with_recovery(task["texts"], askers[job_id])
+        except KeyboardInterrupt:
+            keeper.stop()
+            wq.release(job_id, batch_num, worker_id)
+            raise
+        except Exception as e:
+            logger.error(f"Batch {batch_num + 1} of job {job_id} raised: {e}")
+            found = {}
+        keeper.stop()
+
+        if not found:
+            wq.fail(job_id, batch_num, worker_id)
+            logger.warning(f"Batch {batch_num + 1} of job {job_id} failed (attempt {task['attempts']})")
+        elif wq.complete(job_id, batch_num, worker_id, found):
+            completed += 1
+            logger.info(
+                f"Batch {batch_num + 1} of job {job_id}: "
+                f"{len(found)}/{len(task['texts'])} classified"
+            )
+        else:
+            logger.warning(f"Batch {batch_num + 1} of job {job_id}: lease lost, result discarded")
+
+    return completed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify Phase 2 batches from a shared queue")
+    parser.add_argument("--queue", default=None, help="Queue file on shared disk (default P2_QUEUE_PATH)")
+    parser.add_argument("--worker-id", default=None, help="Name for this worker (default host:pid)")
+    parser.add_argument("--ollama-url", default=None, help="This machine's Ollama generate endpoint")
+    parser.add_argument("--lease", type=float, default=None, help="Lease length in seconds")
+    parser.add_argument("--exit-when-idle", action="store_true", help="Exit once no batch is waiting")
+    args = parser.parse_args()
+
+    path = args.queue or cfg.P2_QUEUE_PATH
+    if not path:
+        parser.error("no queue file: pass --queue or set P2_QUEUE_PATH")
+    if args.ollama_url:
+        cfg.P2_OLLAMA_URL = args.ollama_url
+
+    worker_id = args.worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    lease_seconds = args.lease or cfg.P2_QUEUE_LEASE_SECONDS
+    logger.info(f"Worker {worker_id} polling {path} (lease {lease_seconds:.0f}s)")
+
+    try:
+        n = work(WorkQueue(path), worker_id, lease_seconds, args.exit_when_idle)
+    except KeyboardInterrupt:
+        logger.info("Interrupted — current batch returned to the queue")
+        return
+    logger.info(f"Worker {worker_id} done: {n} batches completed")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,10 +9,17 @@ Cost:   ~5-10K tokens (lightweight review task)
 import json
 
 import config as cfg
+from context import PipelineContext
 from utils import call_llm, extract_json, save_json, load_json, get_logger
 
 logger = get_logger("phase_3")
 
+# Every config.py setting that changes the final taxonomy (the DAG fingerprint)
+OUTPUT_CONFIG = [
+    "LLM_PROVIDER_PRIORITY", "P3_MODELS", "P3_MAX_TOKENS", "P3_MAX_MAIN_CATEGORIES",
+    "P3_MAX_SUBCATEGORIES", "P3_MIN_CANDIDATE_FREQ",
+]
+
 
 def filter_candidates(
     candidates: dict[str, int],
@@ -137,6 +144,8 @@ def validate_taxonomy(taxonomy: dict) -> bool:
 def run(
     taxonomy: dict = None,
     candidates: dict[str, int] = None,
+    use_cache: bool = True,
+    ctx: PipelineContext = None,
 ) -> dict:
     """
     Execute Phase 3: merge candidates into final taxonomy.
@@ -144,18 +153,23 @@ def run(
     Args:
         taxonomy:   Phase 1 taxonomy (loaded from file if None)
         candidates: Phase 2 candidate categories (loaded from file if None)
+        use_cache:  If False, bypass the LLM response cache
+        ctx:        Output dir and token tracker for this run
+                    (default: PipelineContext.default())
 
     Returns:
         Final result dict with taxonomy, changes, and summary
     """
+    ctx = ctx or PipelineContext.default()
+
     # Load inputs if not provided
     if taxonomy is None:
-        phase_1 = load_json(cfg.OUTPUT_DIR / "phase_1_taxonomy.json")
+        phase_1 = load_json(ctx.output_dir / "phase_1_taxonomy.json")
         taxonomy = phase_1["taxonomy"]
         logger.info("Loaded Phase 1 taxonomy from file")
 
     if candidates is None:
-        phase_2 = load_json(cfg.OUTPUT_DIR / "phase_2_results.json")
+        phase_2 = load_json(ctx.output_dir / "phase_2_results.json")
         candidates = phase_2.get("candidate_categories", {})
         logger.info(f"Loaded {len(candidates)} candidates from Phase 2")
 
@@ -179,6 +193,9 @@ def run(
             prompt=prompt,
             models=cfg.P3_MODELS,
             max_tokens=cfg.P3_MAX_TOKENS,
+            namespace="phase_3",
+            use_cache=use_cache,
+            tracker=ctx.tracker,
         )
 
         try:
@@ -186,6 +203,7 @@ def run(
         except ValueError as e:
             logger.error(f"Failed to parse Claude response: {e}")
             logger.warning("Using Phase 1 taxonomy as final")
+            ctx.degraded.append("Phase 3: unparseable LLM response, kept the Phase 1 taxonomy")
             final = {
                 "final_taxonomy": taxonomy,
                 "changes": [],
@@ -227,12 +245,12 @@ def run(
             "candidates_submitted": significant,
             "result": final,
         }
-        save_json(output, cfg.OUTPUT_DIR / "phase_3_final.json", "Phase 3 final")
+        save_json(output, ctx.output_dir / "phase_3_final.json", "Phase 3 final")
 
     # Also save a clean standalone taxonomy file
     save_json(
         final_tax,
-        cfg.OUTPUT_DIR / "final_taxonomy.json",
+        ctx.output_dir / "final_taxonomy.json",
         "Final taxonomy (standalone)",
     )
 
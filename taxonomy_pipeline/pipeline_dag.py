@@ -0,0 +1,307 @@
+"""
+pipeline_dag.py — Run pipeline phases as a DAG with memoized artifacts.
+
+Each node declares what its output depends on:
+
+    - the awards CSV (content hash), if it reads the data
+    - its upstream artifacts (content hash, e.g. the Phase 1 taxonomy)
+    - a slice of config.py
+    - its prompt templates (source hash of the prompt builders)
+
+The fingerprint of those inputs names the artifact:
+ARTIFACT_DIR/<node>/<fingerprint>.json. If that file exists, the node is
+skipped and the artifact is loaded. So an unchanged phase never runs
+twice, a job that failed in Phase 3 resumes from the Phase 2 artifact,
+and runs that share inputs (e.g. the same Phase 1) share artifacts.
+
+Files a node writes to the run directory (Node.files, e.g.
+phase_2_results.json) are copied to ARTIFACT_DIR/<node>/<fingerprint>.files/
+when it is stored, and copied back into the run directory whenever the
+artifact is reused. So a run that loads every phase still has the same
+files as one that ran them.
+
+Upstream artifacts are hashed by content, not by fingerprint. If Phase 1
+re-runs and returns the same taxonomy, Phase 2 is still a hit.
+
+Nodes whose dependencies are met run concurrently (e.g. the EDA report
+alongside Phase 1).
+
+A node whose output is a fallback or partial (Phase 1's default
+taxonomy, an aborted Phase 2) returns it wrapped in Degraded. Dependents
+still get it, but neither it nor anything built on it is stored, so the
+next run tries again instead of treating the fallback as the answer for
+those inputs.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+import config as cfg
+from utils import get_logger
+
+logger = get_logger("dag")
+
+
+@dataclass
+class Node:
+    """
+    name:     artifact name; also how dependents refer to it
+    fn:       fn(inputs) → JSON-serializable artifact (or Degraded), where
+              inputs maps each dependency name to its artifact
+    deps:     upstream node names
+    config:   config.py attribute names whose values affect the output
+    data:     True if the node reads the awards CSV
+    prompts:  functions whose source is part of the fingerprint (prompt
+              builders, response parsers), or template strings hashed
+              as-is, so editing a template invalidates the artifact
+    cacheable: False to always run (e.g. unseeded random sampling)
+    files:    names of files the node writes in the run's output directory,
+              kept with the artifact and restored when it is reused
+              (those it didn't write, e.g. with SAVE_INTERMEDIATE off,
+              are skipped)
+    """
+    name: str
+    fn: Callable[[dict], dict]
+    deps: list[str] = field(default_factory=list)
+    config: list[str] = field(default_factory=list)
+    data: bool = False
+    prompts: list[Callable | str] = field(default_factory=list)
+    cacheable: bool = True
+    files: list[str] = field(default_factory=list)
+
+
+@dataclass
+class Degraded:
+    """A node's output that must not be stored (reason says why)."""
+    artifact: dict
+    reason: str
+
+
+def _digest(obj) -> str:
+    blob = json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+_data_hashes: dict[tuple, str] = {}
+
+
+def data_hash(path: Path = None) -> str:
+    """Content hash of the awards CSV (memoized per path/size/mtime)."""
+    path = Path(path or cfg.AWARDS_CSV)
+    stat = path.stat()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _data_hashes:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        _data_hashes[key] = h.hexdigest()
+    return _data_hashes[key]
+
+
+def _source_hash(fn: Callable | str) -> str:
+    if isinstance(fn, str):
+        return hashlib.sha256(fn.encode("utf-8")).hexdigest()
+    try:
+        source = inspect.getsource(fn)
+    except (OSError, TypeError):
+        # No source on disk (e.g. frozen builds): fall back to the bytecode
+        source = repr((fn.__code__.co_code, fn.__code__.co_consts))
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def fingerprint(node: Node, upstream: dict[str, str]) -> str:
+    """Hash of everything the node's output depends on (upstream: dep → content hash)."""
+    return _digest({
+        "node": node.name,
+        "data": data_hash() if node.data else None,
+        "inputs": {dep: upstream[dep] for dep in node.deps},
+        "config": {key: getattr(cfg, key, None) for key in node.config},
+        "prompts": [_source_hash(fn) for fn in node.prompts],
+    })[:16]
+
+
+def _artifact_path(node: Node, fp: str) -> Path:
+    return Path(cfg.ARTIFACT_DIR) / node.name / f"{fp}.json"
+
+
+def _files_dir(path: Path) -> Path:
+    return path.with_suffix(".files")
+
+
+def _copy(src: Path, dst: Path) -> None:
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(f"{dst.name}.{os.getpid()}.tmp")
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def _load(path: Path, output_dir: Path) -> dict | None:
+    """The stored artifact, after restoring its files into output_dir."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        artifact, files = stored["artifact"], stored["files"]
+    except (OSError, ValueError, KeyError):
+        # Includes artifacts stored before run-directory files were kept
+        return None
+    try:
+        for name in files:
+            _copy(_files_dir(path) / name, output_dir / name)
+    except OSError:
+        return None
+    return artifact
+
+
+def _store(path: Path, node: Node, fp: str, artifact: dict, elapsed: float, output_dir: Path) -> None:
+    """Write atomically so a crash never leaves a half-written artifact."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Files first: an artifact on disk implies its files are there too.
+    # Only those written by this run (not left over from an earlier one).
+    started = time.time() - elapsed - 1
+    files = [
+        name for name in node.files
+        if (output_dir / name).is_file() and (output_dir / name).stat().st_mtime >= started
+    ]
+    for name in files:
+        _copy(output_dir / name, _files_dir(path) / name)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "node": node.name,
+                "fingerprint": fp,
+                "created_at": time.time(),
+                "elapsed_seconds": round(elapsed, 1),
+                "files": files,
+                "artifact": artifact,
+            },
+            f,
+            ensure_ascii=False,
+            default=str,
+        )
+    os.replace(tmp, path)
+
+
+def run_dag(
+    nodes: list[Node],
+    targets: list[str] = None,
+    force: bool = False,
+    workers: int = None,
+    output_dir: Path = None,
+) -> dict:
+    """
+    Run the nodes needed for targets (default: all) and return
+    {"artifacts": {name: artifact}, "status": {name: "cached" | "ran" |
+    "degraded" | "failed" | "skipped"}, "fingerprints": {...},
+    "errors": {...}, "degraded": {name: reason}}.
+
+    output_dir (default cfg.OUTPUT_DIR) is where nodes write their files.
+    force=True re-runs every node (still storing fresh artifacts). A
+    failing node marks its dependents "skipped"; everything upstream
+    stays stored, so the next run resumes from there. A degraded node's
+    artifact is passed on but not stored, and its dependents are
+    degraded too.
+    """
+    by_name = {node.name: node for node in nodes}
+    output_dir = Path(output_dir or cfg.OUTPUT_DIR)
+
+    # Only what the targets need
+    needed: set[str] = set()
+    stack = list(targets or by_name)
+    while stack:
+        name = stack.pop()
+        if name not in needed:
+            needed.add(name)
+            stack.extend(by_name[name].deps)
+
+    artifacts: dict[str, dict] = {}
+    hashes: dict[str, str] = {}
+    fingerprints: dict[str, str] = {}
+    status: dict[str, str] = {}
+    errors: dict[str, str] = {}
+    degraded: dict[str, str] = {}
+
+    def execute(node: Node) -> tuple[str, dict, float]:
+        inputs = {dep: artifacts[dep] for dep in node.deps}
+        start = time.perf_counter()
+        return "ran", node.fn(inputs), time.perf_counter() - start
+
+    pending = {name for name in needed}
+    running = {}                                   # future → (node, fp, path)
+    active: set[str] = set()                       # names of running nodes
+    pool = ThreadPoolExecutor(max_workers=workers or cfg.DAG_WORKERS, thread_name_prefix="dag")
+    try:
+        while pending or running:
+            # Start (or resolve from cache) every node whose deps are done
+            for name in sorted(pending):
+                node = by_name[name]
+                if any(dep in pending or dep in active for dep in node.deps):
+                    continue
+                pending.discard(name)
+                if any(status.get(dep) in ("failed", "skipped") for dep in node.deps):
+                    status[name] = "skipped"
+                    logger.warning(f"[{name}] skipped — an upstream node failed")
+                    continue
+
+                fp = fingerprint(node, hashes)
+                fingerprints[name] = fp
+                path = _artifact_path(node, fp)
+                # Built on a degraded input: run again and don't store either
+                tainted = [dep for dep in node.deps if dep in degraded]
+                if tainted:
+                    degraded[name] = f"upstream {', '.join(tainted)} degraded"
+                cached = None if force or not node.cacheable or tainted else _load(path, output_dir)
+                if cached is not None:
+                    artifacts[name] = cached
+                    hashes[name] = _digest(cached)
+                    status[name] = "cached"
+                    logger.info(f"[{name}] unchanged — using artifact {fp}")
+                    continue
+
+                logger.info(f"[{name}] running (fingerprint {fp})")
+                running[pool.submit(execute, node)] = (node, fp, path)
+                active.add(name)
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                node, fp, path = running.pop(future)
+                active.discard(node.name)
+                try:
+                    status[node.name], artifact, elapsed = future.result()
+                except Exception as e:
+                    status[node.name] = "failed"
+                    errors[node.name] = f"{type(e).__name__}: {e}"
+                    logger.error(f"[{node.name}] failed: {e}")
+                    continue
+                if isinstance(artifact, Degraded):
+                    degraded[node.name] = artifact.reason
+                    artifact = artifact.artifact
+                if node.name in degraded:
+                    status[node.name] = "degraded"
+                    logger.warning(f"[{node.name}] degraded, not stored: {degraded[node.name]}")
+                artifacts[node.name] = artifact
+                hashes[node.name] = _digest(artifact)
+                if node.cacheable and node.name not in degraded:
+                    _store(path, node, fp, artifact, elapsed, output_dir)
+                logger.info(f"[{node.name}] done in {elapsed:.1f}s")
+    finally:
+        pool.shutdown(wait=True)
+
+    return {
+        "artifacts": artifacts,
+        "status": status,
+        "fingerprints": fingerprints,
+        "errors": errors,
+        "degraded": degraded,
+    }
@@ -0,0 +1,171 @@
+"""
+provider_health.py — Per-provider circuit breakers and live health stats.
+
+call_llm consults the breaker before each provider. A provider whose
+recent error rate crosses LLM_BREAKER_ERROR_RATE (or that fails with a
+billing/auth error) is opened and skipped for LLM_BREAKER_COOLDOWN
+seconds; after that one probe call is let through (half-open). A
+successful probe closes the breaker, a failed one re-opens it with a
+doubled cooldown.
+
+State is process-wide, so every pipeline thread in api.py shares it, and
+snapshot() is what GET /api/providers/health returns.
+"""
+
+import threading
+import time
+from collections import deque
+
+import config as cfg
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Errors that will not fix themselves within a job — trip immediately
+_FATAL_KEYWORDS = (
+    "credit", "balance", "billing",
+    "unauthorized", "authentication", "401", "403",
+)
+
+
+def _percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    s = sorted(values)
+    return s[int(p * (len(s) - 1))]
+
+
+class CircuitBreaker:
+    """Rolling outcome window + closed/open/half-open state for one provider."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self._outcomes: deque = deque(maxlen=cfg.LLM_BREAKER_WINDOW)
+        self._latencies: deque = deque(maxlen=cfg.LLM_BREAKER_WINDOW)
+        self._lock = threading.Lock()
+        self._opened_at = 0.0
+        self._cooldown = cfg.LLM_BREAKER_COOLDOWN
+        self._probe_started = 0.0
+        self.last_error: str | None = None
+        self.open_reason: str | None = None
+
+    def allow(self) -> bool:
+        """True if a call may be sent now. Moves open → half-open after cooldown."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.time()
+            if self.state == OPEN and now - self._opened_at >= self._cooldown:
+                self.state = HALF_OPEN
+                self._probe_started = 0.0
+            # One probe at a time; a probe that never reported back goes stale
+            if self.state == HALF_OPEN and now - self._probe_started > cfg.HTTP_TIMEOUT:
+                self._probe_started = now
+                return True
+            return False
+
+    def ready(self) -> bool:
+        """Would allow() let a call through now? Unlike allow(), claims no probe."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.time()
+            if self.state == OPEN:
+                return now - self._opened_at >= self._cooldown
+            return now - self._probe_started > cfg.HTTP_TIMEOUT
+
+    def release_probe(self) -> None:
+        """
+        Give back a probe claimed with allow() that ended without an
+        outcome (cancelled, or never sent), so the next caller may probe
+        now instead of after the stale-probe timeout.
+        """
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_started = 0.0
+
+    def record_success(self, latency: float) -> None:
+        with self._lock:
+            self._outcomes.append(True)
+            self._latencies.append(latency)
+            if self.state != CLOSED:
+                self.state = CLOSED
+                self._cooldown = cfg.LLM_BREAKER_COOLDOWN
+                self.open_reason = None
+
+    def record_failure(self, error: Exception) -> None:
+        message = str(error)
+        with self._lock:
+            self._outcomes.append(False)
+            self.last_error = message[:300]
+
+            if self.state == HALF_OPEN:
+                self._cooldown = min(self._cooldown * 2, cfg.LLM_BREAKER_MAX_COOLDOWN)
+                self._trip("probe failed")
+                return
+
+            fatal = any(kw in message.lower() for kw in _FATAL_KEYWORDS)
+            if fatal:
+                self._trip(f"fatal error: {message[:120]}")
+            elif (
+                len(self._outcomes) >= cfg.LLM_BREAKER_MIN_CALLS
+                and self._error_rate() >= cfg.LLM_BREAKER_ERROR_RATE
+            ):
+                self._trip(f"error rate {self._error_rate():.0%}")
+
+    def _trip(self, reason: str) -> None:
+        self.state = OPEN
+        self._opened_at = time.time()
+        self.open_reason = reason
+
+    def _error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for ok in self._outcomes if not ok) / len(self._outcomes)
+
+    def sample_count(self) -> int:
+        with self._lock:
+            return len(self._latencies)
+
+    def p95_latency(self) -> float | None:
+        with self._lock:
+            return _percentile(list(self._latencies), 0.95)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = list(self._latencies)
+            retry_at = None
+            if self.state == OPEN:
+                retry_at = round(self._opened_at + self._cooldown, 1)
+            return {
+                "state": self.state,
+                "reason": self.open_reason,
+                "calls_in_window": len(self._outcomes),
+                "error_rate": round(self._error_rate(), 3),
+                "latency_p50_s": _percentile(latencies, 0.5),
+                "latency_p95_s": _percentile(latencies, 0.95),
+                "last_error": self.last_error,
+                "retry_at": retry_at,
+            }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = CircuitBreaker(provider)
+            _breakers[provider] = breaker
+    return breaker
+
+
+def snapshot() -> dict:
+    """Health of every provider seen so far in this process."""
+    with _breakers_lock:
+        names = list(_breakers)
+    return {name: get_breaker(name).snapshot() for name in names}
@@ -0,0 +1,209 @@
+"""
+rate_limiter.py — Process-wide token-bucket limits per provider/model.
+
+Every cloud LLM call acquires from its (provider, model) limiter before
+sending, so concurrent pipeline jobs sharing one API key stay inside
+the quota instead of discovering it through 429s. Limits live in the
+"rate_limits" section of model_registry.json:
+
+    "rate_limits": {
+      "groq": {
+        "llama-3.3-70b-versatile": {"rpm": 30, "tpm": 12000, "rpd": 1000}
+      }
+    }
+
+rpm/tpm are refilled continuously; rpd is a hard cap that resets at UTC
+midnight. A null (or missing) value means unlimited. A "default" entry
+under a provider applies to models not listed explicitly.
+
+All limiters are used from the transport loop (see transport.py), which
+is shared by every thread in the process.
+"""
+
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import config as cfg
+
+
+class QuotaExceededError(RuntimeError):
+    """Daily request cap reached. Message contains "quota" so call_llm falls back."""
+
+
+class _Bucket:
+    """Continuous-refill token bucket sized for one minute of budget."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        """Refund (delta > 0) or charge extra (delta < 0) after the fact."""
+        self.level = min(self.capacity, self.level + delta)
+
+
+class RateLimiter:
+    """
+    RPM + TPM buckets and a daily request cap for one provider/model.
+
+    Usage (inside a coroutine):
+        limiter = get_limiter("groq", model)
+        await limiter.acquire(estimated_tokens)
+        ... send request ...
+        limiter.settle(estimated_tokens, actual_tokens)
+        # or, if the request was refused or never answered:
+        limiter.refund(estimated_tokens)
+    """
+
+    def __init__(self, name: str, rpm: int = None, tpm: int = None, rpd: int = None):
+        self.name = name
+        self.rpm = _Bucket(rpm) if rpm else None
+        self.tpm = _Bucket(tpm) if tpm else None
+        self.rpd = rpd
+        self._lock = asyncio.Lock()
+        self._blocked_until = 0.0
+        self._day = None
+        self._requests_today = 0
+
+    def _roll_day(self) -> None:
+        today = datetime.now(timezone.utc).date()
+        if today != self._day:
+            self._day = today
+            self._requests_today = 0
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """Wait until one request of ~tokens fits in every bucket, then take it."""
+        async with self._lock:
+            while True:
+                self._roll_day()
+                if self.rpd and self._requests_today >= self.rpd:
+                    raise QuotaExceededError(
+                        f"{self.name}: daily request quota of {self.rpd} reached"
+                    )
+
+                now = time.monotonic()
+                wait = self._blocked_until - now
+                if self.rpm:
+                    wait = max(wait, self.rpm.wait_time(1, now))
+                if self.tpm:
+                    wait = max(wait, self.tpm.wait_time(tokens, now))
+
+                if wait <= 0:
+                    if self.rpm:
+                        self.rpm.take(1)
+                    if self.tpm:
+                        self.tpm.take(tokens)
+                    self._requests_today += 1
+                    return
+
+                await asyncio.sleep(wait)
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """Correct the TPM bucket once real usage is known."""
+        if self.tpm and actual:
+            self.tpm.adjust(estimated - actual)
+
+    def refund(self, estimated: int) -> None:
+        """Give back a reservation that consumed no tokens (429, error, no response)."""
+        if self.tpm and estimated:
+            self.tpm.adjust(estimated)
+
+    def penalize(self, seconds: float) -> None:
+        """Block every caller of this limiter for `seconds` (e.g. Retry-After)."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with equal jitter: base * 2^attempt, halved ± random."""
+    ceiling = min(cfg.LLM_BACKOFF_MAX, cfg.LLM_RETRY_DELAY * (2 ** attempt))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+def retry_after_seconds(response) -> float | None:
+    """
+    Server-requested wait from a 429/503 response, if any.
+
+    Reads the standard Retry-After header (seconds or HTTP date), then
+    Gemini's RetryInfo "retryDelay": "30s" in the error body.
+    """
+    header = response.headers.get("retry-after")
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                when = parsedate_to_datetime(header)
+                return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+
+    try:
+        details = response.json().get("error", {}).get("details", [])
+    except ValueError:
+        return None
+    for d in details:
+        m = re.match(r"^([\d.]+)s$", str(d.get("retryDelay", "")))
+        if m:
+            return float(m.group(1))
+    return None
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Cheap ~4-chars-per-token estimate used for TPM reservations."""
+    return sum(len(t) for t in texts if t) // 4
+
+
+_limiters: dict[tuple[str, str], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+_limits_config: dict | None = None
+
+
+def _load_limits() -> dict:
+    global _limits_config
+    if _limits_config is None:
+        with open(cfg.MODEL_REGISTRY_PATH) as f:
+            _limits_config = json.load(f).get("rate_limits", {})
+    return _limits_config
+
+
+def get_limiter(provider: str, model: str) -> RateLimiter:
+    """
+    Shared limiter for a registry provider name ("google", "groq",
+    "anthropic") and model.
+    """
+    key = (provider, model)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            by_model = _load_limits().get(provider, {})
+            limits = by_model.get(model) or by_model.get("default") or {}
+            limiter = RateLimiter(
+                name=f"{provider}/{model}",
+                rpm=limits.get("rpm"),
+                tpm=limits.get("tpm"),
+                rpd=limits.get("rpd"),
+            )
+            _limiters[key] = limiter
+    return limiter
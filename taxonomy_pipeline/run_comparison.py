@@ -1,8 +1,11 @@
+import json
 import subprocess
 import sys
 import time
 from pathlib import Path
 
+import config as cfg
+
 # ── Pipeline configurations to compare ──
 # Each entry produces a separate run in outputs/runs/<name>/
 
@@ -21,84 +24,235 @@ RUNS = [
     },
 ]
 
+# Runs in flight per provider. A run holds a slot for its LLM provider and,
+# unless it skips Phase 2, one for the local Ollama.
+PROVIDER_SLOTS = {"claude": 2, "gemini": 2, "groq": 1, "ollama": 1}
+
 PIPELINE_SCRIPT = Path(__file__).parent / "run_pipeline.py"
+RUNS_DIR = cfg.PROJECT_ROOT / "outputs" / "runs"
 
 
-def build_command(run_config: dict) -> list[str]:
+def build_command(run_config: dict, no_cache: bool = False, phase: int = None) -> list[str]:
     """Build the CLI command for a single pipeline run."""
     cmd = [
         sys.executable, str(PIPELINE_SCRIPT),
         "--run-name", run_config["name"],
         "--provider", run_config["provider"],
     ]
+    if phase:
+        cmd += ["--phase", str(phase)]
     if run_config.get("skip_phase2"):
         cmd.append("--skip-phase2")
+    if no_cache:
+        cmd.append("--no-cache")
     return cmd
 
 
+def plan_jobs(runs: list[dict], no_cache: bool = False) -> list[dict]:
+    """
+    One job per run, plus one shared Phase 1 job per provider used by
+    more than one run. The shared job stores the Phase 1 artifact first,
+    so the runs that wait on it load it instead of calling the LLM again.
+
+    Sharing needs a seeded Phase 1 that may be read from the artifact
+    store, so it is off with --no-cache, LLM_CACHE_ENABLED = False or
+    P1_RANDOM_STATE = None.
+    """
+    share = not no_cache and cfg.LLM_CACHE_ENABLED and cfg.P1_RANDOM_STATE is not None
+    groups: dict[str, list[dict]] = {}
+    for run in runs:
+        groups.setdefault(run["provider"], []).append(run)
+
+    jobs = []
+    for provider, members in groups.items():
+        prefix = None
+        if share and len(members) > 1:
+            prefix = f"phase_1:{provider}"
+            jobs.append({
+                "name": prefix,
+                "description": f"Shared Phase 1 for {', '.join(r['name'] for r in members)}",
+                # Written to the first member's folder; it loads the same artifact
+                "cmd": build_command(members[0], phase=1),
+                "run_dir": RUNS_DIR / members[0]["name"],
+                "summary": "phase_1_summary.json",
+                "providers": {provider},
+                "after": [],
+                "shared_by": [r["name"] for r in members],
+            })
+        for run in members:
+            jobs.append({
+                "name": run["name"],
+                "description": run["description"],
+                "cmd": build_command(run, no_cache=no_cache),
+                "run_dir": RUNS_DIR / run["name"],
+                "summary": "pipeline_summary.json",
+                "providers": {provider} if run.get("skip_phase2") else {provider, "ollama"},
+                "after": [prefix] if prefix else [],
+            })
+    return jobs
+
+
+def run_jobs(jobs: list[dict], slots: dict = None, max_parallel: int = None) -> dict[str, dict]:
+    """
+    Start every job whose prerequisites are done and whose providers have
+    a free slot; repeat as jobs finish. Output of each job goes to
+    <run_dir>/<job>.log. Returns {job name: {"status", "time"}}.
+
+    A job still starts if a prerequisite failed — a failed shared Phase 1
+    only means the runs compute their own.
+    """
+    slots = {**PROVIDER_SLOTS, **(slots or {})}
+    in_use = {provider: 0 for provider in slots}
+    pending = list(jobs)
+    running: dict[str, tuple] = {}       # name → (job, process, log file, start)
+    results: dict[str, dict] = {}
+
+    while pending or running:
+        for job in list(pending):
+            if max_parallel and len(running) >= max_parallel:
+                break
+            if any(dep not in results for dep in job["after"]):
+                continue
+            if any(in_use.get(p, 0) >= slots.get(p, 1) for p in job["providers"]):
+                continue
+            pending.remove(job)
+            for p in job["providers"]:
+                in_use[p] = in_use.get(p, 0) + 1
+            job["run_dir"].mkdir(parents=True, exist_ok=True)
+            # A stale summary would be read as this run's usage if it fails
+            (job["run_dir"] / job["summary"]).unlink(missing_ok=True)
+            log = open(job["run_dir"] / f"{job['name'].replace(':', '_')}.log", "w", encoding="utf-8")
+            proc = subprocess.Popen(
+                job["cmd"], cwd=str(PIPELINE_SCRIPT.parent), stdout=log, stderr=subprocess.STDOUT,
+            )
+            running[job["name"]] = (job, proc, log, time.time())
+            print(f"  ▶ {job['name']} started ({', '.join(sorted(job['providers']))})")
+
+        time.sleep(0.5)
+        for name, (job, proc, log, start) in list(running.items()):
+            if proc.poll() is None:
+                continue
+            log.close()
+            del running[name]
+            for p in job["providers"]:
+                in_use[p] -= 1
+            elapsed = time.time() - start
+            ok = proc.returncode == 0
+            results[name] = {"status": "OK" if ok else "FAILED", "time": round(elapsed, 1)}
+            if ok:
+                print(f"  ✓ {name} completed in {elapsed:.1f}s")
+            else:
+                print(f"  ✗ {name} failed after {elapsed:.1f}s (exit code {proc.returncode}, see {log.name})")
+
+    return results
+
+
+def _load_pricing() -> dict:
+    try:
+        with open(cfg.MODEL_REGISTRY_PATH, "r", encoding="utf-8") as f:
+            return json.load(f).get("pricing", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def usage_row(job: dict, pricing: dict) -> dict:
+    """Tokens and USD cost from the job's summary file (phases it actually ran)."""
+    path = job["run_dir"] / job["summary"]
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            summary = json.load(f)
+    except (OSError, ValueError):
+        return {"tokens": None, "cost_usd": None, "nodes": {}}
+    pipeline = summary.get("pipeline", summary)
+
+    tokens, cost = 0, 0.0
+    for usage in summary.get("token_usage", {}).values():
+        tokens += usage.get("total_tokens", 0)
+        price = pricing.get(usage.get("provider") or "", {}).get(usage.get("model") or "", {})
+        cost += usage.get("input_tokens", 0) / 1_000_000 * price.get("input_per_1m", 0)
+        cost += usage.get("output_tokens", 0) / 1_000_000 * price.get("output_per_1m", 0)
+    return {"tokens": tokens, "cost_usd": round(cost, 6), "nodes": pipeline.get("nodes", {})}
+
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description="Run multiple pipeline configurations")
     parser.add_argument("--dry-run", action="store_true", help="Show commands without executing")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the LLM response cache")
+    parser.add_argument(
+        "--max-parallel", type=int, default=None,
+        help="Cap on runs in flight overall (default: only PROVIDER_SLOTS)",
+    )
     args = parser.parse_args()
 
+    jobs = plan_jobs(RUNS, no_cache=args.no_cache)
+
     print("=" * 70)
     print("MULTI-PIPELINE COMPARISON RUNNER")
     print("=" * 70)
     print(f"Configurations: {len(RUNS)}")
     for i, run in enumerate(RUNS, 1):
         print(f"  {i}. {run['name']}: {run['description']}")
+    for job in jobs:
+        if job.get("shared_by"):
+            print(f"  ↳ {job['description']}")
+    print(f"Provider slots: {PROVIDER_SLOTS}")
     print("=" * 70)
 
     if args.dry_run:
         print("\n[DRY RUN] Commands that would be executed:\n")
-        for run in RUNS:
-            cmd = build_command(run)
-            print(f"  {' '.join(cmd)}\n")
+        for job in jobs:
+            after = f"   (after {', '.join(job['after'])})" if job["after"] else ""
+            print(f"  {' '.join(job['cmd'])}{after}\n")
         return
 
-    results = []
     total_start = time.time()
+    results = run_jobs(jobs, max_parallel=args.max_parallel)
+    total_elapsed = time.time() - total_start
 
-    for i, run_config in enumerate(RUNS, 1):
-        name = run_config["name"]
-        print(f"\n{'─' * 70}")
-        print(f"  RUN {i}/{len(RUNS)}: {name}")
-        print(f"  {run_config['description']}")
-        print(f"{'─' * 70}\n")
-
-        cmd = build_command(run_config)
-        start = time.time()
-
-        try:
-            result = subprocess.run(
-                cmd,
-                cwd=str(PIPELINE_SCRIPT.parent),
-                check=True,
-            )
-            elapsed = time.time() - start
-            results.append({"name": name, "status": "OK", "time": round(elapsed, 1)})
-            print(f"\n  ✓ {name} completed in {elapsed:.1f}s")
-
-        except subprocess.CalledProcessError as e:
-            elapsed = time.time() - start
-            results.append({"name": name, "status": "FAILED", "time": round(elapsed, 1)})
-            print(f"\n  ✗ {name} failed after {elapsed:.1f}s (exit code {e.returncode})")
+    # Comparison table
+    pricing = _load_pricing()
+    rows = []
+    for job in jobs:
+        row = {"name": job["name"], **results[job["name"]], **usage_row(job, pricing)}
+        if job.get("shared_by"):
+            row["shared_by"] = job["shared_by"]
+        else:
+            row["phase_1"] = row["nodes"].get("phase_1", "?")
+        rows.append(row)
 
-    # Summary
-    total_elapsed = time.time() - total_start
     print(f"\n{'=' * 70}")
     print("COMPARISON COMPLETE")
     print(f"{'=' * 70}")
-    print(f"  Total time: {total_elapsed:.1f}s\n")
+    print(f"  {'config':<24} {'status':<7} {'wall':>8} {'phase 1':<8} {'tokens':>10} {'cost $':>10}")
+    print(f"  {'─' * 24} {'─' * 7} {'─' * 8} {'─' * 8} {'─' * 10} {'─' * 10}")
+    for r in rows:
+        phase_1 = "shared" if r.get("shared_by") else r["phase_1"]
+        tokens = "?" if r["tokens"] is None else f"{r['tokens']:,}"
+        cost = "?" if r["cost_usd"] is None else f"{r['cost_usd']:.4f}"
+        print(f"  {r['name']:<24} {r['status']:<7} {r['time']:>7.1f}s {phase_1:<8} {tokens:>10} {cost:>10}")
+
+    sequential = sum(r["time"] for r in rows)
+    total_tokens = sum(r["tokens"] or 0 for r in rows)
+    total_cost = sum(r["cost_usd"] or 0 for r in rows)
+    print(f"\n  Wall time: {total_elapsed:.1f}s (jobs back to back: {sequential:.1f}s)")
+    print(f"  Tokens: {total_tokens:,}   Cost: ${total_cost:.4f}")
 
-    for r in results:
-        icon = "✓" if r["status"] == "OK" else "✗"
-        print(f"  {icon} {r['name']}: {r['status']} ({r['time']}s)")
+    RUNS_DIR.mkdir(parents=True, exist_ok=True)
+    with open(RUNS_DIR / "comparison.json", "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "wall_time_seconds": round(total_elapsed, 1),
+                "provider_slots": PROVIDER_SLOTS,
+                "runs": [{k: v for k, v in r.items() if k != "nodes"} for r in rows],
+            },
+            f,
+            indent=2,
+        )
 
-    ok_count = sum(1 for r in results if r["status"] == "OK")
-    print(f"\n  {ok_count}/{len(results)} runs succeeded")
-    print(f"  Results saved to: outputs/runs/")
+    ok_count = sum(1 for job in jobs if not job.get("shared_by") and results[job["name"]]["status"] == "OK")
+    print(f"\n  {ok_count}/{len(RUNS)} runs succeeded")
+    print(f"  Results saved to: outputs/runs/ (table: outputs/runs/comparison.json)")
     print(f"\n  Start the dashboard to compare:")
     print(f"    cd ../employee-dashboard && npm run dev")
     print(f"{'=' * 70}")
@@ -7,13 +7,31 @@ from utils import save_json, ensure_dir, get_logger
 logger = get_logger("pipeline")
 
 
-def setup_run(run_name: str = None, provider: str = None):
+def setup_run(
+    run_name: str = None,
+    provider: str = None,
+    no_cache: bool = False,
+    cascade: bool = False,
+    discovery: bool = False,
+    queue: str = None,
+    sampling: str = None,
+    explore: int = None,
+):
     """
     Apply runtime overrides BEFORE any phase modules are imported.
 
     Args:
         run_name:  If set, redirect outputs to outputs/runs/<run_name>/
         provider:  If set, force this LLM provider ("claude" or "gemini")
+        no_cache:  If True, bypass the LLM response cache for this run
+        cascade:   If True, Phase 2 labels with the local classifier first
+        discovery: If True, Phase 2 classifies a random sample until the
+                   candidate frequencies converge
+        queue:     If set, Phase 2 enqueues batches in this shared SQLite
+                   file for phase_2_worker.py processes to classify
+        sampling:  If set, Phase 1 sampling strategy ("random" or "cluster")
+        explore:   If > 1, Phase 1 merges that many concurrent runs into a
+                   consensus taxonomy
     """
     if run_name:
         cfg.OUTPUT_DIR = cfg.PROJECT_ROOT / "outputs" / "runs" / run_name
@@ -25,39 +43,160 @@ def setup_run(run_name: str = None, provider: str = None):
         cfg.LLM_PROVIDER_PRIORITY = [provider]
         logger.info(f"Provider forced to: {provider}")
 
+    if no_cache:
+        cfg.LLM_CACHE_ENABLED = False
+        logger.info("LLM response cache disabled")
 
-def run_phase_1():
+    if cascade:
+        cfg.P2_CASCADE = True
+        logger.info("Phase 2 cascade enabled (local classifier + LLM fallback)")
+
+    if discovery:
+        cfg.P2_DISCOVERY = True
+        logger.info(
+            f"Phase 2 discovery mode (sample until ±{cfg.P2_DISCOVERY_MARGIN:.0%} "
+            f"at {cfg.P2_DISCOVERY_CONFIDENCE:.0%} confidence)"
+        )
+
+    if queue:
+        cfg.P2_QUEUE_PATH = queue
+        logger.info(f"Phase 2 distributed via work queue: {queue}")
+
+    if sampling:
+        cfg.P1_SAMPLING = sampling
+        logger.info(f"Phase 1 sampling: {sampling}")
+
+    if explore and explore > 1:
+        cfg.P1_EXPLORE_RUNS = explore
+        logger.info(f"Phase 1 exploration: {explore} concurrent runs merged")
+
+
+def run_phase_1(ctx=None):
     """Seed taxonomy with LLM."""
     logger.info("=" * 60)
     logger.info(f"PHASE 1: {cfg.LLM_PROVIDER_PRIORITY[0].title()} Discovers Taxonomy")
     logger.info("=" * 60)
 
     from phase_1_seed import run as phase_1_run
-    return phase_1_run()
+    return phase_1_run(ctx=ctx)
 
 
-def run_phase_2(taxonomy: dict = None):
+def run_phase_2(taxonomy: dict = None, ctx=None):
     """Bulk classify with local SLM."""
     logger.info("=" * 60)
     logger.info("PHASE 2: Llama Bulk Classification")
     logger.info("=" * 60)
 
     from phase_2_bulk import run as phase_2_run
-    return phase_2_run(taxonomy=taxonomy)
+    return phase_2_run(taxonomy=taxonomy, ctx=ctx)
 
 
-def run_phase_3(taxonomy: dict = None, candidates: dict = None):
+def run_phase_3(taxonomy: dict = None, candidates: dict = None, ctx=None):
     """Finalize taxonomy with LLM."""
     logger.info("=" * 60)
     logger.info(f"PHASE 3: {cfg.LLM_PROVIDER_PRIORITY[0].title()} Finalizes Taxonomy")
     logger.info("=" * 60)
 
     from phase_3_finalize import run as phase_3_run
-    return phase_3_run(taxonomy=taxonomy, candidates=candidates)
+    return phase_3_run(taxonomy=taxonomy, candidates=candidates, ctx=ctx)
+
+
+def build_nodes(skip_phase2: bool = False, token_usage: dict = None) -> list:
+    """
+    Pipeline DAG: eda ∥ phase_1 → phase_2 → phase_3. Token usage of each
+    phase that actually runs is recorded in token_usage[node name]. A
+    phase that fell back or stopped early returns Degraded, so its output
+    is used for this run but not stored as an artifact.
+    """
+    from context import PipelineContext
+    from pipeline_dag import Degraded, Node
+    import phase_1_seed
+    import phase_2_bulk
+    import phase_3_finalize
+    import prompt_composer
+    from utils import token_tracker
+
+    token_usage = {} if token_usage is None else token_usage
+
+    def tracked(name, fn):
+        # Only one LLM phase runs at a time (EDA makes no calls), so the
+        # shared tracker isn't mixed between nodes
+        def run(inputs):
+            token_tracker.reset()
+            ctx = PipelineContext.default()
+            try:
+                artifact = fn(inputs, ctx)
+            finally:
+                token_usage[name] = token_tracker.get()
+            if ctx.degraded:
+                return Degraded(artifact, "; ".join(ctx.degraded))
+            return artifact
+        return run
+
+    def eda(inputs):
+        from csv_profile import profile_csv
+        ctx = PipelineContext.default()
+        report = profile_csv(ctx.data_path)
+        if cfg.SAVE_INTERMEDIATE:
+            save_json(report, ctx.output_dir / "eda_report.json", "EDA report")
+        return report
+
+    def phase_1(inputs, ctx):
+        taxonomy, _ = run_phase_1(ctx=ctx)
+        return {"taxonomy": taxonomy}
+
+    def phase_2(inputs, ctx):
+        classifications, candidates = run_phase_2(taxonomy=inputs["phase_1"]["taxonomy"], ctx=ctx)
+        return {"candidates": candidates, "classified": len(classifications)}
+
+    def phase_3(inputs, ctx):
+        candidates = inputs["phase_2"]["candidates"] if "phase_2" in inputs else {}
+        return run_phase_3(taxonomy=inputs["phase_1"]["taxonomy"], candidates=candidates, ctx=ctx)
+
+    # Everything that turns inputs into a prompt or a prompt's answer into
+    # the artifact, so editing any of it invalidates stored output
+    phase_1_prompts = [
+        phase_1_seed.build_prompt, phase_1_seed.build_sample_prompt, phase_1_seed.parse_taxonomy,
+        prompt_composer.compose_phase1_prompt, prompt_composer.OUTPUT_SCHEMA,
+        prompt_composer.DEFAULT_TASK_INSTRUCTION,
+    ]
+    phase_2_prompts = [
+        phase_2_bulk.build_taxonomy_schema, phase_2_bulk.build_batch_prompt,
+        phase_2_bulk.build_system_prompt, phase_2_bulk.build_response_schema,
+        phase_2_bulk.parse_batch_response, phase_2_bulk.parse_compact_response,
+    ]
+    phase_3_prompts = [phase_3_finalize.filter_candidates, phase_3_finalize.build_prompt]
+
+    return [
+        Node("eda", eda, data=True, files=["eda_report.json"]),
+        Node(
+            "phase_1", tracked("phase_1", phase_1), config=phase_1_seed.OUTPUT_CONFIG, data=True,
+            prompts=phase_1_prompts, files=["phase_1_taxonomy.json"],
+            # Unseeded sampling is meant to differ every run
+            cacheable=cfg.P1_RANDOM_STATE is not None,
+        ),
+        *([] if skip_phase2 else [
+            Node(
+                "phase_2", tracked("phase_2", phase_2), deps=["phase_1"], config=phase_2_bulk.OUTPUT_CONFIG,
+                data=True, prompts=phase_2_prompts, files=["phase_2_results.json", "phase_2_clusters.json"],
+            ),
+        ]),
+        Node(
+            "phase_3", tracked("phase_3", phase_3), deps=["phase_1"] if skip_phase2 else ["phase_1", "phase_2"],
+            config=phase_3_finalize.OUTPUT_CONFIG, prompts=phase_3_prompts,
+            files=["phase_3_final.json", "final_taxonomy.json"],
+        ),
+    ]
 
 
-def run_full(skip_phase2: bool = False):
-    """Execute the complete pipeline."""
+def run_full(skip_phase2: bool = False, phase: int = None, rerun: bool = False):
+    """
+    Execute the pipeline DAG (or just what `phase` needs). Phases whose
+    inputs haven't changed since a previous run are loaded from
+    cfg.ARTIFACT_DIR instead of re-run.
+    """
+    from pipeline_dag import run_dag
+
     ensure_dir(cfg.OUTPUT_DIR)
     start = time.time()
 
@@ -72,28 +211,45 @@ def run_full(skip_phase2: bool = False):
     logger.info(f"Phase 3 models: {cfg.P3_MODELS}")
     logger.info("=" * 60)
 
-    # Phase 1
-    t1 = time.time()
-    taxonomy = run_phase_1()
-    logger.info(f"Phase 1 completed in {time.time() - t1:.1f}s\n")
-
-    # Phase 2
-    candidates = {}
-    if not skip_phase2:
-        t2 = time.time()
-        _, candidates = run_phase_2(taxonomy=taxonomy)
-        logger.info(f"Phase 2 completed in {time.time() - t2:.1f}s\n")
-    else:
+    if skip_phase2:
         logger.info("Phase 2 skipped (--skip-phase2 flag)")
         logger.info("Phase 3 will finalize Phase 1 taxonomy without new candidates\n")
 
-    # Phase 3
-    t3 = time.time()
-    final = run_phase_3(taxonomy=taxonomy, candidates=candidates)
-    logger.info(f"Phase 3 completed in {time.time() - t3:.1f}s\n")
+    # --no-cache means "call providers fresh", so stored artifacts don't count either
+    token_usage = {}
+    result = run_dag(
+        build_nodes(skip_phase2, token_usage),
+        targets=[f"phase_{phase}"] if phase else None,
+        force=rerun or not cfg.LLM_CACHE_ENABLED,
+    )
+    status = result["status"]
+    if result["errors"]:
+        for name, error in result["errors"].items():
+            logger.error(f"  {name}: {error}")
+        logger.error("Pipeline stopped — re-run to resume from the last good artifact")
+        raise RuntimeError(f"Pipeline failed: {', '.join(result['errors'])}")
+    for name, reason in result["degraded"].items():
+        logger.warning(f"{name} is degraded and was not stored ({reason}) — re-run to retry it")
 
-    # Summary
     elapsed = time.time() - start
+    if phase:
+        # Token usage for partial runs (run_comparison.py reads this for shared phases)
+        save_json(
+            {
+                "total_time_seconds": round(elapsed, 1),
+                "nodes": status,
+                "fingerprints": result["fingerprints"],
+                "token_usage": token_usage,
+            },
+            cfg.OUTPUT_DIR / f"phase_{phase}_summary.json",
+            f"Phase {phase} summary",
+        )
+        logger.info(f"Phase {phase} complete ({status})")
+        return result["artifacts"][f"phase_{phase}"]
+
+    # Summary
+    final = result["artifacts"]["phase_3"]
+    candidates = result["artifacts"].get("phase_2", {}).get("candidates", {})
     final_cats = final.get("final_taxonomy", {}).get("categories", [])
     changes = final.get("changes", [])
 
@@ -101,11 +257,15 @@ def run_full(skip_phase2: bool = False):
         "pipeline": {
             "total_time_seconds": round(elapsed, 1),
             "phases_run": [1, 3] if skip_phase2 else [1, 2, 3],
+            "nodes": status,
+            "fingerprints": result["fingerprints"],
             "llm_provider_priority": cfg.LLM_PROVIDER_PRIORITY,
             "phase_1_models": cfg.P1_MODELS,
             "phase_2_model": cfg.P2_MODEL if not skip_phase2 else "skipped",
             "phase_3_models": cfg.P3_MODELS,
         },
+        # Phases loaded from an artifact spent no tokens in this run
+        "token_usage": token_usage,
         "results": {
             "final_categories": len(final_cats),
             "total_subcategories": sum(
@@ -122,6 +282,7 @@ def run_full(skip_phase2: bool = False):
     logger.info("PIPELINE COMPLETE")
     logger.info("=" * 60)
     logger.info(f"  Time:           {elapsed:.1f}s")
+    logger.info(f"  Nodes:          {', '.join(f'{n}={s}' for n, s in status.items())}")
     logger.info(f"  Final categories: {len(final_cats)}")
     logger.info(f"  Changes applied:  {len(changes)}")
     logger.info(f"  Outputs in:     {cfg.OUTPUT_DIR}")
@@ -138,7 +299,12 @@ def main():
         "--phase",
         type=int,
         choices=[1, 2, 3],
-        help="Run only a specific phase (default: run all)",
+        help="Run a phase and whatever it needs that isn't already stored (default: run all)",
+    )
+    parser.add_argument(
+        "--rerun",
+        action="store_true",
+        help="Re-run every phase even if an artifact for its inputs exists",
     )
     parser.add_argument(
         "--skip-phase2",
@@ -158,21 +324,60 @@ def main():
         default=None,
         help="Force a specific LLM provider (overrides config priority)",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Bypass the LLM response cache (always call providers)",
+    )
+    parser.add_argument(
+        "--cascade",
+        action="store_true",
+        help="Phase 2: label easy messages with a local classifier, LLM for the rest",
+    )
+    parser.add_argument(
+        "--discovery",
+        action="store_true",
+        help="Phase 2: classify a random sample until candidate frequencies converge",
+    )
+    parser.add_argument(
+        "--queue",
+        type=str,
+        default=None,
+        help="Phase 2: enqueue batches in this shared SQLite file for phase_2_worker.py",
+    )
+    parser.add_argument(
+        "--sampling",
+        type=str,
+        choices=["random", "cluster"],
+        default=None,
+        help="Phase 1: uniform sample, or one message per k-means cluster plus outliers",
+    )
+    parser.add_argument(
+        "--explore",
+        type=int,
+        default=None,
+        metavar="K",
+        help="Phase 1: run K calls concurrently on disjoint samples and merge them",
+    )
     args = parser.parse_args()
+    if args.phase == 2 and args.skip_phase2:
+        parser.error("--phase 2 and --skip-phase2 are contradictory")
 
     # Apply runtime overrides BEFORE importing phase modules
-    setup_run(run_name=args.run_name, provider=args.provider)
+    setup_run(
+        run_name=args.run_name,
+        provider=args.provider,
+        no_cache=args.no_cache,
+        cascade=args.cascade,
+        discovery=args.discovery,
+        queue=args.queue,
+        sampling=args.sampling,
+        explore=args.explore,
+    )
 
     ensure_dir(cfg.OUTPUT_DIR)
 
-    if args.phase == 1:
-        run_phase_1()
-    elif args.phase == 2:
-        run_phase_2()
-    elif args.phase == 3:
-        run_phase_3()
-    else:
-        run_full(skip_phase2=args.skip_phase2)
+    run_full(skip_phase2=args.skip_phase2, phase=args.phase, rerun=args.rerun)
 
 
 if __name__ == "__main__":
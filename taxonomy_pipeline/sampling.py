@@ -0,0 +1,122 @@
+"""
+sampling.py — Choose which messages Phase 1 shows the LLM.
+
+"random" is a plain uniform sample. "cluster" aims for the same theme
+coverage from fewer messages:
+
+1. Draw a uniform pool of P1_CLUSTER_POOL rows. Clustering cost is then
+   fixed however large the upload is. A theme at 0.1% of messages still
+   has ~20 members in a 20K pool.
+2. Drop duplicate messages from the pool (dedup-normalized text).
+3. Vectorize with hashed word 1-2 grams + TF-IDF (no vocabulary to build),
+   then a sparse random projection down to 256 dense dimensions.
+4. Cluster with mini-batch k-means into one cluster per sample slot.
+   Clustering the projection instead of the sparse matrix is what keeps
+   this to a second or two.
+5. Pick the message nearest each centroid. Top up with the messages
+   farthest from their centroid (P1_CLUSTER_OUTLIER_FRAC of the sample),
+   so rare phrasing that no cluster captures is still seen.
+
+Requires scikit-learn; falls back to "random" without it.
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+import config as cfg
+from dedup import normalize_message
+from utils import get_logger
+
+logger = get_logger("sampling")
+
+_DIMS = 256
+
+# Outliers need some content — one-word messages are far from every centroid
+_OUTLIER_MIN_WORDS = 5
+
+
+def sample_messages(
+    df: pd.DataFrame,
+    n: int,
+    random_state: int | None = None,
+    method: str = None,
+) -> pd.DataFrame:
+    """Rows of df to show the LLM in Phase 1 (method default P1_SAMPLING)."""
+    method = method or cfg.P1_SAMPLING
+    n = min(n, len(df))
+    if method == "cluster" and n < len(df):
+        try:
+            return _cluster_sample(df, n, random_state)
+        except ImportError:
+            logger.warning("scikit-learn not installed — using a random sample")
+    elif method not in ("random", "cluster"):
+        raise ValueError(f"Unknown P1_SAMPLING: {method!r} (use 'random' or 'cluster')")
+    return df.sample(n=n, random_state=random_state)
+
+
+def _cluster_sample(df: pd.DataFrame, n: int, random_state: int | None) -> pd.DataFrame:
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+    from sklearn.preprocessing import normalize
+    from sklearn.random_projection import SparseRandomProjection
+
+    start = time.perf_counter()
+
+    pool = df.sample(n=min(len(df), cfg.P1_CLUSTER_POOL), random_state=random_state)
+    texts = pool[cfg.COL_MESSAGE].astype(str)
+    keep = ~texts.map(normalize_message).duplicated()
+    pool, texts = pool[keep], texts[keep]
+    if len(pool) <= n:
+        return pool
+
+    tfidf = TfidfTransformer(sublinear_tf=True).fit_transform(
+        HashingVectorizer(
+            ngram_range=(1, 2), n_features=2 ** 18, alternate_sign=False, norm=None,
+        ).transform(texts.str[:cfg.P1_MSG_TRUNCATE])
+    )
+    vectors = normalize(
+        SparseRandomProjection(_DIMS, dense_output=True, random_state=random_state)
+        .fit_transform(tfidf)
+    )
+
+    n_outliers = int(n * cfg.P1_CLUSTER_OUTLIER_FRAC)
+    k = max(1, n - n_outliers)
+    km = MiniBatchKMeans(
+        n_clusters=k, batch_size=2048, n_init=3, random_state=random_state,
+    ).fit(vectors)
+    distances = km.transform(vectors)              # (pool, k) — small, k ≤ sample size
+    assigned = distances[np.arange(len(pool)), km.labels_]
+
+    # Nearest message to each centroid (empty clusters are skipped)
+    chosen: list[int] = []
+    taken = set()
+    for c in range(k):
+        members = np.flatnonzero(km.labels_ == c)
+        if members.size:
+            pos = int(members[np.argmin(distances[members, c])])
+            chosen.append(pos)
+            taken.add(pos)
+
+    # Farthest-from-centroid messages, then anything left, until n
+    words = texts.str.split().str.len().to_numpy()
+    for pos in np.argsort(-assigned):
+        if len(chosen) >= n:
+            break
+        if int(pos) not in taken and words[pos] >= _OUTLIER_MIN_WORDS:
+            chosen.append(int(pos))
+            taken.add(int(pos))
+    for pos in range(len(pool)):
+        if len(chosen) >= n:
+            break
+        if pos not in taken:
+            chosen.append(pos)
+            taken.add(pos)
+
+    logger.info(
+        f"Cluster sampling: {len(pool)} unique messages from a pool of "
+        f"{min(len(df), cfg.P1_CLUSTER_POOL)} → {k} clusters, "
+        f"{len(chosen)} picked in {time.perf_counter() - start:.1f}s"
+    )
+    return pool.iloc[chosen]
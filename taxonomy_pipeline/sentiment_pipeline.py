@@ -40,7 +40,7 @@ from collections import Counter, defaultdict
 from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, Optional, Union
 
 import pandas as pd
 
@@ -54,6 +54,15 @@ OUTPUT_DIR   = PROJECT_ROOT / "outputs"
 DEFAULT_INPUT  = DATA_DIR / "awards_enriched.csv"
 CACHE_FILE     = OUTPUT_DIR / ".sentiment_cache.json"
 
+# The CSV is streamed in chunks of this many rows, reading only the
+# columns below, so memory stays flat however large the upload is
+CHUNK_ROWS       = 50_000
+REQUIRED_COLUMNS = ["award_id", "message", "recipient_id", "nominator_id"]
+PROFILE_COLUMNS  = REQUIRED_COLUMNS + [
+    "award_date", "award_title", "recipient_name", "recipient_department",
+    "nominator_name", "nominator_department", "category_name", "value",
+]
+
 # ─────────────────────────────────────────────────────────────────────────────
 # LOGGING
 # ─────────────────────────────────────────────────────────────────────────────
@@ -136,6 +145,43 @@ GENERIC_PENALTY = _compile([
 ])
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# STREAMING LOADER
+# ─────────────────────────────────────────────────────────────────────────────
+
+Chunks = Union[pd.DataFrame, Iterable[pd.DataFrame]]
+
+
+def check_columns(input_csv: Path) -> list[str]:
+    """Validate the header without reading any rows. Returns the columns."""
+    if not input_csv.exists():
+        raise FileNotFoundError(f"Input CSV not found: {input_csv}")
+    columns = list(pd.read_csv(input_csv, nrows=0).columns)
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        raise KeyError(f"Missing columns in CSV: {missing}. Check column names.")
+    return columns
+
+
+def iter_chunks(
+    input_csv: Path,
+    columns:   list[str],
+    chunksize: int = CHUNK_ROWS,
+) -> Iterator[pd.DataFrame]:
+    """Stream the CSV as string-typed chunks of just `columns` (those present)."""
+    wanted = set(columns)
+    for chunk in pd.read_csv(
+        input_csv, usecols=lambda c: c in wanted, dtype=str, chunksize=chunksize,
+    ):
+        if "message" in chunk.columns:
+            chunk["message"] = chunk["message"].fillna("")
+        yield chunk
+
+
+def _as_chunks(chunks: Chunks) -> Iterable[pd.DataFrame]:
+    return [chunks] if isinstance(chunks, pd.DataFrame) else chunks
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # CORE SCORER  (pure function — safe for multiprocessing)
 # ─────────────────────────────────────────────────────────────────────────────
@@ -274,7 +320,7 @@ def save_cache(cache_path: Path, data: dict) -> None:
 # ─────────────────────────────────────────────────────────────────────────────
 
 def score_all(
-    df: pd.DataFrame,
+    df: Chunks,
     msg_col: str = "message",
     id_col:  str = "award_id",
     workers: int = 4,
@@ -285,7 +331,8 @@ def score_all(
     Score all messages in parallel. Returns {award_id: score_dict}.
 
     Args:
-        df:        awards DataFrame
+        df:        awards DataFrame, or an iterable of DataFrame chunks
+                   (scored one chunk at a time)
         msg_col:   column containing the message text
         id_col:    column containing the award identifier
         workers:   number of parallel worker processes
@@ -294,41 +341,46 @@ def score_all(
     """
     cache = {} if no_cache or cache is None else cache
     results: dict[str, dict] = {}
-
-    # Separate rows that need scoring vs cached
-    to_score: list[tuple[str, str]] = []
-    for _, row in df.iterrows():
-        aid = str(row[id_col])
-        if aid in cache and not no_cache:
-            results[aid] = cache[aid]
-        else:
-            to_score.append((aid, str(row.get(msg_col, "") or "")))
-
-    cached_count = len(results)
-    log.info(f"Scoring {len(to_score)} messages ({cached_count} from cache) with {workers} workers")
-
-    if not to_score:
-        return results
+    cached_count = 0
+    scored = 0
+    pool = None
 
     t0 = time.perf_counter()
-
-    if workers <= 1 or len(to_score) < 50:
-        # Single-process (simpler on Windows or small datasets)
-        for aid, msg in to_score:
-            results[aid] = score_message(msg)
-    else:
-        with ProcessPoolExecutor(max_workers=workers) as ex:
-            futs = {ex.submit(_score_row, item): item[0] for item in to_score}
-            done = 0
-            for fut in as_completed(futs):
-                aid, score = fut.result()
-                results[aid] = score
-                done += 1
-                if done % 200 == 0:
-                    log.info(f"  Scored {done}/{len(to_score)}…")
+    try:
+        for chunk in _as_chunks(df):
+            # Separate rows that need scoring vs cached
+            to_score: list[tuple[str, str]] = []
+            for _, row in chunk.iterrows():
+                aid = str(row[id_col])
+                if aid in cache and not no_cache:
+                    results[aid] = cache[aid]
+                    cached_count += 1
+                else:
+                    to_score.append((aid, str(row.get(msg_col, "") or "")))
+
+            if workers <= 1 or len(to_score) < 50:
+                # Single-process (simpler on Windows or small datasets)
+                for aid, msg in to_score:
+                    results[aid] = score_message(msg)
+            else:
+                pool = pool or ProcessPoolExecutor(max_workers=workers)
+                futs = [pool.submit(_score_row, item) for item in to_score]
+                for fut in as_completed(futs):
+                    aid, score = fut.result()
+                    results[aid] = score
+
+            scored += len(to_score)
+            if to_score:
+                log.info(f"  Scored {scored} messages ({cached_count} from cache)…")
+    finally:
+        if pool is not None:
+            pool.shutdown()
 
     elapsed = time.perf_counter() - t0
-    log.info(f"Scoring complete in {elapsed:.2f}s ({len(to_score)/elapsed:.0f} msg/s)")
+    log.info(
+        f"Scoring complete in {elapsed:.2f}s: {scored} scored, {cached_count} from cache, "
+        f"{workers} workers ({scored / elapsed if elapsed else 0:.0f} msg/s)"
+    )
     return results
 
 
@@ -336,68 +388,86 @@ def score_all(
 # AGGREGATE PROFILES
 # ─────────────────────────────────────────────────────────────────────────────
 
-def build_recipient_profiles(df: pd.DataFrame, tiers: dict[str, int]) -> dict:
-    """Per-employee received-sentiment profile."""
-    by_rid: dict[str, list] = defaultdict(list)
-    for _, row in df.iterrows():
-        aid = str(row["award_id"])
-        if aid in tiers:
-            by_rid[str(row["recipient_id"])].append({
-                "tier":  tiers[aid],
+def build_recipient_profiles(df: Chunks, tiers: dict[str, int]) -> dict:
+    """Per-employee received-sentiment profile (running totals, one pass)."""
+    by_rid: dict[str, dict] = {}
+    for chunk in _as_chunks(df):
+        for _, row in chunk.iterrows():
+            aid = str(row["award_id"])
+            if aid not in tiers:
+                continue
+            t = tiers[aid]
+            acc = by_rid.setdefault(str(row["recipient_id"]), {
+                "count": 0, "sum": 0, "dist": Counter(), "hf": 0, "perf": 0, "recent": [],
+            })
+            acc["count"] += 1
+            acc["sum"] += t
+            acc["dist"][t] += 1
+            acc["hf"] += t >= 4      # heartfelt (≥4)
+            acc["perf"] += t <= 1    # perfunctory (1)
+            entry = {
+                "tier":  t,
                 "date":  str(row.get("award_date", "")),
                 "title": str(row.get("award_title", "")),
-            })
+            }
+            # Keep only the 3 most recent (stable, so ties keep file order)
+            acc["recent"] = sorted(acc["recent"] + [entry], key=lambda e: e["date"], reverse=True)[:3]
 
-    profiles = {}
-    for rid, entries in by_rid.items():
-        tier_list = [e["tier"] for e in entries]
-        dist = dict(Counter(tier_list))
-        profiles[rid] = {
-            "count":  len(tier_list),
-            "avg":    round(sum(tier_list) / len(tier_list), 2),
-            "dist":   dist,
-            "hf":     sum(1 for t in tier_list if t >= 4),   # heartfelt (≥4)
-            "perf":   sum(1 for t in tier_list if t <= 1),   # perfunctory (1)
-            "recent": sorted(entries, key=lambda e: e["date"], reverse=True)[:3],
+    return {
+        rid: {
+            "count":  acc["count"],
+            "avg":    round(acc["sum"] / acc["count"], 2),
+            "dist":   dict(acc["dist"]),
+            "hf":     acc["hf"],
+            "perf":   acc["perf"],
+            "recent": acc["recent"],
         }
-    return profiles
-
-
-def build_nominator_profiles(df: pd.DataFrame, tiers: dict[str, int]) -> dict:
-    """Per-nominator writing-quality profile."""
-    by_nid: dict[str, list] = defaultdict(list)
-    for _, row in df.iterrows():
-        aid = str(row["award_id"])
-        if aid in tiers:
-            by_nid[str(row["nominator_id"])].append({
-                "tier":  tiers[aid],
-                "name":  str(row.get("nominator_name", "")),
-                "dept":  str(row.get("nominator_department", "")),
+        for rid, acc in by_rid.items()
+    }
+
+
+def build_nominator_profiles(df: Chunks, tiers: dict[str, int]) -> dict:
+    """Per-nominator writing-quality profile (running totals, one pass)."""
+    by_nid: dict[str, dict] = {}
+    for chunk in _as_chunks(df):
+        for _, row in chunk.iterrows():
+            aid = str(row["award_id"])
+            if aid not in tiers:
+                continue
+            t = tiers[aid]
+            acc = by_nid.setdefault(str(row["nominator_id"]), {
+                "name": str(row.get("nominator_name", "")),
+                "dept": str(row.get("nominator_department", "")),
+                "count": 0, "sum": 0, "hf": 0,
             })
+            acc["count"] += 1
+            acc["sum"] += t
+            acc["hf"] += t >= 4
 
-    profiles = {}
-    for nid, entries in by_nid.items():
-        tier_list = [e["tier"] for e in entries]
-        profiles[nid] = {
-            "name":  entries[0]["name"],
-            "dept":  entries[0]["dept"],
-            "count": len(tier_list),
-            "avg":   round(sum(tier_list) / len(tier_list), 2),
-            "hf":    sum(1 for t in tier_list if t >= 4),
+    return {
+        nid: {
+            "name":  acc["name"],
+            "dept":  acc["dept"],
+            "count": acc["count"],
+            "avg":   round(acc["sum"] / acc["count"], 2),
+            "hf":    acc["hf"],
         }
-    return profiles
+        for nid, acc in by_nid.items()
+    }
 
 
-def build_monthly_trend(df: pd.DataFrame, tiers: dict[str, int]) -> dict[str, float]:
+def build_monthly_trend(df: Chunks, tiers: dict[str, int]) -> dict[str, float]:
     """Average tier per YYYY-MM."""
-    by_month: dict[str, list] = defaultdict(list)
-    for _, row in df.iterrows():
-        aid = str(row["award_id"])
-        if aid in tiers:
-            month = str(row.get("award_date", ""))[:7]
-            if month:
-                by_month[month].append(tiers[aid])
-    return {m: round(sum(v) / len(v), 3) for m, v in sorted(by_month.items())}
+    by_month: dict[str, list[int]] = defaultdict(lambda: [0, 0])   # [sum, count]
+    for chunk in _as_chunks(df):
+        for _, row in chunk.iterrows():
+            aid = str(row["award_id"])
+            if aid in tiers:
+                month = str(row.get("award_date", ""))[:7]
+                if month:
+                    by_month[month][0] += tiers[aid]
+                    by_month[month][1] += 1
+    return {m: round(total / n, 3) for m, (total, n) in sorted(by_month.items())}
 
 
 def build_org_summary(tiers: dict[str, int], scores: dict[str, dict]) -> dict:
@@ -427,47 +497,58 @@ def build_org_summary(tiers: dict[str, int], scores: dict[str, dict]) -> dict:
 # OUTPUT WRITERS
 # ─────────────────────────────────────────────────────────────────────────────
 
+AWARDS_CSV_FIELDS = [
+    "award_id", "award_date", "award_title", "recipient_id", "recipient_name",
+    "recipient_dept", "nominator_id", "nominator_name", "nominator_dept",
+    "category", "value", "message_len", "sentiment_tier", "sentiment_label",
+    "dim_depth", "dim_specificity", "dim_warmth", "dim_personalization",
+    "sentiment_total",
+]
+
+
 def write_awards_csv(
-    df: pd.DataFrame,
+    df: Chunks,
     scores: dict[str, dict],
     tiers:  dict[str, int],
     path:   Path,
 ) -> None:
-    """Write per-award CSV with all sentiment fields."""
+    """Write per-award CSV with all sentiment fields, a chunk at a time."""
     path.parent.mkdir(parents=True, exist_ok=True)
-    rows = []
-    for _, row in df.iterrows():
-        aid   = str(row["award_id"])
-        sc    = scores.get(aid, _empty_score())
-        tier  = tiers.get(aid, 3)
-        meta  = TIER_META[tier]
-        rows.append({
-            "award_id":          aid,
-            "award_date":        row.get("award_date", ""),
-            "award_title":       row.get("award_title", ""),
-            "recipient_id":      row.get("recipient_id", ""),
-            "recipient_name":    row.get("recipient_name", ""),
-            "recipient_dept":    row.get("recipient_department", ""),
-            "nominator_id":      row.get("nominator_id", ""),
-            "nominator_name":    row.get("nominator_name", ""),
-            "nominator_dept":    row.get("nominator_department", ""),
-            "category":          row.get("category_name", ""),
-            "value":             row.get("value", 0),
-            "message_len":       len(str(row.get("message", "") or "")),
-            "sentiment_tier":    tier,
-            "sentiment_label":   meta["label"],
-            "dim_depth":         sc["depth"],
-            "dim_specificity":   sc["spec"],
-            "dim_warmth":        sc["warmth"],
-            "dim_personalization": sc["pers"],
-            "sentiment_total":   sc["total"],
-        })
-
+    written = 0
     with open(path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer = csv.DictWriter(f, fieldnames=AWARDS_CSV_FIELDS)
         writer.writeheader()
-        writer.writerows(rows)
-    log.info(f"Wrote {len(rows)} rows → {path}")
+        for chunk in _as_chunks(df):
+            rows = []
+            for _, row in chunk.iterrows():
+                aid   = str(row["award_id"])
+                sc    = scores.get(aid, _empty_score())
+                tier  = tiers.get(aid, 3)
+                meta  = TIER_META[tier]
+                rows.append({
+                    "award_id":          aid,
+                    "award_date":        row.get("award_date", ""),
+                    "award_title":       row.get("award_title", ""),
+                    "recipient_id":      row.get("recipient_id", ""),
+                    "recipient_name":    row.get("recipient_name", ""),
+                    "recipient_dept":    row.get("recipient_department", ""),
+                    "nominator_id":      row.get("nominator_id", ""),
+                    "nominator_name":    row.get("nominator_name", ""),
+                    "nominator_dept":    row.get("nominator_department", ""),
+                    "category":          row.get("category_name", ""),
+                    "value":             row.get("value", 0),
+                    "message_len":       len(str(row.get("message", "") or "")),
+                    "sentiment_tier":    tier,
+                    "sentiment_label":   meta["label"],
+                    "dim_depth":         sc["depth"],
+                    "dim_specificity":   sc["spec"],
+                    "dim_warmth":        sc["warmth"],
+                    "dim_personalization": sc["pers"],
+                    "sentiment_total":   sc["total"],
+                })
+            writer.writerows(rows)
+            written += len(rows)
+    log.info(f"Wrote {written} rows → {path}")
 
 
 def write_json(data: object, path: Path, label: str) -> None:
@@ -526,10 +607,15 @@ def run(
     output_dir: Path,
     workers:    int  = 4,
     no_cache:   bool = False,
+    chunksize:  int  = CHUNK_ROWS,
 ) -> dict:
     """
     Full sentiment pipeline.
 
+    The CSV is never loaded whole: scoring and each profile/output pass
+    stream it in chunks of `chunksize` rows, reading only the columns
+    they need. What stays in memory is one small score dict per award.
+
     Returns:
         dict with keys: scores, tiers, summary, recipient_profiles,
                          nominator_profiles, monthly_trend
@@ -545,18 +631,11 @@ def run(
     log.info(f"Output: {output_dir}")
     log.info(f"Workers: {workers} | Cache: {'disabled' if no_cache else 'enabled'}")
 
-    # ── 1. Load data ──────────────────────────────────────────────────────────
-    if not input_csv.exists():
-        raise FileNotFoundError(f"Input CSV not found: {input_csv}")
-
-    df = pd.read_csv(input_csv)
-    required = ["award_id", "message", "recipient_id", "nominator_id"]
-    missing  = [c for c in required if c not in df.columns]
-    if missing:
-        raise KeyError(f"Missing columns in CSV: {missing}. Check column names.")
+    # ── 1. Validate input (header only — rows are streamed below) ────────────
+    check_columns(input_csv)
 
-    df["message"] = df["message"].fillna("").astype(str)
-    log.info(f"Loaded {len(df):,} awards")
+    def chunks(columns: list[str]) -> Iterator[pd.DataFrame]:
+        return iter_chunks(input_csv, columns, chunksize)
 
     # ── 2. Check cache validity ───────────────────────────────────────────────
     file_hash = _file_hash(input_csv)
@@ -573,7 +652,10 @@ def run(
         cached_scores = {}
 
     # ── 3. Score messages ─────────────────────────────────────────────────────
-    scores = score_all(df, workers=workers, cache=cached_scores, no_cache=no_cache)
+    scores = score_all(
+        chunks(["award_id", "message"]), workers=workers, cache=cached_scores, no_cache=no_cache,
+    )
+    log.info(f"Loaded {len(scores):,} awards")
 
     # Persist cache
     save_cache(cache_path, {
@@ -586,19 +668,23 @@ def run(
 
     # ── 5. Build profiles ─────────────────────────────────────────────────────
     log.info("Building recipient profiles…")
-    recipients = build_recipient_profiles(df, tiers)
+    recipients = build_recipient_profiles(
+        chunks(["award_id", "recipient_id", "award_date", "award_title"]), tiers,
+    )
 
     log.info("Building nominator profiles…")
-    nominators = build_nominator_profiles(df, tiers)
+    nominators = build_nominator_profiles(
+        chunks(["award_id", "nominator_id", "nominator_name", "nominator_department"]), tiers,
+    )
 
     log.info("Building monthly trend…")
-    monthly = build_monthly_trend(df, tiers)
+    monthly = build_monthly_trend(chunks(["award_id", "award_date"]), tiers)
 
     # ── 6. Org summary ────────────────────────────────────────────────────────
     summary = build_org_summary(tiers, scores)
 
     # ── 7. Write outputs ─────────────────────────────────────────────────────
-    write_awards_csv(df, scores, tiers, output_dir / "sentiment_awards.csv")
+    write_awards_csv(chunks(PROFILE_COLUMNS), scores, tiers, output_dir / "sentiment_awards.csv")
     write_json(summary,    output_dir / "sentiment_summary.json",   "summary")
     write_json(recipients, output_dir / "sentiment_employees.json", "employee profiles")
     write_json(nominators, output_dir / "sentiment_nominators.json","nominator profiles")
@@ -678,6 +764,12 @@ Cron (4 AM daily):
         action="store_true",
         help="Ignore cache and re-score all messages",
     )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=CHUNK_ROWS,
+        help=f"Rows read from the CSV at a time (default: {CHUNK_ROWS})",
+    )
     parser.add_argument(
         "--dry-run",
         action="store_true",
@@ -687,9 +779,10 @@ Cron (4 AM daily):
 
     if args.dry_run:
         log.info("DRY RUN — loading and validating only")
-        df = pd.read_csv(args.input)
-        log.info(f"Loaded {len(df)} rows. Columns: {list(df.columns)}")
-        sample = df["message"].dropna().iloc[0] if "message" in df.columns else ""
+        columns = check_columns(args.input)
+        df = next(iter_chunks(args.input, PROFILE_COLUMNS, args.chunk_size), pd.DataFrame())
+        log.info(f"Header OK. Columns: {columns}")
+        sample = df["message"].iloc[0] if len(df) else ""
         sc = score_message(str(sample))
         log.info(f"Sample score: {sc}")
         log.info("Dry run complete — no files written.")
@@ -700,6 +793,7 @@ Cron (4 AM daily):
         output_dir = args.output_dir,
         workers    = args.workers,
         no_cache   = args.no_cache,
+        chunksize  = args.chunk_size,
     )
 
 
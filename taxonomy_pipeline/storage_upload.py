@@ -0,0 +1,172 @@
+"""
+storage_upload.py — Stream a file to Supabase Storage while it is read.
+
+Supabase's resumable upload endpoint speaks TUS. One POST creates the
+upload with its final length, then PATCH requests append chunks of
+exactly 6 MB (the last one may be shorter). ResumableUpload sends those
+PATCHes from a background thread fed through a bounded queue, so the
+caller can validate and profile the next chunk while the previous one
+is on the wire, and never holds more than a few chunks in memory.
+
+The object only appears in the bucket once its last byte lands. The
+final chunk is held back until finish(), so an upload aborted after a
+failed validation leaves nothing behind.
+
+    upload = ResumableUpload(url, key, bucket, path, length=size).start()
+    for chunk in chunks:
+        upload.write(chunk)
+    upload.finish()            # or upload.abort()
+"""
+
+import base64
+import queue
+import threading
+
+import httpx
+
+from utils import get_logger
+
+logger = get_logger("storage_upload")
+
+CHUNK_SIZE = 6 * 1024 * 1024   # fixed by Supabase for resumable uploads
+_RETRIES = 3
+
+
+class ResumableUpload:
+    """
+    url, key:      Supabase project URL and service role key
+    bucket, name:  destination object
+    length:        total size in bytes (TUS needs it up front)
+    max_pending:   chunks queued for the uploader before write() blocks
+    """
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        bucket: str,
+        name: str,
+        length: int,
+        content_type: str = "text/csv",
+        max_pending: int = 2,
+        timeout: float = 60.0,
+    ):
+        self.length = length
+        self._endpoint = f"{url.rstrip('/')}/storage/v1/upload/resumable"
+        self._headers = {"Authorization": f"Bearer {key}", "apikey": key, "Tus-Resumable": "1.0.0"}
+        self._metadata = {"bucketName": bucket, "objectName": name, "contentType": content_type}
+        self._client = httpx.Client(timeout=timeout)
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._buffer = bytearray()
+        self._location = None
+        self._offset = 0
+        self._error: Exception | None = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> "ResumableUpload":
+        """Create the upload and start the sender thread."""
+        metadata = ",".join(
+            f"{k} {base64.b64encode(v.encode('utf-8')).decode('ascii')}"
+            for k, v in self._metadata.items()
+        )
+        res = self._client.post(
+            self._endpoint,
+            headers={**self._headers, "Upload-Length": str(self.length), "Upload-Metadata": metadata},
+        )
+        res.raise_for_status()
+        # Location may be relative to the endpoint
+        self._location = httpx.URL(self._endpoint).join(res.headers["Location"])
+        self._thread = threading.Thread(target=self._send_loop, name="storage-upload", daemon=True)
+        self._thread.start()
+        return self
+
+    def write(self, data: bytes) -> None:
+        """Queue data for upload; blocks while max_pending chunks are waiting."""
+        self._buffer += data
+        # Strictly greater: the last bytes always wait for finish()
+        while len(self._buffer) > CHUNK_SIZE:
+            self._put(bytes(self._buffer[:CHUNK_SIZE]))
+            del self._buffer[:CHUNK_SIZE]
+
+    def finish(self) -> None:
+        """Send the final chunk and wait; raises if any chunk failed."""
+        if self._buffer:
+            self._put(bytes(self._buffer))
+            self._buffer.clear()
+        self._put(None)
+        self._thread.join()
+        # On failure the client stays open for abort()
+        self._raise_if_failed()
+        if self._offset != self.length:
+            raise RuntimeError(f"Storage upload incomplete: {self._offset} of {self.length} bytes")
+        self._client.close()
+
+    def abort(self) -> None:
+        """Stop sending and discard the partial upload on the server."""
+        self._stop.set()
+        if self._thread is not None:
+            while self._thread.is_alive():
+                try:
+                    self._queue.put(None, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+            self._thread.join()
+        if self._location is not None:
+            try:
+                self._client.delete(self._location, headers=self._headers)
+            except httpx.HTTPError as e:
+                # Unfinished uploads expire on the server anyway
+                logger.warning(f"Could not discard partial upload: {e}")
+        self._client.close()
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise RuntimeError(f"Storage upload failed at byte {self._offset}: {self._error}")
+
+    def _put(self, chunk: bytes | None) -> None:
+        while True:
+            self._raise_if_failed()
+            try:
+                self._queue.put(chunk, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _send_loop(self) -> None:
+        while True:
+            chunk = self._queue.get()
+            if chunk is None or self._stop.is_set():
+                return
+            try:
+                self._send(chunk)
+            except Exception as e:
+                self._error = e
+                return
+
+    def _send(self, chunk: bytes) -> None:
+        target = self._offset + len(chunk)
+        for attempt in range(_RETRIES):
+            try:
+                res = self._client.patch(
+                    self._location,
+                    content=chunk,
+                    headers={
+                        **self._headers,
+                        "Upload-Offset": str(self._offset),
+                        "Content-Type": "application/offset+octet-stream",
+                    },
+                )
+                res.raise_for_status()
+                self._offset = int(res.headers.get("Upload-Offset", target))
+                return
+            except httpx.HTTPError as e:
+                if attempt == _RETRIES - 1:
+                    raise
+                logger.warning(f"Upload chunk at byte {self._offset} failed ({e}), retrying")
+                # The server may have stored the chunk before the error
+                head = self._client.head(self._location, headers=self._headers)
+                if head.is_success and int(head.headers.get("Upload-Offset", -1)) == target:
+                    self._offset = target
+                    return
@@ -0,0 +1,149 @@
+"""
+taxonomy_merge.py — Merge several Phase 1 taxonomies into a consensus.
+
+Each run's categories are aligned to groups by bag-of-words cosine
+similarity over name, description and subcategory names. The name
+counts double. A run contributes at most one category per group, and a
+category below P1_MERGE_THRESHOLD against every group starts a new one.
+
+A group's support is the share of runs that produced it. Groups with
+support ≥ P1_CONSENSUS_MIN_SUPPORT make up the consensus taxonomy.
+Each is represented by its medoid, the member most similar to the
+others, whose subcategories come with it. Categories and subcategories
+are re-lettered A, A1, ...
+
+Stability is the mean Jaccard overlap of the group sets of every pair
+of runs: 1.0 means every run found the same categories.
+"""
+
+import math
+import re
+import string
+from collections import Counter
+from itertools import combinations
+
+import config as cfg
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from in into is it its of on or that the "
+    "their them they this to with who whose when where which while".split()
+)
+
+
+def _bag(category: dict) -> Counter:
+    def words(text) -> list[str]:
+        return [w for w in _WORD.findall(str(text or "").lower()) if w not in _STOPWORDS]
+
+    bag = Counter(words(category.get("name")) * 2)
+    bag.update(words(category.get("description")))
+    for sub in category.get("subcategories", []):
+        bag.update(words(sub.get("name")))
+    return bag
+
+
+def similarity(a: Counter, b: Counter) -> float:
+    dot = sum(n * b[w] for w, n in a.items() if w in b)
+    if not dot:
+        return 0.0
+    norm = math.sqrt(sum(n * n for n in a.values())) * math.sqrt(sum(n * n for n in b.values()))
+    return dot / norm
+
+
+def _letter(i: int) -> str:
+    letters = string.ascii_uppercase
+    return letters[i] if i < len(letters) else letters[i // len(letters) - 1] + letters[i % len(letters)]
+
+
+def merge_taxonomies(taxonomies: list[dict], threshold: float = None, min_support: float = None) -> tuple[dict, dict]:
+    """
+    Consensus of several taxonomies. Returns (taxonomy, report), where
+    report has "stability" and per-group "support" and member names.
+    """
+    threshold = cfg.P1_MERGE_THRESHOLD if threshold is None else threshold
+    min_support = cfg.P1_CONSENSUS_MIN_SUPPORT if min_support is None else min_support
+    runs = len(taxonomies)
+
+    # groups: [{"bag": Counter (sum of members), "members": [(run, category, bag)]}]
+    groups: list[dict] = []
+    for run, taxonomy in enumerate(taxonomies):
+        cats = [(c, _bag(c)) for c in taxonomy.get("categories", [])]
+        # Greedy one-to-one assignment, best pairs first
+        pairs = sorted(
+            (
+                (similarity(bag, group["bag"]), ci, gi)
+                for ci, (_, bag) in enumerate(cats)
+                for gi, group in enumerate(groups)
+            ),
+            reverse=True,
+        )
+        placed, used = {}, set()
+        for score, ci, gi in pairs:
+            if score < threshold:
+                break
+            if ci not in placed and gi not in used:
+                placed[ci] = gi
+                used.add(gi)
+        for ci, (cat, bag) in enumerate(cats):
+            if ci in placed:
+                group = groups[placed[ci]]
+            else:
+                group = {"bag": Counter(), "members": []}
+                groups.append(group)
+            group["bag"].update(bag)
+            group["members"].append((run, cat, bag))
+
+    def medoid(group: dict) -> dict:
+        members = group["members"]
+        return max(
+            members,
+            key=lambda m: sum(similarity(m[2], o[2]) for o in members if o is not m),
+        )[1]
+
+    # Most-supported first; ties keep the order groups were first seen
+    ranked = sorted(
+        enumerate(groups), key=lambda g: (-len(g[1]["members"]), g[0]),
+    )
+    consensus, report_groups = [], []
+    for _, group in ranked:
+        support = len(group["members"]) / runs
+        rep = medoid(group)
+        kept = support >= min_support
+        if kept:
+            i = len(consensus)
+            consensus.append({
+                **rep,
+                "id": _letter(i),
+                "subcategories": [
+                    {**sub, "id": f"{_letter(i)}{j + 1}"}
+                    for j, sub in enumerate(rep.get("subcategories", []))
+                ],
+            })
+        report_groups.append({
+            "name": rep.get("name"),
+            "support": round(support, 3),
+            "kept": kept,
+            "members": {str(run): cat.get("name") for run, cat, _ in group["members"]},
+        })
+
+    # Pairwise Jaccard of the groups each run contributed to
+    run_groups = [
+        {gi for gi, group in enumerate(groups) for run, _, _ in group["members"] if run == r}
+        for r in range(runs)
+    ]
+    pair_scores = [
+        len(a & b) / len(a | b) if a | b else 1.0
+        for a, b in combinations(run_groups, 2)
+    ]
+    stability = sum(pair_scores) / len(pair_scores) if pair_scores else 1.0
+
+    reasoning = next((t.get("reasoning") for t in taxonomies if t.get("reasoning")), "")
+    taxonomy = {"categories": consensus, "reasoning": reasoning}
+    report = {
+        "runs": runs,
+        "stability": round(stability, 3),
+        "threshold": threshold,
+        "min_support": min_support,
+        "groups": report_groups,
+    }
+    return taxonomy, report
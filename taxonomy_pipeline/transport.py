@@ -0,0 +1,104 @@
+"""
+transport.py — Pooled async HTTP transport shared by every LLM caller.
+
+All provider calls run on one background asyncio loop that owns a
+keep-alive httpx.AsyncClient per provider host. Sync code (the phases,
+the API worker threads) submits coroutines with run_sync() and blocks
+on the result, so connections are reused across calls and threads.
+
+Usage:
+    from transport import run_sync, get_http_client
+
+    client = get_http_client("groq")
+    r = run_sync(client.post(url, json=payload))
+"""
+
+import asyncio
+import threading
+
+import httpx
+
+import config as cfg
+
+# Hosts that speak HTTP/2 — Ollama's local server is HTTP/1.1 only
+_HTTP2_PROVIDERS = {"gemini", "groq"}
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_thread: threading.Thread | None = None
+_loop_lock = threading.Lock()
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (httpx[http2] extra)
+        return True
+    except ImportError:
+        return False
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Start (once) and return the background event loop."""
+    global _loop, _loop_thread
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(
+                target=_loop.run_forever,
+                name="llm-transport",
+                daemon=True,
+            )
+            _loop_thread.start()
+    return _loop
+
+
+def run_sync(coro, timeout: float | None = None):
+    """
+    Run a coroutine on the transport loop and block until it finishes.
+
+    Safe to call from any thread except the loop thread itself.
+    Exceptions raised by the coroutine propagate to the caller.
+    """
+    loop = get_loop()
+    if threading.current_thread() is _loop_thread:
+        coro.close()
+        raise RuntimeError("run_sync() called from the transport loop — await instead")
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    return future.result(timeout)
+
+
+def get_http_client(provider: str) -> httpx.AsyncClient:
+    """
+    Return the pooled client for a provider host, creating it on first use.
+
+    Connection limits come from HTTP_MAX_CONNECTIONS (per provider) so a
+    single local Ollama isn't flooded while cloud hosts get wider pools.
+    """
+    client = _clients.get(provider)
+    if client is None or client.is_closed:
+        max_conn = cfg.HTTP_MAX_CONNECTIONS.get(provider, cfg.HTTP_MAX_CONNECTIONS_DEFAULT)
+        client = httpx.AsyncClient(
+            http2=provider in _HTTP2_PROVIDERS and _http2_available(),
+            limits=httpx.Limits(
+                max_connections=max_conn,
+                max_keepalive_connections=max_conn,
+                keepalive_expiry=cfg.HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(cfg.HTTP_TIMEOUT, connect=cfg.HTTP_CONNECT_TIMEOUT),
+        )
+        _clients[provider] = client
+    return client
+
+
+async def aclose_clients() -> None:
+    """Close every pooled client (call from the transport loop)."""
+    for client in list(_clients.values()):
+        await client.aclose()
+    _clients.clear()
+
+
+def close_clients() -> None:
+    """Sync counterpart of aclose_clients() — e.g. on API shutdown."""
+    if _loop is not None and not _loop.is_closed():
+        run_sync(aclose_clients())
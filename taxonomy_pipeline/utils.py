@@ -1,12 +1,21 @@
+import asyncio
 import json
 import re
 import logging
+import threading
 import time
+
+import httpx
 import pandas as pd
 import requests
 from pathlib import Path
+from typing import Callable, Iterator
 
 import config as cfg
+from llm_cache import get_cache, make_key
+from provider_health import get_breaker
+from rate_limiter import backoff_delay, estimate_tokens, get_limiter, retry_after_seconds
+from transport import get_http_client, run_sync
 
 class TokenTracker:
     """
@@ -16,37 +25,59 @@ class TokenTracker:
         token_tracker.reset()          # before a phase
         call_llm(...)                  # tokens auto-accumulated
         usage = token_tracker.get()    # after a phase
+
+    Cache hits cost no tokens and are counted separately. Calls cancelled
+    by hedging are added to the totals as hedged_calls but do not change
+    the reported provider/model.
+
+    token_tracker is the process-wide default. A PipelineContext carries
+    its own instance, passed to the LLM callers as tracker=, so concurrent
+    jobs count separately.
     """
     def __init__(self):
-        self._usage = {
-            "input_tokens": 0,
-            "output_tokens": 0,
-            "calls": 0,
-            "provider": None,
-            "model": None,
-        }
+        self._lock = threading.Lock()
+        self.reset()
 
     def reset(self):
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
         self._usage = {
             "input_tokens": 0,
             "output_tokens": 0,
             "calls": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "hedged_calls": 0,
             "provider": None,
             "model": None,
         }
 
-    def record(self, input_tokens: int, output_tokens: int, provider: str, model: str):
-        self._usage["input_tokens"] += input_tokens
-        self._usage["output_tokens"] += output_tokens
-        self._usage["calls"] += 1
-        self._usage["provider"] = provider
-        self._usage["model"] = model
+    def record(
+        self, input_tokens: int, output_tokens: int, provider: str, model: str,
+        hedge: bool = False,
+    ):
+        with self._lock:
+            self._usage["input_tokens"] += input_tokens
+            self._usage["output_tokens"] += output_tokens
+            self._usage["calls"] += 1
+            if hedge:
+                self._usage["hedged_calls"] += 1
+                return
+            self._usage["provider"] = provider
+            self._usage["model"] = model
+
+    def record_cache(self, hit: bool):
+        with self._lock:
+            self._usage["cache_hits" if hit else "cache_misses"] += 1
 
     def get(self) -> dict:
-        return {
-            **self._usage,
-            "total_tokens": self._usage["input_tokens"] + self._usage["output_tokens"],
-        }
+        with self._lock:
+            return {
+                **self._usage,
+                "total_tokens": self._usage["input_tokens"] + self._usage["output_tokens"],
+            }
 
 
 token_tracker = TokenTracker()
@@ -68,39 +99,75 @@ def get_logger(name: str) -> logging.Logger:
 _logger_llm = get_logger("utils.llm")
 
 
-def load_awards(path: Path = None) -> pd.DataFrame:
+def _awards_columns() -> list[str]:
+    return [
+        cfg.COL_MESSAGE, cfg.COL_AWARD_TITLE,
+        cfg.COL_RECIPIENT_TITLE, cfg.COL_NOMINATOR_TITLE,
+    ]
+
+
+def iter_awards(path: Path = None, chunksize: int = None) -> Iterator[pd.DataFrame]:
     """
-    Load and validate the awards CSV.
-    Raises early with a clear message if columns are missing.
+    Stream the awards CSV as validated chunks of at most chunksize rows
+    (default AWARDS_CHUNK_ROWS).
+
+    Only the four pipeline columns are read, all as strings. Rows with an
+    empty message are dropped, and each chunk's index continues from the
+    previous one, so row positions match load_awards(). Missing columns
+    raise before any rows are read.
     """
-    path = path or cfg.AWARDS_CSV
+    path = Path(path or cfg.AWARDS_CSV)
+    chunksize = chunksize or cfg.AWARDS_CHUNK_ROWS
     logger = get_logger("utils")
 
     if not path.exists():
         raise FileNotFoundError(f"Awards CSV not found at {path}")
 
-    df = pd.read_csv(path)
-    logger.info(f"Loaded {len(df)} rows from {path.name}")
-
-    required = [
-        cfg.COL_MESSAGE, cfg.COL_AWARD_TITLE,
-        cfg.COL_RECIPIENT_TITLE, cfg.COL_NOMINATOR_TITLE,
-    ]
-    missing = [c for c in required if c not in df.columns]
+    required = _awards_columns()
+    header = list(pd.read_csv(path, nrows=0).columns)
+    missing = [c for c in required if c not in header]
     if missing:
         raise KeyError(
             f"Missing columns: {missing}. "
-            f"Available: {list(df.columns)}. "
+            f"Available: {header}. "
             f"Update column names in config.py."
         )
 
-    before = len(df)
-    df = df.dropna(subset=[cfg.COL_MESSAGE]).reset_index(drop=True)
-    dropped = before - len(df)
+    total = dropped = 0
+    for chunk in pd.read_csv(path, usecols=required, dtype=str, chunksize=chunksize):
+        before = len(chunk)
+        chunk = chunk.dropna(subset=[cfg.COL_MESSAGE])
+        dropped += before - len(chunk)
+        chunk.index = pd.RangeIndex(total, total + len(chunk))
+        total += len(chunk)
+        yield chunk
+
+    logger.info(f"Loaded {total} rows from {path.name}")
     if dropped:
         logger.warning(f"Dropped {dropped} rows with empty messages")
 
-    return df
+
+def load_awards(path: Path = None) -> pd.DataFrame:
+    """
+    Load and validate the awards CSV (the four pipeline columns, as strings).
+    Raises early with a clear message if columns are missing.
+    """
+    chunks = list(iter_awards(path))
+    if not chunks:
+        return pd.DataFrame(columns=_awards_columns(), dtype=str)
+    return pd.concat(chunks)
+
+
+def load_messages(path: Path = None) -> list[str]:
+    """
+    Just the message column, streamed so the full DataFrame is never
+    held in memory. Positions match load_awards() rows.
+    """
+    return [
+        message
+        for chunk in iter_awards(path)
+        for message in chunk[cfg.COL_MESSAGE].tolist()
+    ]
 
 
 def extract_json(text: str) -> dict:
@@ -127,21 +194,78 @@ def extract_json(text: str) -> dict:
     raise ValueError(f"Could not extract valid JSON from response:\n{text[:300]}...")
 
 
+def _wrap_schema(schema: dict) -> tuple[dict, bool]:
+    """
+    Tool input (Claude) and JSON mode (Groq) need an object at the root;
+    wrap any other schema as {"items": ...}. Returns (schema, wrapped).
+    """
+    if schema.get("type") == "object":
+        return schema, False
+    return {
+        "type": "object",
+        "properties": {"items": schema},
+        "required": ["items"],
+    }, True
+
+
+def _unwrap_structured(value, wrapped: bool) -> str:
+    """JSON text of a structured answer, minus the {"items": ...} wrapper."""
+    if wrapped and isinstance(value, dict) and "items" in value:
+        value = value["items"]
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _gemini_schema(schema: dict) -> dict:
+    """
+    Gemini's responseSchema is an OpenAPI subset: no additionalProperties,
+    and nullability is a flag rather than a ["type", "null"] union.
+    """
+    if isinstance(schema, list):
+        return [_gemini_schema(s) for s in schema]
+    if not isinstance(schema, dict):
+        return schema
+    out = {}
+    for key, value in schema.items():
+        if key in ("additionalProperties", "$schema", "title"):
+            continue
+        if key == "type" and isinstance(value, list):
+            types = [t for t in value if t != "null"]
+            out["type"] = types[0] if types else "string"
+            if "null" in value:
+                out["nullable"] = True
+            continue
+        if key in ("properties",):
+            out[key] = {k: _gemini_schema(v) for k, v in value.items()}
+        else:
+            out[key] = _gemini_schema(value)
+    return out
+
+
 _claude_client = None
 
 
 def _get_claude_client():
+    """Async Anthropic client, created lazily on the transport loop."""
     global _claude_client
     if _claude_client is None:
-        from anthropic import Anthropic
+        from anthropic import AsyncAnthropic
         if not cfg.ANTHROPIC_API_KEY:
             raise EnvironmentError("ANTHROPIC_API_KEY not set")
-        _claude_client = Anthropic(api_key=cfg.ANTHROPIC_API_KEY)
+        _claude_client = AsyncAnthropic(api_key=cfg.ANTHROPIC_API_KEY)
     return _claude_client
 
 
-def _call_claude(prompt: str, model: str, max_tokens: int, system: str = None) -> str:
-    """Call Claude API. Records real token usage to tracker."""
+async def _acall_claude(
+    prompt: str, model: str, max_tokens: int, system: str = None,
+    response_schema: dict = None, tracker: TokenTracker = None,
+) -> str:
+    """
+    Call Claude API. Records real token usage to tracker (default: the
+    module-level token_tracker).
+    With response_schema, the answer is forced through a tool call whose
+    input must match the schema, and returned as JSON text.
+    """
+    tracker = tracker or token_tracker
     client = _get_claude_client()
 
     kwargs = {
@@ -151,12 +275,40 @@ def _call_claude(prompt: str, model: str, max_tokens: int, system: str = None) -
     }
     if system:
         kwargs["system"] = system
+    wrapped = False
+    if response_schema:
+        input_schema, wrapped = _wrap_schema(response_schema)
+        kwargs["tools"] = [{
+            "name": "submit_response",
+            "description": "Submit the structured response.",
+            "input_schema": input_schema,
+        }]
+        kwargs["tool_choice"] = {"type": "tool", "name": "submit_response"}
+
+    limiter = get_limiter("anthropic", model)
+    reserved = estimate_tokens(prompt, system)
+    await limiter.acquire(reserved)
 
-    response = client.messages.create(**kwargs)
-    text = response.content[0].text
+    try:
+        response = await client.messages.create(**kwargs)
+    except asyncio.CancelledError:
+        raise                      # in flight: the provider still counts it
+    except Exception:
+        limiter.refund(reserved)
+        raise
+    if response_schema:
+        tool_input = next(
+            (block.input for block in response.content if block.type == "tool_use"), None,
+        )
+        if tool_input is None:
+            raise ValueError("Claude returned no tool_use block for a structured request")
+        text = _unwrap_structured(tool_input, wrapped)
+    else:
+        text = response.content[0].text
 
     usage = response.usage
-    token_tracker.record(
+    limiter.settle(reserved, usage.input_tokens)
+    tracker.record(
         input_tokens=usage.input_tokens,
         output_tokens=usage.output_tokens,
         provider="anthropic",
@@ -169,11 +321,16 @@ def _call_claude(prompt: str, model: str, max_tokens: int, system: str = None) -
     return text
 
 
-def _call_gemini(prompt: str, model: str, max_tokens: int, system: str = None) -> str:
+async def _acall_gemini(
+    prompt: str, model: str, max_tokens: int, system: str = None,
+    response_schema: dict = None, tracker: TokenTracker = None,
+) -> str:
     """
     Call Google Gemini API via REST with retry on rate limits.
     Records real token usage from usageMetadata.
+    With response_schema, output is constrained via responseSchema.
     """
+    tracker = tracker or token_tracker
     if not cfg.GOOGLE_API_KEY:
         raise EnvironmentError("GOOGLE_API_KEY not set")
 
@@ -193,12 +350,24 @@ def _call_gemini(prompt: str, model: str, max_tokens: int, system: str = None) -
             "temperature": 0.3,
         },
     }
+    if response_schema:
+        payload["generationConfig"]["responseMimeType"] = "application/json"
+        payload["generationConfig"]["responseSchema"] = _gemini_schema(response_schema)
 
     max_retries = getattr(cfg, "LLM_MAX_RETRIES", 3)
-    retry_delay = getattr(cfg, "LLM_RETRY_DELAY", 5)
+    client = get_http_client("gemini")
+    limiter = get_limiter("google", model)
+    reserved = estimate_tokens(full_prompt)
 
     for attempt in range(max_retries + 1):
-        response = requests.post(url, json=payload, timeout=120)
+        await limiter.acquire(reserved)
+        try:
+            response = await client.post(url, json=payload)
+        except asyncio.CancelledError:
+            raise                  # in flight: the provider still counts it
+        except Exception:
+            limiter.refund(reserved)
+            raise
 
         if response.status_code == 200:
             data = response.json()
@@ -209,8 +378,9 @@ def _call_gemini(prompt: str, model: str, max_tokens: int, system: str = None) -
                 usage_meta = data.get("usageMetadata", {})
                 input_tokens = usage_meta.get("promptTokenCount", len(full_prompt) // 4)
                 output_tokens = usage_meta.get("candidatesTokenCount", len(text) // 4)
+                limiter.settle(reserved, input_tokens)
 
-                token_tracker.record(
+                tracker.record(
                     input_tokens=input_tokens,
                     output_tokens=output_tokens,
                     provider="google",
@@ -224,21 +394,23 @@ def _call_gemini(prompt: str, model: str, max_tokens: int, system: str = None) -
             except (KeyError, IndexError) as e:
                 raise ValueError(f"Unexpected Gemini response structure: {e}\n{data}")
 
-        elif response.status_code == 429 and attempt < max_retries:
-            wait = retry_delay * (attempt + 1)
+        # Refused requests consume no tokens; the next attempt reserves again
+        limiter.refund(reserved)
+        if response.status_code == 429 and attempt < max_retries:
+            # Block the shared limiter so other jobs on this key wait too
+            wait = retry_after_seconds(response) or backoff_delay(attempt)
+            limiter.penalize(wait)
             _logger_llm.warning(
                 f"[Gemini] Rate limited (429). "
-                f"Retry {attempt + 1}/{max_retries} in {wait}s..."
+                f"Retry {attempt + 1}/{max_retries} in {wait:.1f}s..."
             )
-            time.sleep(wait)
             continue
 
-        else:
-            error = response.json().get("error", {})
-            raise RuntimeError(
-                f"Gemini API error {response.status_code}: "
-                f"{error.get('message', response.text)}"
-            )
+        error = response.json().get("error", {})
+        raise RuntimeError(
+            f"Gemini API error {response.status_code}: "
+            f"{error.get('message', response.text)}"
+        )
 
 
 def list_gemini_models() -> list[str]:
@@ -265,16 +437,30 @@ def list_gemini_models() -> list[str]:
     return names
 
 
-def _call_groq(prompt: str, model: str, max_tokens: int, system: str = None) -> str:
+async def _acall_groq(
+    prompt: str, model: str, max_tokens: int, system: str = None,
+    response_schema: dict = None, tracker: TokenTracker = None,
+) -> str:
     """
     Call Groq API via REST. Records real token usage.
     Free tier: 30 RPM, 1000 RPD, 500K tokens/day.
+    With response_schema, JSON mode is enabled and the schema is spelled
+    out in the system prompt (JSON mode guarantees syntax, not shape).
     """
+    tracker = tracker or token_tracker
     if not cfg.GROQ_API_KEY:
         raise EnvironmentError("GROQ_API_KEY not set")
 
     url = "https://api.groq.com/openai/v1/chat/completions"
 
+    wrapped = False
+    if response_schema:
+        object_schema, wrapped = _wrap_schema(response_schema)
+        system = (
+            f"{system or ''}\n\nRespond with a single JSON object matching this "
+            f"JSON schema:\n{json.dumps(object_schema)}"
+        ).strip()
+
     messages = []
     if system:
         messages.append({"role": "system", "content": system})
@@ -286,28 +472,45 @@ def _call_groq(prompt: str, model: str, max_tokens: int, system: str = None) ->
         "max_tokens": max_tokens,
         "temperature": 0.3,
     }
+    if response_schema:
+        payload["response_format"] = {"type": "json_object"}
 
     max_retries = getattr(cfg, "LLM_MAX_RETRIES", 3)
-    retry_delay = getattr(cfg, "LLM_RETRY_DELAY", 5)
+    client = get_http_client("groq")
+    limiter = get_limiter("groq", model)
+    # Groq counts prompt + completion against TPM
+    reserved = estimate_tokens(prompt, system) + max_tokens
 
     for attempt in range(max_retries + 1):
-        response = requests.post(
-            url,
-            headers={
-                "Authorization": f"Bearer {cfg.GROQ_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json=payload,
-            timeout=120,
-        )
+        await limiter.acquire(reserved)
+        try:
+            response = await client.post(
+                url,
+                headers={
+                    "Authorization": f"Bearer {cfg.GROQ_API_KEY}",
+                    "Content-Type": "application/json",
+                },
+                json=payload,
+            )
+        except asyncio.CancelledError:
+            raise                  # in flight: the provider still counts it
+        except Exception:
+            limiter.refund(reserved)
+            raise
 
         if response.status_code == 200:
             data = response.json()
             try:
                 text = data["choices"][0]["message"]["content"]
+                if wrapped:
+                    try:
+                        text = _unwrap_structured(json.loads(text), wrapped)
+                    except json.JSONDecodeError:
+                        pass  # leave it to the caller's lenient parsing
                 usage = data.get("usage", {})
+                limiter.settle(reserved, usage.get("total_tokens", 0))
 
-                token_tracker.record(
+                tracker.record(
                     input_tokens=usage.get("prompt_tokens", 0),
                     output_tokens=usage.get("completion_tokens", 0),
                     provider="groq",
@@ -322,21 +525,45 @@ def _call_groq(prompt: str, model: str, max_tokens: int, system: str = None) ->
             except (KeyError, IndexError) as e:
                 raise ValueError(f"Unexpected Groq response structure: {e}\n{data}")
 
-        elif response.status_code == 429 and attempt < max_retries:
-            wait = retry_delay * (attempt + 1)
+        limiter.refund(reserved)
+        if response.status_code == 429 and attempt < max_retries:
+            wait = retry_after_seconds(response) or backoff_delay(attempt)
+            limiter.penalize(wait)
             _logger_llm.warning(
                 f"[Groq] Rate limited (429). "
-                f"Retry {attempt + 1}/{max_retries} in {wait}s..."
+                f"Retry {attempt + 1}/{max_retries} in {wait:.1f}s..."
             )
-            time.sleep(wait)
             continue
 
-        else:
-            error = response.json().get("error", {})
-            raise RuntimeError(
-                f"Groq API error {response.status_code}: "
-                f"{error.get('message', response.text)}"
-            )
+        error = response.json().get("error", {})
+        raise RuntimeError(
+            f"Groq API error {response.status_code}: "
+            f"{error.get('message', response.text)}"
+        )
+
+
+def _call_claude(
+    prompt: str, model: str, max_tokens: int, system: str = None,
+    response_schema: dict = None, tracker: TokenTracker = None,
+) -> str:
+    """Sync wrapper around _acall_claude()."""
+    return run_sync(_acall_claude(prompt, model, max_tokens, system, response_schema, tracker))
+
+
+def _call_gemini(
+    prompt: str, model: str, max_tokens: int, system: str = None,
+    response_schema: dict = None, tracker: TokenTracker = None,
+) -> str:
+    """Sync wrapper around _acall_gemini()."""
+    return run_sync(_acall_gemini(prompt, model, max_tokens, system, response_schema, tracker))
+
+
+def _call_groq(
+    prompt: str, model: str, max_tokens: int, system: str = None,
+    response_schema: dict = None, tracker: TokenTracker = None,
+) -> str:
+    """Sync wrapper around _acall_groq()."""
+    return run_sync(_acall_groq(prompt, model, max_tokens, system, response_schema, tracker))
 
 
 PROVIDER_CALLERS = {
@@ -345,32 +572,206 @@ PROVIDER_CALLERS = {
     "groq": _call_groq,
 }
 
+ASYNC_PROVIDER_CALLERS = {
+    "claude": _acall_claude,
+    "gemini": _acall_gemini,
+    "groq": _acall_groq,
+}
 
-def call_llm(
+
+def _default_model(provider: str, models: dict[str, str] | None) -> str:
+    model = (models or {}).get(provider)
+    if not model:
+        defaults = {
+            "claude": "claude-sonnet-4-5-20250929",
+            "gemini": cfg.GEMINI_DEFAULT_MODEL,
+            "groq": cfg.GROQ_DEFAULT_MODEL,
+        }
+        model = defaults.get(provider, cfg.GEMINI_DEFAULT_MODEL)
+    return model
+
+
+def _is_json_response(text: str) -> bool:
+    """True if text holds a parsable JSON object or array."""
+    try:
+        extract_json(text)
+        return True
+    except ValueError:
+        pass
+    start, end = text.find("["), text.rfind("]")
+    if start != -1 and end > start:
+        try:
+            json.loads(text[start:end + 1])
+            return True
+        except json.JSONDecodeError:
+            pass
+    return False
+
+
+async def _ahedged_llm(
+    providers: list[str],
+    models: dict[str, str] | None,
+    prompt: str,
+    max_tokens: int,
+    system: str | None,
+    namespace: str,
+    cache,
+    validate: Callable[[str], bool],
+    response_schema: dict | None = None,
+    tracker: TokenTracker = None,
+    force: bool = False,
+) -> str:
+    """
+    Race the first two providers: start the primary, and if it hasn't
+    answered within its observed p95 latency (or fails first), start the
+    backup. The first valid response wins and the other call is cancelled.
+    Each attempt asks its circuit breaker first (unless force), so a
+    backup that is never started never claims a half-open probe.
+
+    A cancelled loser still billed its prompt, so its estimated input
+    tokens are recorded as a hedged call to keep hedging cost visible.
+    """
+    tracker = tracker or token_tracker
+    candidates = []
+    for provider in providers[:2]:
+        model = _default_model(provider, models)
+        key = make_key(provider, model, system, prompt, None, max_tokens, response_schema)
+        if cache is not None:
+            cached = cache.get(key)
+            tracker.record_cache(hit=cached is not None)
+            if cached is not None:
+                return cached
+        candidates.append((provider, model, key))
+
+    async def attempt(provider: str, model: str) -> str:
+        breaker = get_breaker(provider)
+        if not force and not breaker.allow():
+            raise RuntimeError(f"{provider}: circuit open")
+        start = time.monotonic()
+        try:
+            text = await ASYNC_PROVIDER_CALLERS[provider](
+                prompt, model, max_tokens, system, response_schema, tracker,
+            )
+        except asyncio.CancelledError:
+            # The loser of a race has no outcome: free its probe, if it took one
+            if not force:
+                breaker.release_probe()
+            raise
+        except Exception as e:
+            breaker.record_failure(e)
+            raise
+        breaker.record_success(time.monotonic() - start)
+        return text
+
+    (p1, m1, _), backup = candidates
+    delay = cfg.LLM_HEDGE_DEFAULT_DELAY
+    if get_breaker(p1).sample_count() >= cfg.LLM_HEDGE_MIN_SAMPLES:
+        delay = get_breaker(p1).p95_latency()
+    deadline = time.monotonic() + delay
+
+    _logger_llm.info(f"Hedged call: {p1} (model={m1}), backup after {delay:.1f}s")
+    pending = {asyncio.create_task(attempt(p1, m1)): candidates[0]}
+    backup_started = False
+    last_error = None
+
+    def start_backup():
+        nonlocal backup_started
+        backup_started = True
+        _logger_llm.info(f"Hedging to {backup[0]} (model={backup[1]})")
+        pending[asyncio.create_task(attempt(backup[0], backup[1]))] = backup
+
+    while pending:
+        timeout = None if backup_started else max(0.0, deadline - time.monotonic())
+        done, _ = await asyncio.wait(
+            pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED,
+        )
+
+        if not done:
+            start_backup()
+            continue
+
+        for task in done:
+            provider, model, key = pending.pop(task)
+            try:
+                text = task.result()
+            except Exception as e:
+                _logger_llm.warning(f"{provider} failed in hedged call: {str(e)[:120]}")
+                last_error = e
+                continue
+            if not validate(text):
+                _logger_llm.warning(f"{provider} returned unparsable output in hedged call")
+                last_error = ValueError(f"{provider} returned unparsable output")
+                continue
+
+            for loser, (lp, lm, _) in pending.items():
+                loser.cancel()
+                tracker.record(
+                    input_tokens=estimate_tokens(prompt, system),
+                    output_tokens=0,
+                    provider=lp,
+                    model=lm,
+                    hedge=True,
+                )
+            if cache is not None:
+                cache.put(key, text, namespace=namespace, provider=provider, model=model)
+            return text
+
+        if not pending and not backup_started:
+            start_backup()
+
+    raise RuntimeError(
+        f"Hedged call failed on {p1} and {backup[0]}. Last error: {last_error}"
+    )
+
+
+async def acall_llm(
     prompt: str,
     models: dict[str, str] = None,
     max_tokens: int = None,
     system: str = None,
+    namespace: str = "default",
+    use_cache: bool = True,
+    validate: Callable[[str], bool] = None,
+    response_schema: dict = None,
+    tracker: TokenTracker = None,
+    providers: list[str] = None,
 ) -> str:
     """
     Call an LLM with automatic provider fallback.
 
     Tries providers in priority order from config.
     If the primary fails (billing, auth, etc.), falls back to the next.
+    With LLM_HEDGE_ENABLED, the first two providers are raced instead
+    (see _ahedged_llm). Responses are served from / written to the disk
+    cache unless use_cache is False or LLM_CACHE_ENABLED is off.
 
     Args:
         prompt:     User message content
         models:     Dict of provider -> model name (e.g. P1_MODELS from config)
         max_tokens: Max response tokens
         system:     Optional system prompt
+        namespace:  Cache namespace (e.g. "phase_1") for targeted invalidation
+        use_cache:  Set False to force a fresh provider call
+        validate:   Hedging only — accepts a response as the winner.
+                    Defaults to "parses as JSON".
+        response_schema: JSON schema to constrain the output with, using
+                    each provider's native mechanism (Claude tool use,
+                    Gemini responseSchema, Groq JSON mode). The response
+                    is then JSON text matching the schema.
+        tracker:    Token usage goes here (a job's own tracker); defaults
+                    to the module-level token_tracker
+        providers:  Providers to try, in order, instead of
+                    LLM_PROVIDER_PRIORITY. A single provider pins the call
+                    to it: no fallback, no hedging.
 
     Returns:
         Raw text response
     """
     max_tokens = max_tokens or cfg.P1_MAX_TOKENS
+    tracker = tracker or token_tracker
 
     providers_to_try = []
-    for p in cfg.LLM_PROVIDER_PRIORITY:
+    for p in providers or cfg.LLM_PROVIDER_PRIORITY:
         if p == "claude" and cfg.ANTHROPIC_API_KEY:
             providers_to_try.append(p)
         elif p == "gemini" and cfg.GOOGLE_API_KEY:
@@ -385,30 +786,80 @@ def call_llm(
             "  export GROQ_API_KEY='gsk_...'     (Groq)"
         )
 
+    # Skip providers whose circuit is open; if every one is, try them anyway.
+    # ready() only peeks: the half-open probe slot is claimed with allow()
+    # right before a provider is actually called.
+    available = [p for p in providers_to_try if get_breaker(p).ready()]
+    for p in providers_to_try:
+        if p not in available:
+            _logger_llm.debug(f"{p}: circuit open ({get_breaker(p).open_reason}), skipping")
+    force = not available
+    if available:
+        providers_to_try = available
+    else:
+        _logger_llm.warning("All providers are circuit-open; trying them anyway")
+
+    cache = get_cache() if use_cache else None
     last_error = None
 
+    if cfg.LLM_HEDGE_ENABLED and len(providers_to_try) >= 2:
+        try:
+            return await _ahedged_llm(
+                providers_to_try, models, prompt, max_tokens, system,
+                namespace, cache, validate or _is_json_response, response_schema, tracker,
+                force=force,
+            )
+        except Exception as e:
+            if len(providers_to_try) == 2:
+                raise
+            _logger_llm.warning(f"Hedged call failed, continuing with {providers_to_try[2:]}")
+            last_error = e
+            providers_to_try = providers_to_try[2:]
+
     for i, provider in enumerate(providers_to_try):
-        model = (models or {}).get(provider)
-        if not model:
-            defaults = {
-                "claude": "claude-sonnet-4-5-20250929",
-                "gemini": cfg.GEMINI_DEFAULT_MODEL,
-                "groq": cfg.GROQ_DEFAULT_MODEL,
-            }
-            model = defaults.get(provider, cfg.GEMINI_DEFAULT_MODEL)
+        model = _default_model(provider, models)
 
-        caller = PROVIDER_CALLERS[provider]
+        caller = ASYNC_PROVIDER_CALLERS[provider]
         remaining = providers_to_try[i + 1:]
 
+        # Temperature is fixed per provider, so provider+model covers it
+        cache_key = make_key(provider, model, system, prompt, None, max_tokens, response_schema)
+        if cache is not None:
+            cached = cache.get(cache_key)
+            tracker.record_cache(hit=cached is not None)
+            if cached is not None:
+                _logger_llm.info(f"[cache] hit for {provider} (model={model}, ns={namespace})")
+                return cached
+
+        if not force and not get_breaker(provider).allow():
+            # Another caller took the half-open probe since the check above
+            _logger_llm.debug(f"{provider}: circuit open, probe in flight, skipping")
+            last_error = last_error or RuntimeError(f"{provider}: circuit open")
+            continue
+
         try:
             _logger_llm.info(f"Trying provider: {provider} (model={model})")
-            return caller(prompt, model, max_tokens, system)
+            start = time.monotonic()
+            text = await caller(prompt, model, max_tokens, system, response_schema, tracker)
+            get_breaker(provider).record_success(time.monotonic() - start)
+            if cache is not None:
+                cache.put(cache_key, text, namespace=namespace, provider=provider, model=model)
+            return text
+
+        except asyncio.CancelledError:
+            if not force:
+                get_breaker(provider).release_probe()
+            raise
 
         except EnvironmentError:
+            # Never sent, so no outcome to report
+            if not force:
+                get_breaker(provider).release_probe()
             _logger_llm.warning(f"{provider}: no API key, skipping")
             continue
 
         except Exception as e:
+            get_breaker(provider).record_failure(e)
             error_str = str(e).lower()
             is_retryable = any(
                 kw in error_str
@@ -444,6 +895,29 @@ def call_llm(
     )
 
 
+def call_llm(
+    prompt: str,
+    models: dict[str, str] = None,
+    max_tokens: int = None,
+    system: str = None,
+    namespace: str = "default",
+    use_cache: bool = True,
+    validate: Callable[[str], bool] = None,
+    response_schema: dict = None,
+    tracker: TokenTracker = None,
+    providers: list[str] = None,
+) -> str:
+    """
+    Sync wrapper around acall_llm() for the phase modules.
+    Runs on the shared transport loop so connections stay pooled.
+    """
+    return run_sync(acall_llm(
+        prompt=prompt, models=models, max_tokens=max_tokens, system=system,
+        namespace=namespace, use_cache=use_cache, validate=validate,
+        response_schema=response_schema, tracker=tracker, providers=providers,
+    ))
+
+
 # Backwards-compatible alias
 def call_claude(
     prompt: str, model: str = None, max_tokens: int = None,
@@ -485,28 +959,49 @@ def check_ollama(model: str = None) -> dict:
     return result
 
 
-def call_ollama(prompt: str, model: str = None, temperature: float = None) -> str | None:
+async def acall_ollama(
+    prompt: str,
+    model: str = None,
+    temperature: float = None,
+    namespace: str = "default",
+    use_cache: bool = True,
+    response_schema: dict = None,
+    tracker: TokenTracker = None,
+) -> str | None:
     """
     Call local Ollama and return text response.
     Records token usage from response metadata (prompt_eval_count, eval_count).
     Returns None on failure (caller decides how to handle).
+    Successful responses go through the same disk cache as acall_llm().
+    response_schema is passed as Ollama's "format" (structured outputs).
     """
     logger = get_logger("utils.ollama")
+    tracker = tracker or token_tracker
 
     model = model or cfg.P2_MODEL
     temperature = temperature if temperature is not None else cfg.P2_TEMPERATURE
 
+    cache = get_cache() if use_cache else None
+    cache_key = make_key("ollama", model, None, prompt, temperature, None, response_schema)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        tracker.record_cache(hit=cached is not None)
+        if cached is not None:
+            return cached
+
+    client = get_http_client("ollama")
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "stream": False,
+        "temperature": temperature,
+        "options": {"num_ctx": cfg.P2_OLLAMA_NUM_CTX},
+    }
+    if response_schema:
+        payload["format"] = response_schema
+
     try:
-        r = requests.post(
-            cfg.P2_OLLAMA_URL,
-            json={
-                "model": model,
-                "prompt": prompt,
-                "stream": False,
-                "temperature": temperature,
-            },
-            timeout=cfg.P2_TIMEOUT,
-        )
+        r = await client.post(cfg.P2_OLLAMA_URL, json=payload, timeout=cfg.P2_TIMEOUT)
         if r.status_code == 200:
             data = r.json()
             text = data.get("response", "")
@@ -515,24 +1010,167 @@ def call_ollama(prompt: str, model: str = None, temperature: float = None) -> st
             input_tokens = data.get("prompt_eval_count", 0)
             output_tokens = data.get("eval_count", 0)
 
-            token_tracker.record(
+            tracker.record(
                 input_tokens=input_tokens,
                 output_tokens=output_tokens,
                 provider="ollama",
                 model=model,
             )
+            if cache is not None:
+                cache.put(cache_key, text, namespace=namespace, provider="ollama", model=model)
             return text
 
         logger.warning(f"Ollama returned status {r.status_code}")
         return None
 
-    except requests.Timeout:
+    except httpx.TimeoutException:
+        logger.warning(f"Ollama timed out after {cfg.P2_TIMEOUT}s")
+        return None
+    except httpx.TransportError:
+        logger.error("Cannot reach Ollama — is it running?")
+        return None
+
+
+def call_ollama(
+    prompt: str,
+    model: str = None,
+    temperature: float = None,
+    namespace: str = "default",
+    use_cache: bool = True,
+    response_schema: dict = None,
+    tracker: TokenTracker = None,
+) -> str | None:
+    """Sync wrapper around acall_ollama()."""
+    return run_sync(acall_ollama(
+        prompt=prompt, model=model, temperature=temperature,
+        namespace=namespace, use_cache=use_cache, response_schema=response_schema,
+        tracker=tracker,
+    ))
+
+
+async def acall_ollama_stream(
+    prompt: str,
+    on_chunk: Callable[[str], bool],
+    model: str = None,
+    temperature: float = None,
+    namespace: str = "default",
+    use_cache: bool = True,
+    response_schema: dict = None,
+    tracker: TokenTracker = None,
+) -> str | None:
+    """
+    Call local Ollama with "stream": True, feeding each text fragment of
+    the NDJSON stream to on_chunk as it arrives.
+
+    If on_chunk returns True the stream is closed immediately, which makes
+    Ollama stop generating — the caller has everything it needs. Token
+    usage comes from the final "done" message, or is estimated (one stream
+    fragment ≈ one token) when generation was cut short.
+    Returns the text received so far, or None on failure.
+    """
+    logger = get_logger("utils.ollama")
+    tracker = tracker or token_tracker
+
+    model = model or cfg.P2_MODEL
+    temperature = temperature if temperature is not None else cfg.P2_TEMPERATURE
+
+    # Separate key space: a stopped stream is a prefix, not a full completion
+    cache = get_cache() if use_cache else None
+    cache_key = make_key("ollama:stream", model, None, prompt, temperature, None, response_schema)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        tracker.record_cache(hit=cached is not None)
+        if cached is not None:
+            on_chunk(cached)
+            return cached
+
+    client = get_http_client("ollama")
+    parts = []
+    final = {}
+    stopped = False
+    damaged = False      # a line was lost: return the text, but don't cache it
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "stream": True,
+        "temperature": temperature,
+        "options": {"num_ctx": cfg.P2_OLLAMA_NUM_CTX},
+    }
+    if response_schema:
+        payload["format"] = response_schema
+
+    try:
+        async with client.stream(
+            "POST", cfg.P2_OLLAMA_URL, json=payload, timeout=cfg.P2_TIMEOUT,
+        ) as r:
+            if r.status_code != 200:
+                logger.warning(f"Ollama returned status {r.status_code}")
+                return None
+
+            async for line in r.aiter_lines():
+                if not line:
+                    continue
+                try:
+                    msg = json.loads(line)
+                except json.JSONDecodeError:
+                    # A truncated or non-JSON line (proxy chunking): skip it and
+                    # leave the text so far to the caller's incremental parser
+                    logger.warning(f"Skipping malformed Ollama stream line: {line[:120]!r}")
+                    damaged = True
+                    continue
+                if "error" in msg:
+                    logger.warning(f"Ollama stream error: {msg['error']}")
+                    damaged = True
+                    break
+                fragment = msg.get("response", "")
+                if fragment:
+                    parts.append(fragment)
+                    if on_chunk(fragment):
+                        stopped = True
+                        break
+                if msg.get("done"):
+                    final = msg
+                    break
+
+    except httpx.TimeoutException:
         logger.warning(f"Ollama timed out after {cfg.P2_TIMEOUT}s")
         return None
-    except requests.ConnectionError:
+    except httpx.TransportError:
         logger.error("Cannot reach Ollama — is it running?")
         return None
 
+    text = "".join(parts)
+    tracker.record(
+        input_tokens=final.get("prompt_eval_count", estimate_tokens(prompt)),
+        output_tokens=final.get("eval_count", len(parts)),
+        provider="ollama",
+        model=model,
+    )
+    if stopped:
+        logger.debug(f"Stream stopped early after {len(parts)} fragments")
+
+    if cache is not None and text and not damaged:
+        cache.put(cache_key, text, namespace=namespace, provider="ollama", model=model)
+    return text
+
+
+def call_ollama_stream(
+    prompt: str,
+    on_chunk: Callable[[str], bool],
+    model: str = None,
+    temperature: float = None,
+    namespace: str = "default",
+    use_cache: bool = True,
+    response_schema: dict = None,
+    tracker: TokenTracker = None,
+) -> str | None:
+    """Sync wrapper around acall_ollama_stream(). on_chunk runs on the transport loop."""
+    return run_sync(acall_ollama_stream(
+        prompt=prompt, on_chunk=on_chunk, model=model, temperature=temperature,
+        namespace=namespace, use_cache=use_cache, response_schema=response_schema,
+        tracker=tracker,
+    ))
+
 
 def ensure_dir(path: Path) -> Path:
     """Create directory if it doesn't exist, return the path."""
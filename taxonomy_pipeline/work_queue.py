@@ -0,0 +1,322 @@
+"""
+work_queue.py — Leased Phase 2 batch queue shared between machines.
+
+With P2_QUEUE_PATH set, Phase 2 puts its batches in a SQLite file on a
+shared disk instead of calling the LLM itself. Worker processes on any
+machine that can see the file (phase_2_worker.py) lease a batch,
+classify it with their own Ollama or API keys and report the result.
+
+A lease expires after P2_QUEUE_LEASE_SECONDS unless the worker renews
+it, so a batch held by a crashed worker goes back to the queue. Only
+the current lease holder can complete a batch, so each batch has
+exactly one result even if a slow worker finishes after its lease was
+handed to another. Each finished batch gets an increasing sequence
+number. The coordinator reads past the last one it has seen and merges
+every batch once, through its checkpoint journal.
+
+The database uses SQLite's rollback journal rather than WAL, because
+WAL needs shared memory and does not work across machines on a network
+filesystem.
+
+CLI:
+    python work_queue.py --status
+    python work_queue.py --purge
+"""
+
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import config as cfg
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue_jobs (
+    job_id      TEXT PRIMARY KEY,
+    spec        TEXT NOT NULL,
+    created_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS queue_tasks (
+    job_id        TEXT NOT NULL,
+    batch_num     INTEGER NOT NULL,
+    texts         TEXT NOT NULL,
+    status        TEXT NOT NULL,      -- pending | leased | done | failed
+    lease_owner   TEXT,
+    lease_expires REAL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    result        TEXT,
+    finished_seq  INTEGER,
+    updated_at    REAL NOT NULL,
+    PRIMARY KEY (job_id, batch_num)
+);
+CREATE INDEX IF NOT EXISTS idx_queue_tasks_status ON queue_tasks (status, lease_expires);
+CREATE INDEX IF NOT EXISTS idx_queue_tasks_finished ON queue_tasks (job_id, finished_seq);
+"""
+
+
+class WorkQueue:
+    """
+    Usage (coordinator):
+        wq = WorkQueue(cfg.P2_QUEUE_PATH)
+        wq.submit(job_id, spec, {batch_num: texts, ...})
+        seq, finished = wq.finished(job_id, after=seq)   # [(batch_num, {pos: item})]
+
+    Usage (worker):
+        task = wq.lease(worker_id)
+        ...
+        wq.complete(task["job_id"], task["batch_num"], worker_id, found)
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode: transactions are opened explicitly below
+        self._conn = sqlite3.connect(
+            str(self.path), check_same_thread=False, timeout=60, isolation_level=None,
+        )
+        self._conn.executescript(_SCHEMA)
+
+    def _write(self, fn):
+        """Run fn(conn) in one IMMEDIATE transaction (write lock taken up front)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return out
+
+    def submit(self, job_id: str, spec: dict, tasks: dict[int, list[str]]) -> None:
+        """
+        Enqueue a job's batches. Re-submitting is safe: finished batches
+        keep their results, and batches that ran out of attempts are
+        queued again.
+        """
+        now = time.time()
+
+        def fn(conn):
+            conn.execute(
+                "INSERT OR IGNORE INTO queue_jobs (job_id, spec, created_at) VALUES (?, ?, ?)",
+                (job_id, json.dumps(spec, ensure_ascii=False), now),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO queue_tasks "
+                "(job_id, batch_num, texts, status, updated_at) VALUES (?, ?, ?, 'pending', ?)",
+                [(job_id, b, json.dumps(texts, ensure_ascii=False), now) for b, texts in tasks.items()],
+            )
+            conn.executemany(
+                "UPDATE queue_tasks SET status = 'pending', attempts = 0, finished_seq = NULL, "
+                "updated_at = ? WHERE job_id = ? AND batch_num = ? AND status = 'failed'",
+                [(now, job_id, b) for b in tasks],
+            )
+
+        self._write(fn)
+
+    def lease(self, worker_id: str, lease_seconds: float = None) -> dict | None:
+        """
+        Take the oldest pending batch (or one whose lease has expired).
+        Returns {"job_id", "batch_num", "texts", "spec", "attempts"} or None.
+        """
+        lease_seconds = lease_seconds or cfg.P2_QUEUE_LEASE_SECONDS
+        now = time.time()
+
+        def fn(conn):
+            # Expired leases that have used up their attempts fail for good
+            for job_id, batch_num in conn.execute(
+                "SELECT job_id, batch_num FROM queue_tasks "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, cfg.P2_QUEUE_MAX_ATTEMPTS),
+            ).fetchall():
+                self._finish(conn, job_id, batch_num, "failed", None, now)
+
+            row = conn.execute(
+                "SELECT t.job_id, t.batch_num, t.texts, j.spec, t.attempts "
+                "FROM queue_tasks t JOIN queue_jobs j ON j.job_id = t.job_id "
+                "WHERE t.status = 'pending' OR (t.status = 'leased' AND t.lease_expires < ?) "
+                "ORDER BY j.created_at, t.batch_num LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, batch_num, texts, spec, attempts = row
+            conn.execute(
+                "UPDATE queue_tasks SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE job_id = ? AND batch_num = ?",
+                (worker_id, now + lease_seconds, now, job_id, batch_num),
+            )
+            return {
+                "job_id": job_id,
+                "batch_num": batch_num,
+                "texts": json.loads(texts),
+                "spec": json.loads(spec),
+                "attempts": attempts + 1,
+            }
+
+        return self._write(fn)
+
+    def renew(self, job_id: str, batch_num: int, worker_id: str, lease_seconds: float = None) -> bool:
+        """Extend a lease. False if the lease has been lost to another worker."""
+        lease_seconds = lease_seconds or cfg.P2_QUEUE_LEASE_SECONDS
+        now = time.time()
+        return self._write(lambda conn: conn.execute(
+            "UPDATE queue_tasks SET lease_expires = ?, updated_at = ? "
+            "WHERE job_id = ? AND batch_num = ? AND status = 'leased' AND lease_owner = ?",
+            (now + lease_seconds, now, job_id, batch_num, worker_id),
+        ).rowcount == 1)
+
+    def complete(self, job_id: str, batch_num: int, worker_id: str, found: dict[int, dict]) -> bool:
+        """
+        Record a batch result. Rejected (False) unless worker_id still
+        holds the lease, so a batch is only ever completed once.
+        """
+        now = time.time()
+        result = json.dumps(sorted(found.items()), ensure_ascii=False)
+
+        def fn(conn):
+            if not self._holds(conn, job_id, batch_num, worker_id):
+                return False
+            self._finish(conn, job_id, batch_num, "done", result, now)
+            return True
+
+        return self._write(fn)
+
+    def fail(self, job_id: str, batch_num: int, worker_id: str) -> None:
+        """Give a batch back after a failed attempt; it fails for good after P2_QUEUE_MAX_ATTEMPTS."""
+        now = time.time()
+
+        def fn(conn):
+            if not self._holds(conn, job_id, batch_num, worker_id):
+                return
+            attempts = conn.execute(
+                "SELECT attempts FROM queue_tasks WHERE job_id = ? AND batch_num = ?",
+                (job_id, batch_num),
+            ).fetchone()[0]
+            if attempts >= cfg.P2_QUEUE_MAX_ATTEMPTS:
+                self._finish(conn, job_id, batch_num, "failed", None, now)
+            else:
+                self._release(conn, job_id, batch_num, now, refund=False)
+
+        self._write(fn)
+
+    def release(self, job_id: str, batch_num: int, worker_id: str) -> None:
+        """Give a batch back without counting the attempt (e.g. worker shutting down)."""
+        now = time.time()
+
+        def fn(conn):
+            if self._holds(conn, job_id, batch_num, worker_id):
+                self._release(conn, job_id, batch_num, now, refund=True)
+
+        self._write(fn)
+
+    def finished(self, job_id: str, after: int = 0) -> tuple[int, list[tuple[int, dict[int, dict]]]]:
+        """
+        Batches finished since sequence number `after`. Returns (last
+        sequence number, [(batch_num, {pos: item})]); failed batches come
+        back with an empty dict.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT finished_seq, batch_num, result FROM queue_tasks "
+                "WHERE job_id = ? AND finished_seq > ? ORDER BY finished_seq",
+                (job_id, after),
+            ).fetchall()
+        out = []
+        for seq, batch_num, result in rows:
+            after = seq
+            found = {int(pos): item for pos, item in json.loads(result)} if result else {}
+            out.append((batch_num, found))
+        return after, out
+
+    def counts(self, job_id: str = None) -> dict[str, int]:
+        """Tasks per status, for one job or the whole queue."""
+        where, args = ("WHERE job_id = ?", (job_id,)) if job_id else ("", ())
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT status, COUNT(*) FROM queue_tasks {where} GROUP BY status", args,
+            ).fetchall()
+        return dict(rows)
+
+    def jobs(self) -> list[tuple[str, float]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT job_id, created_at FROM queue_jobs ORDER BY created_at"
+            ).fetchall()
+
+    def delete_job(self, job_id: str) -> None:
+        def fn(conn):
+            conn.execute("DELETE FROM queue_tasks WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM queue_jobs WHERE job_id = ?", (job_id,))
+
+        self._write(fn)
+
+    def purge(self) -> int:
+        def fn(conn):
+            n = conn.execute("DELETE FROM queue_tasks").rowcount
+            conn.execute("DELETE FROM queue_jobs")
+            return n
+
+        return self._write(fn)
+
+    @staticmethod
+    def _holds(conn, job_id: str, batch_num: int, worker_id: str) -> bool:
+        return conn.execute(
+            "SELECT 1 FROM queue_tasks WHERE job_id = ? AND batch_num = ? "
+            "AND status = 'leased' AND lease_owner = ?",
+            (job_id, batch_num, worker_id),
+        ).fetchone() is not None
+
+    @staticmethod
+    def _finish(conn, job_id: str, batch_num: int, status: str, result: str | None, now: float) -> None:
+        seq = conn.execute(
+            "SELECT COALESCE(MAX(finished_seq), 0) + 1 FROM queue_tasks WHERE job_id = ?",
+            (job_id,),
+        ).fetchone()[0]
+        conn.execute(
+            "UPDATE queue_tasks SET status = ?, result = ?, finished_seq = ?, "
+            "lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE job_id = ? AND batch_num = ?",
+            (status, result, seq, now, job_id, batch_num),
+        )
+
+    @staticmethod
+    def _release(conn, job_id: str, batch_num: int, now: float, refund: bool) -> None:
+        conn.execute(
+            "UPDATE queue_tasks SET status = 'pending', lease_owner = NULL, lease_expires = NULL, "
+            f"attempts = attempts - {1 if refund else 0}, updated_at = ? "
+            "WHERE job_id = ? AND batch_num = ?",
+            (now, job_id, batch_num),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or purge the distributed Phase 2 queue")
+    parser.add_argument("--queue", default=None, help="Queue file (default P2_QUEUE_PATH)")
+    parser.add_argument("--status", action="store_true", help="Show tasks per status for each job")
+    parser.add_argument("--purge", action="store_true", help="Delete every job and task")
+    args = parser.parse_args()
+
+    path = args.queue or cfg.P2_QUEUE_PATH
+    if not path:
+        parser.error("no queue file: pass --queue or set P2_QUEUE_PATH")
+    wq = WorkQueue(path)
+
+    if args.purge:
+        print(f"Removed {wq.purge()} tasks")
+
+    if args.status or not args.purge:
+        jobs = wq.jobs()
+        if not jobs:
+            print(f"Queue is empty ({wq.path})")
+        for job_id, created_at in jobs:
+            counts = wq.counts(job_id)
+            summary = ", ".join(f"{counts.get(s, 0)} {s}" for s in ("pending", "leased", "done", "failed"))
+            print(f"  {job_id}  {time.strftime('%Y-%m-%d %H:%M', time.localtime(created_at))}  {summary}")
+
+
+if __name__ == "__main__":
+    main()